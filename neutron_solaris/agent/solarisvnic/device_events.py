@@ -0,0 +1,175 @@
+# Copyright 2021, Guillermo Adrian Molina.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import abc
+import collections
+import time
+
+import eventlet
+from eventlet.green import subprocess
+from eventlet import queue
+from oslo_log import log as logging
+
+from neutron_solaris.solaris import net_lib
+
+LOG = logging.getLogger(__name__)
+
+ADDED = 'add'
+REMOVED = 'remove'
+CHANGED = 'change'
+ACTIONS = (ADDED, REMOVED, CHANGED)
+
+
+class DeviceEvent(collections.namedtuple('DeviceEvent',
+                                         ['action', 'link', 'mac'])):
+    '''A datalink that was added, removed or changed on the host.'''
+    __slots__ = ()
+
+
+class DeviceEventSource(object, metaclass=abc.ABCMeta):
+    """Source of datalink notifications for the agent loop.
+
+    The agent loop calls get_events() instead of sleeping for the whole
+    polling interval, so that a new VNIC is noticed as soon as the event
+    source reports it.
+    """
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    @abc.abstractmethod
+    def get_events(self, timeout):
+        """Wait up to timeout seconds for events.
+
+        :returns: list of DeviceEvent, empty if nothing happened before the
+                  timeout expired.
+        """
+
+
+class SnapshotDiffEventSource(DeviceEventSource):
+    """Generate events by diffing successive VNIC inventory snapshots.
+
+    :param snapshot_func: callable returning a net_lib.VNICInventory.
+    :param interval: seconds to wait between two snapshots.
+    """
+
+    def __init__(self, snapshot_func, interval):
+        self._snapshot_func = snapshot_func
+        self._interval = interval
+        self._previous = None
+
+    @staticmethod
+    def diff(previous, current):
+        events = []
+        for mac, vnic in current.by_mac.items():
+            old_vnic = previous.get_by_mac(mac)
+            if old_vnic is None:
+                events.append(DeviceEvent(ADDED, vnic.link, mac))
+            elif old_vnic != vnic:
+                events.append(DeviceEvent(CHANGED, vnic.link, mac))
+        for mac, vnic in previous.by_mac.items():
+            if current.get_by_mac(mac) is None:
+                events.append(DeviceEvent(REMOVED, vnic.link, mac))
+        return events
+
+    def get_events(self, timeout):
+        deadline = time.time() + timeout
+        while True:
+            snapshot = self._snapshot_func()
+            if self._previous is None:
+                events = []
+            else:
+                events = self.diff(self._previous, snapshot)
+            self._previous = snapshot
+            if events:
+                return events
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return []
+            eventlet.sleep(min(self._interval, remaining))
+
+
+class MonitorEventSource(DeviceEventSource):
+    """Consume datalink notifications printed by a long-running monitor.
+
+    The monitor command must print one notification per line, in the form
+    '<action> <link> [<mac>]' where action is one of add, remove or change.
+    The command is respawned if it exits.
+    """
+
+    def __init__(self, cmd, respawn_interval=5):
+        self._cmd = cmd
+        self._respawn_interval = respawn_interval
+        self._queue = queue.LightQueue()
+        self._process = None
+        self._reader = None
+        self._running = False
+
+    @staticmethod
+    def parse_line(line):
+        fields = line.split()
+        if len(fields) < 2 or fields[0] not in ACTIONS:
+            return None
+        mac = net_lib.normalize_mac(fields[2]) if len(fields) > 2 else None
+        return DeviceEvent(fields[0], fields[1], mac)
+
+    def handle_line(self, line):
+        event = self.parse_line(line)
+        if event is None:
+            LOG.debug("Ignoring unexpected monitor output: %s", line)
+            return
+        self._queue.put(event)
+
+    def _read_events(self):
+        while self._running:
+            try:
+                self._process = subprocess.Popen(
+                    self._cmd, stdout=subprocess.PIPE,
+                    universal_newlines=True)
+                for line in self._process.stdout:
+                    self.handle_line(line)
+                self._process.wait()
+            except Exception:
+                LOG.exception("Datalink monitor %s failed", self._cmd)
+            if self._running:
+                LOG.warning("Datalink monitor %s exited, respawning in "
+                            "%s seconds", self._cmd, self._respawn_interval)
+                eventlet.sleep(self._respawn_interval)
+
+    def start(self):
+        self._running = True
+        self._reader = eventlet.spawn(self._read_events)
+
+    def stop(self):
+        self._running = False
+        if self._process and self._process.poll() is None:
+            self._process.terminate()
+        if self._reader:
+            self._reader.kill()
+            self._reader = None
+
+    def get_events(self, timeout):
+        try:
+            events = [self._queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while True:
+            try:
+                events.append(self._queue.get_nowait())
+            except queue.Empty:
+                return events
@@ -15,14 +15,23 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+import contextlib
 import os
 import sys
+import time
 
+import eventlet
 from neutron_lib.agent import topics
+from neutron_lib.callbacks import events
+from neutron_lib.callbacks import registry
+from neutron_lib.callbacks import resources as local_resources
 from neutron_lib.utils import helpers
+from oslo_config import cfg
 from oslo_log import log as logging
 import oslo_messaging
 from oslo_service import service
+from oslo_utils import excutils
 
 from neutron.common import config as common_config
 from neutron.conf.agent import common as neutron_config
@@ -31,12 +40,41 @@ from neutron.plugins.ml2.drivers.agent import _agent_manager_base as amb
 from neutron.plugins.ml2.drivers.agent import _common_agent as ca
 
 from neutron_solaris import config
+from neutron_solaris.agent.solarisvnic import device_events
+from neutron_solaris.agent.solarisvnic import state_cache as agent_state
+from neutron_solaris.agent.solarisvnic import update_queue
+from neutron_solaris.agent.solarisvnic import vnic_index
+from neutron_solaris.common import metrics
+from neutron_solaris.common import tracing
 from neutron_solaris import constants
+from neutron_solaris.solaris import agent_setup
 from neutron_solaris.solaris import net_lib
 
 CONF = config.CONF
 LOG = logging.getLogger(__name__)
 
+CYCLE_DURATION = metrics.REGISTRY.histogram(
+    'solarisvnic_agent_cycle_duration_seconds',
+    'Duration of the agent loop iterations that scanned the devices.')
+CYCLE_PHASE_DURATION = metrics.REGISTRY.histogram(
+    'solarisvnic_agent_cycle_phase_duration_seconds',
+    'Duration of the scan and process phases of the agent loop '
+    'iterations.', ['phase'])
+CYCLE_DEVICES = metrics.REGISTRY.gauge(
+    'solarisvnic_agent_cycle_devices',
+    'Devices added, updated and removed in the last agent loop iteration.',
+    ['event'])
+DEVICES = metrics.REGISTRY.counter(
+    'solarisvnic_agent_devices',
+    'Devices added, updated and removed by the agent loop.', ['event'])
+DEVICE_PROCESSING_DURATION = metrics.REGISTRY.histogram(
+    'solarisvnic_agent_device_processing_seconds',
+    'Time taken to process an added or updated device.')
+RPC_DURATION = metrics.REGISTRY.histogram(
+    'solarisvnic_agent_rpc_duration_seconds',
+    'Round trip time of the RPC calls made to the neutron server.',
+    ['method'])
+
 class SolarisVNICRPCCallBack(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
                          amb.CommonAgentManagerRpcCallBackBase):
     # Set RPC API version to 1.0 by default.
@@ -55,16 +93,54 @@ class SolarisVNICRPCCallBack(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
             LOG.error("Network %s is not available.", network_id)
             return
 
+        del self.network_map[network_id]
+        self.agent.teardown_network(network_id)
+
+    def __init__(self, context, agent, sg_agent):
+        super(SolarisVNICRPCCallBack, self).__init__(context, agent, sg_agent)
+        self.update_queue = update_queue.CoalescingUpdateQueue(
+            CONF.SOLARISVNIC.update_debounce_interval)
+        self.priority_devices = set()
+
+    def _queue_update(self, mac):
+        # Only queue the device name, do not store port details, as if
+        # they're used for processing notifications there is no guarantee
+        # the notifications are processed in the same order as the relevant
+        # API requests.
+        if self.agent.mgr.is_plugged(mac):
+            priority = update_queue.PRIORITY_REFRESH
+        else:
+            priority = update_queue.PRIORITY_NEW
+        self.update_queue.add(mac, priority)
+
+    def _get_device(self, port_id):
+        for ports in self.agent.network_ports.values():
+            for port in ports:
+                if port['port_id'] == port_id:
+                    return port['device']
+        return None
+
+    def has_pending_updates(self):
+        return bool(self.updated_devices) or bool(self.update_queue)
+
+    def get_and_clear_updated_devices(self):
+        new, refresh = self.update_queue.pop_ready()
+        self.priority_devices |= new
+        updated_devices = super(SolarisVNICRPCCallBack,
+                                self).get_and_clear_updated_devices()
+        LOG.debug("Update queue stats: %s", self.update_queue.get_stats())
+        return updated_devices | new | refresh
+
+    def get_and_clear_priority_devices(self):
+        priority_devices = self.priority_devices
+        self.priority_devices = set()
+        return priority_devices
+
     def port_update(self, context, **kwargs):
         port = kwargs['port']
         LOG.debug("port_update received %s ", kwargs)
         LOG.debug("port_update received for port %s ", port)
-        mac = port['mac_address']
-        # Put the device name in the updated_devices set.
-        # Do not store port details, as if they're used for processing
-        # notifications there is no guarantee the notifications are
-        # processed in the same order as the relevant API requests.
-        self.updated_devices.add(mac)
+        self._queue_update(port['mac_address'])
 
     def network_update(self, context, **kwargs):
         network_id = kwargs['network']['id']
@@ -73,26 +149,27 @@ class SolarisVNICRPCCallBack(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
                   {'network_id': network_id})
 
     def binding_activate(self, context, **kwargs):
-        if kwargs.get('host') != self.agent.conf.host:
+        if kwargs.get('host') != cfg.CONF.host:
             return
-        LOG.debug("binding_activate received for port %s ", port)
-        mac = port['mac_address']
-        # Put the device name in the updated_devices set.
-        # Do not store port details, as if they're used for processing
-        # notifications there is no guarantee the notifications are
-        # processed in the same order as the relevant API requests.
-        self.updated_devices.add(mac)
+        port_id = kwargs.get('port_id')
+        LOG.debug("binding_activate received for port %s ", port_id)
+        mac = self._get_device(port_id)
+        if mac is None:
+            # the VNIC will show up as an added device when it is created
+            LOG.debug("No device wired for port %s", port_id)
+            return
+        self._queue_update(mac)
 
     def binding_deactivate(self, context, **kwargs):
-        if kwargs.get('host') != self.agent.conf.host:
+        if kwargs.get('host') != cfg.CONF.host:
+            return
+        port_id = kwargs.get('port_id')
+        LOG.debug("binding_deactivate received for port %s ", port_id)
+        mac = self._get_device(port_id)
+        if mac is None:
+            LOG.debug("No device wired for port %s", port_id)
             return
-        LOG.debug("binding_deactivate received for port %s ", port)
-        mac = port['mac_address']
-        # Put the device name in the updated_devices set.
-        # Do not store port details, as if they're used for processing
-        # notifications there is no guarantee the notifications are
-        # processed in the same order as the relevant API requests.
-        self.updated_devices.add(mac)
+        self._queue_update(mac)
 
 
 class SolarisVNICNetworkManager(amb.CommonAgentManagerBase):
@@ -100,6 +177,16 @@ class SolarisVNICNetworkManager(amb.CommonAgentManagerBase):
         self.interface_mappings = interface_mappings
         self.validate_interface_mappings()
         self.mac_device_name_mappings = dict()
+        self.vnic_inventory = net_lib.VNICInventory()
+        self._prefetched_inventory = None
+        self.vnic_index = vnic_index.VNICGenerationIndex(
+            CONF.SOLARISVNIC.vnic_index_file)
+        self._plug_pool = eventlet.GreenPool(CONF.SOLARISVNIC.plug_workers)
+        # device -> network_id and network_id -> devices of the wired
+        # devices, so that a network can be torn down without going
+        # through all the ports
+        self.plugged_devices = {}
+        self.network_devices = collections.defaultdict(set)
 
     def validate_interface_mappings(self):
         LOG.debug("validate_interface_mappings")
@@ -138,17 +225,44 @@ class SolarisVNICNetworkManager(amb.CommonAgentManagerBase):
         return agent_id
 
     def get_devices_modified_timestamps(self, devices):
-        # TODO(kevinbenton): this should be implemented to detect
-        # rapid Nova instance rebuilds.
-        return {}
-
+        # The index is updated by every get_all_devices() scan, so this does
+        # not need to run any command.
+        return self.vnic_index.get_timestamps(devices)
+
+    def refresh_inventory(self):
+        """Take a new VNIC snapshot.
+
+        The snapshot is handed over to the next get_all_devices() call, so
+        that an event source diffing snapshots does not cost the agent loop
+        an extra dladm call.
+        """
+        inventory = net_lib.Datalink.get_vnic_inventory()
+        self._prefetched_inventory = inventory
+        return inventory
+
+    @staticmethod
+    def _get_link_crtimes():
+        try:
+            return net_lib.Datalink.get_link_crtimes()
+        except Exception as e:
+            # the index then tells VNICs apart by name, lower link and VID
+            LOG.warning("Failed to read the creation time of the VNICs: "
+                        "%s", e)
+            return None
+
+    @tracing.traced('vnic_manager.get_all_devices')
     def get_all_devices(self):
-        devices = set()
-        for device in net_lib.Datalink.get_vnic_names():
-            mac = net_lib.Datalink.get_mac(device)
-            self.mac_device_name_mappings[mac] = device
-            devices.add(mac)
-        LOG.debug("get_all_devices %s ",devices)
+        # A single dladm show-vnic call gives us the name and MAC address
+        # of every VNIC, instead of one dladm show-linkprop per VNIC.
+        inventory = self._prefetched_inventory
+        self._prefetched_inventory = None
+        if inventory is None:
+            inventory = net_lib.Datalink.get_vnic_inventory()
+        self.vnic_inventory = inventory
+        self.vnic_index.update(inventory, self._get_link_crtimes())
+        self.mac_device_name_mappings = inventory.mac_to_link()
+        devices = set(inventory.macs)
+        LOG.debug("get_all_devices %s ", devices)
         return devices
 
     def get_extension_driver_type(self):
@@ -169,6 +283,7 @@ class SolarisVNICNetworkManager(amb.CommonAgentManagerBase):
                      [topics.PORT_BINDING, topics.ACTIVATE]]
         return consumers
 
+    @tracing.traced('vnic_manager.plug_interface')
     def plug_interface(self, network_id, network_segment, mac,
                        device_owner):
         LOG.debug("Network segment: %s, MAC: %s, owner: %s", network_segment,
@@ -180,8 +295,83 @@ class SolarisVNICNetworkManager(amb.CommonAgentManagerBase):
             return
         state = net_lib.Datalink.get_prop(vnic_name, 'state')
         LOG.debug("VNIC %s state is %s", vnic_name, state)
+        self.mark_plugged(mac, network_id)
         return True
-        
+
+    def device_exists(self, device):
+        """Whether the VNIC device (a MAC address) was last seen on exists.
+
+        Only that VNIC is looked up, so unlike get_all_devices() this does
+        not replace the inventory and mappings other devices being
+        processed at the same time are using.
+        """
+        vnic_name = self.mac_device_name_mappings.get(device)
+        if vnic_name is None:
+            return False
+        vnic = net_lib.Datalink.get_vnic(vnic_name)
+        return vnic is not None and vnic.mac == device
+
+    def mark_plugged(self, device, network_id):
+        previous = self.plugged_devices.get(device)
+        if previous == network_id:
+            return
+        if previous is not None:
+            self._unindex_device(device)
+        self.plugged_devices[device] = network_id
+        self.network_devices[network_id].add(device)
+
+    def _unindex_device(self, device):
+        network_id = self.plugged_devices.pop(device, None)
+        if network_id is None:
+            return
+        devices = self.network_devices[network_id]
+        devices.discard(device)
+        if not devices:
+            del self.network_devices[network_id]
+
+    def is_plugged(self, device):
+        return device in self.plugged_devices
+
+    def get_network_devices(self, network_id):
+        return set(self.network_devices.get(network_id, ()))
+
+    def remove_devices(self, devices):
+        for device in devices:
+            self._unindex_device(device)
+
+    @tracing.traced('vnic_manager.unplug_network')
+    def unplug_network(self, network_id):
+        """Forget all the devices wired on network_id.
+
+        :returns: the set of devices that were wired on the network.
+        """
+        devices = self.network_devices.pop(network_id, set())
+        for device in devices:
+            del self.plugged_devices[device]
+        return devices
+
+    def process_devices(self, devices_details, process_func):
+        """Run process_func on every device details on the plug pool.
+
+        At most plug_workers devices are processed at the same time. Each
+        device is handled start to end by a single green thread, so the
+        steps for one device keep their order.
+
+        :returns: dict mapping every device to the exception raised while
+                  processing it, or None if it was processed successfully.
+        """
+        def _process(device_details):
+            device = device_details['device']
+            try:
+                with DEVICE_PROCESSING_DURATION.time(), \
+                        tracing.span('port.setup', device=device):
+                    process_func(device_details)
+            except Exception as e:
+                LOG.exception("Failed to process device %s", device)
+                return device, e
+            return device, None
+
+        return dict(self._plug_pool.imap(_process, devices_details))
 
     def setup_arp_spoofing_protection(self, device, device_details):
         pass
@@ -193,6 +383,343 @@ class SolarisVNICNetworkManager(amb.CommonAgentManagerBase):
         pass
 
 
+class SolarisVNICAgentLoop(ca.CommonAgentLoop):
+    """Common agent loop woken up by datalink events.
+
+    Without an event source this behaves like the plain CommonAgentLoop
+    and scans the VNICs every polling_interval. With one, the loop waits
+    on the event source for up to polling_interval seconds instead of
+    sleeping, and only scans the VNICs when the event source reported
+    something, an RPC notification is pending or a periodic full resync
+    is due. Datalinks reported as changed are the only ones put in
+    the updated devices set, added and removed ones are found by the scan.
+
+    With a state cache, the state of every wired device is persisted and
+    on start up the devices whose VNIC and configuration did not change
+    while the agent was down are not plugged again. One full resync
+    follows such a warm start, after resync_interval seconds, or
+    polling_interval ones if the periodic resync is disabled.
+
+    Every iteration that scans the devices is accounted for in the process
+    metrics, which the metrics exporter, if any, exposes.
+    """
+
+    def __init__(self, manager, polling_interval, quitting_rpc_timeout,
+                 agent_type, agent_binary, event_source=None,
+                 resync_interval=0, state_cache=None, metrics_exporter=None):
+        super(SolarisVNICAgentLoop, self).__init__(
+            manager, polling_interval, quitting_rpc_timeout, agent_type,
+            agent_binary)
+        self.event_source = event_source
+        self.resync_interval = resync_interval
+        self.state_cache = state_cache
+        self.metrics_exporter = metrics_exporter
+        self._last_resync = 0
+        # time of the full resync following a warm start
+        self._resync_due = None
+        self._events_pending = False
+        self._changed_devices = set()
+        self._priority_devices = set()
+
+    def start(self):
+        if self.state_cache is not None:
+            registry.subscribe(self._port_device_updated,
+                               local_resources.PORT_DEVICE,
+                               events.AFTER_UPDATE)
+            registry.subscribe(self._port_device_deleted,
+                               local_resources.PORT_DEVICE,
+                               events.AFTER_DELETE)
+        super(SolarisVNICAgentLoop, self).start()
+
+    def stop(self, graceful=True):
+        super(SolarisVNICAgentLoop, self).stop(graceful)
+        agent_setup.shutdown()
+
+    def setup_rpc(self):
+        super(SolarisVNICAgentLoop, self).setup_rpc()
+        self.plugin_rpc = metrics.TimedProxy(self.plugin_rpc, RPC_DURATION)
+        self.state_rpc = metrics.TimedProxy(self.state_rpc, RPC_DURATION)
+        self.sg_agent.plugin_rpc = metrics.TimedProxy(self.sg_agent.plugin_rpc,
+                                                      RPC_DURATION)
+
+    def _port_device_updated(self, resource, event, trigger, payload):
+        device = payload.resource_id
+        self.state_cache.update(device, payload.latest_state,
+                                self.mgr.vnic_inventory.get_by_mac(device))
+
+    def _port_device_deleted(self, resource, event, trigger, payload):
+        self.state_cache.remove(payload.resource_id)
+
+    def scan_devices(self, previous, sync):
+        device_info = super(SolarisVNICAgentLoop, self).scan_devices(
+            previous, sync)
+        if previous is None and self.state_cache is not None:
+            self._warm_start(device_info)
+        return device_info
+
+    def _warm_start(self, device_info):
+        """Reconcile the first scan with the persisted agent state.
+
+        The details of the devices still on the VNIC they were wired on
+        are fetched from the server in a single call. Those whose
+        configuration did not change while the agent was down get their
+        network bookkeeping, port filters and extensions restored, but are
+        not plugged again. Cached devices that went away while the agent
+        was down are reported as removed. A full resync is scheduled as a
+        safety net, in case the server changed anything else meanwhile.
+        """
+        candidates = set()
+        for device in device_info['added']:
+            entry = self.state_cache.get(device)
+            vnic = self.mgr.vnic_inventory.get_by_mac(device)
+            if entry is not None and self.state_cache.matches(entry, vnic):
+                candidates.add(device)
+
+        unchanged = set()
+        devices_details_list = []
+        if candidates:
+            try:
+                devices_details_list = (
+                    self.plugin_rpc.get_devices_details_list(
+                        self.context, candidates, self.agent_id,
+                        host=cfg.CONF.host))
+            except Exception:
+                LOG.exception("Unable to get port details for %s, they "
+                              "will be processed again", candidates)
+        for device_details in devices_details_list:
+            device = device_details['device']
+            entry = self.state_cache.get(device)
+            if ('port_id' not in device_details or
+                    not self.state_cache.is_current(entry, device_details)):
+                continue
+            segment = amb.NetworkSegment(**entry['segment'])
+            self.rpc_callbacks.add_network(entry['network_id'], segment)
+            self._update_network_ports(entry['network_id'],
+                                       entry['port_id'], device)
+            self.mgr.mark_plugged(device, entry['network_id'])
+            self.ext_manager.handle_port(self.context, device_details)
+            unchanged.add(device)
+        if unchanged:
+            self.sg_agent.setup_port_filters(unchanged, set())
+            self._resync_due = time.time() + (self.resync_interval or
+                                              self.polling_interval)
+
+        device_info['added'] = device_info['added'] - unchanged
+        device_info['removed'] = (device_info['removed'] |
+                                  self.state_cache.devices -
+                                  device_info['current'])
+        LOG.info("Warm start: %(unchanged)d devices unchanged, "
+                 "%(added)d to process and %(removed)d removed",
+                 {'unchanged': len(unchanged),
+                  'added': len(device_info['added']),
+                  'removed': len(device_info['removed'])})
+
+    def treat_devices_added_updated(self, devices):
+        try:
+            devices_details_list = self.plugin_rpc.get_devices_details_list(
+                self.context, devices, self.agent_id, host=cfg.CONF.host)
+        except Exception:
+            LOG.exception("Unable to get port details for %s", devices)
+            # resync is needed
+            return True
+
+        # ports that are not wired yet go before refreshes of wired ones
+        devices_details_list = sorted(
+            devices_details_list,
+            key=lambda details: details['device'] not in
+            self._priority_devices)
+        results = self.mgr.process_devices(devices_details_list,
+                                           self._process_device_if_exists)
+        failed = {device for device, error in results.items() if error}
+        if failed:
+            # only retry the devices that failed instead of a full resync
+            LOG.warning("Failed to process devices %s, they will be retried "
+                        "in the next iteration", failed)
+            self.rpc_callbacks.updated_devices |= failed
+        return False
+
+    @contextlib.contextmanager
+    def _ignore_missing_device_exceptions(self, device):
+        # This runs in the plug workers, so the device is looked up on its
+        # own instead of rescanning all of them like the base class does.
+        try:
+            yield
+        except Exception:
+            with excutils.save_and_reraise_exception() as ectx:
+                if not self.mgr.device_exists(device):
+                    ectx.reraise = False
+                    LOG.debug("%s was removed during processing.", device)
+
+    def treat_devices_removed(self, devices):
+        resync = super(SolarisVNICAgentLoop,
+                       self).treat_devices_removed(devices)
+        self.mgr.remove_devices(devices)
+        return resync
+
+    def teardown_network(self, network_id):
+        """Tear down every device wired on a deleted network in one pass.
+
+        Only the devices of the network are visited, using the network
+        index of the manager and the ports recorded for the network.
+
+        :returns: the set of devices torn down.
+        """
+        ports = self.network_ports.pop(network_id, [])
+        devices = self.mgr.unplug_network(network_id)
+        devices.update(port['device'] for port in ports)
+        if not devices:
+            return devices
+
+        self.sg_agent.remove_devices_filter(devices)
+        for port in ports:
+            self.ext_manager.delete_port(
+                self.context, {'device': port['device'],
+                               'port_id': port['port_id']})
+        self.mgr.delete_arp_spoofing_protection(devices)
+        if self.state_cache is not None:
+            for device in devices:
+                self.state_cache.remove(device)
+            self.state_cache.save()
+        LOG.info("Network %(network_id)s deleted, tore down devices "
+                 "%(devices)s", {'network_id': network_id,
+                                 'devices': devices})
+        return devices
+
+    def process_network_devices(self, device_info):
+        self._priority_devices = (
+            set(device_info.get('added', ())) |
+            self.rpc_callbacks.get_and_clear_priority_devices())
+        try:
+            return super(SolarisVNICAgentLoop,
+                         self).process_network_devices(device_info)
+        finally:
+            if self.state_cache is not None:
+                self.state_cache.save()
+
+    def daemon_loop(self):
+        LOG.info("%s Agent RPC Daemon Started!", self.agent_type)
+        device_info = None
+        sync = True
+        if self.event_source is not None:
+            self.event_source.start()
+        try:
+            while True:
+                start = time.time()
+                device_info, sync = self.run_iteration(device_info, sync)
+                if self.event_source is not None:
+                    self.wait_for_events()
+                else:
+                    self.wait_for_polling_interval(start)
+        finally:
+            if self.event_source is not None:
+                self.event_source.stop()
+
+    def wait_for_polling_interval(self, start):
+        # sleep till end of polling interval
+        elapsed = time.time() - start
+        if elapsed < self.polling_interval:
+            time.sleep(self.polling_interval - elapsed)
+        else:
+            LOG.debug("Loop iteration exceeded interval "
+                      "(%(polling_interval)s vs. %(elapsed)s)!",
+                      {'polling_interval': self.polling_interval,
+                       'elapsed': elapsed})
+
+    def wait_for_events(self):
+        events = self.event_source.get_events(self.polling_interval)
+        for event in events:
+            LOG.debug("Datalink event: %s", event)
+            if event.action == device_events.CHANGED and event.mac:
+                self._changed_devices.add(event.mac)
+        if events:
+            self._events_pending = True
+
+    def _scan_needed(self, sync):
+        # without an event source the devices are polled every iteration
+        return (self.event_source is None or sync or
+                self._events_pending or self._changed_devices or
+                self.rpc_callbacks.has_pending_updates() or
+                self.sg_agent.firewall_refresh_needed())
+
+    def run_iteration(self, device_info, sync):
+        start = time.time()
+        if self.fullsync:
+            sync = True
+            self.fullsync = False
+        if (self.event_source is not None and self.resync_interval and
+                start - self._last_resync >= self.resync_interval):
+            sync = True
+        if self._resync_due is not None and start >= self._resync_due:
+            sync = True
+            self._resync_due = None
+
+        if device_info is not None and not self._scan_needed(sync):
+            return device_info, sync
+
+        LOG.info("%s Agent loop - iteration:%d started",
+                 self.agent_type, self.iter_num)
+        if sync:
+            LOG.info("%s Agent out of sync with plugin!", self.agent_type)
+            self._last_resync = start
+
+        self.rpc_callbacks.updated_devices |= self._changed_devices
+        self._changed_devices = set()
+        self._events_pending = False
+
+        with CYCLE_PHASE_DURATION.time(phase='scan'):
+            device_info = self.scan_devices(previous=device_info, sync=sync)
+        sync = False
+
+        if (self._device_info_has_changes(device_info) or
+                self.sg_agent.firewall_refresh_needed()):
+            LOG.debug("Agent loop found changes! %s", device_info)
+            try:
+                with CYCLE_PHASE_DURATION.time(phase='process'):
+                    sync = self.process_network_devices(device_info)
+            except Exception:
+                LOG.exception("Error in agent loop. Devices info: %s",
+                              device_info)
+                sync = True
+
+        self._account_iteration(device_info, time.time() - start)
+        LOG.info("%s Agent loop - iteration:%d completed",
+                 self.agent_type, self.iter_num)
+        self.iter_num = self.iter_num + 1
+        return device_info, sync
+
+    def _account_iteration(self, device_info, elapsed):
+        CYCLE_DURATION.observe(elapsed)
+        for event in ('added', 'updated', 'removed'):
+            count = len(device_info.get(event) or ())
+            CYCLE_DEVICES.set(count, event=event)
+            DEVICES.inc(count, event=event)
+        if self.metrics_exporter is not None:
+            self.metrics_exporter.write()
+
+
+def get_device_event_source(manager):
+    source = CONF.SOLARISVNIC.device_event_source
+    if source == 'snapshot':
+        return device_events.SnapshotDiffEventSource(
+            manager.refresh_inventory,
+            CONF.SOLARISVNIC.device_event_poll_interval)
+    if source == 'monitor':
+        if not CONF.SOLARISVNIC.device_event_monitor_command:
+            LOG.error("device_event_source is 'monitor' but no "
+                      "device_event_monitor_command is configured. "
+                      "Agent terminated!")
+            sys.exit(1)
+        return device_events.MonitorEventSource(
+            CONF.SOLARISVNIC.device_event_monitor_command)
+    return None
+
+
+def get_state_cache():
+    if not CONF.SOLARISVNIC.state_cache_file:
+        return None
+    return agent_state.AgentStateCache(CONF.SOLARISVNIC.state_cache_file)
+
+
 def parse_interface_mappings():
     if not CONF.SOLARISVNIC.physical_interface_mappings:
         LOG.error("No physical_interface_mappings provided, but at least "
@@ -229,16 +756,23 @@ def main():
     neutron_config.setup_logging()
 
     validate_firewall_driver()
+    agent_setup.setup()
+    net_lib.Datalink.link_cache = net_lib.LinkPropertyCache(
+        CONF.SOLARISVNIC.link_cache_ttl, CONF.SOLARISVNIC.link_cache_size)
     interface_mappings = parse_interface_mappings()
 
     manager = SolarisVNICNetworkManager(interface_mappings)
 
     polling_interval = CONF.AGENT.polling_interval
     quitting_rpc_timeout = CONF.AGENT.quitting_rpc_timeout
-    agent = ca.CommonAgentLoop(manager, polling_interval,
-                               quitting_rpc_timeout,
-                               constants.AGENT_TYPE_SOLARISVNIC,
-                               constants.AGENT_PROCESS_SOLARISVNIC)
+    agent = SolarisVNICAgentLoop(
+        manager, polling_interval, quitting_rpc_timeout,
+        constants.AGENT_TYPE_SOLARISVNIC,
+        constants.AGENT_PROCESS_SOLARISVNIC,
+        event_source=get_device_event_source(manager),
+        resync_interval=CONF.SOLARISVNIC.full_resync_interval,
+        state_cache=get_state_cache(),
+        metrics_exporter=agent_setup.get_metrics_exporter())
     LOG.info("Agent initialized successfully, now running... ")
     launcher = service.launch(CONF, agent, restart_method='mutate')
     launcher.wait()
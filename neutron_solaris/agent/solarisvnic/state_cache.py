@@ -0,0 +1,119 @@
+# Copyright 2021, Guillermo Adrian Molina.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import hashlib
+
+from oslo_log import log as logging
+from oslo_serialization import jsonutils
+
+from neutron_solaris.common import state_file
+
+LOG = logging.getLogger(__name__)
+
+# device details that make up the configuration applied to a port
+CONFIG_KEYS = ('port_id', 'network_id', 'network_type', 'physical_network',
+               'segmentation_id', 'mtu', 'admin_state_up', 'device_owner',
+               'fixed_ips')
+
+
+class AgentStateCache(object):
+    """Last known state of the devices wired by the agent.
+
+    For every device (MAC address) the cache records the VNIC it was
+    found on, the network and segment it is bound to, its port and a hash
+    of the configuration applied to it. The agent uses it on start up to
+    skip plugging again the devices whose VNIC and configuration did not
+    change while it was down.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path):
+        self._path = path
+        self._dirty = False
+        self._devices = state_file.load(path, self.VERSION) or {}
+
+    def __contains__(self, device):
+        return device in self._devices
+
+    def __len__(self):
+        return len(self._devices)
+
+    @property
+    def devices(self):
+        return set(self._devices)
+
+    def get(self, device):
+        return self._devices.get(device)
+
+    @staticmethod
+    def config_hash(details):
+        config = {key: details.get(key) for key in CONFIG_KEYS}
+        data = jsonutils.dumps(config, sort_keys=True)
+        return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def matches(entry, vnic):
+        """Whether the observed VNIC is the one the entry was recorded on."""
+        return (vnic is not None and
+                [entry['link'], entry['over'], entry['vid']] ==
+                [vnic.link, vnic.over, vnic.vid])
+
+    @classmethod
+    def is_current(cls, entry, details):
+        """Whether the entry was recorded with the configuration in details.
+
+        :param details: fresh device details from the server.
+        """
+        return entry.get('config_hash') == cls.config_hash(details)
+
+    def update(self, device, details, vnic):
+        """Record the configuration applied to device.
+
+        :returns: True if the recorded state changed.
+        """
+        entry = {
+            'link': vnic.link if vnic else None,
+            'over': vnic.over if vnic else None,
+            'vid': vnic.vid if vnic else None,
+            'network_id': details['network_id'],
+            'port_id': details['port_id'],
+            'segment': {
+                'network_type': details.get('network_type'),
+                'physical_network': details.get('physical_network'),
+                'segmentation_id': details.get('segmentation_id'),
+                'mtu': details.get('mtu'),
+            },
+            'config_hash': self.config_hash(details),
+        }
+        if self._devices.get(device) == entry:
+            return False
+        self._devices[device] = entry
+        self._dirty = True
+        return True
+
+    def remove(self, device):
+        if self._devices.pop(device, None) is not None:
+            self._dirty = True
+
+    def save(self):
+        if not self._dirty:
+            return
+        try:
+            state_file.save(self._path, self._devices, self.VERSION)
+            self._dirty = False
+        except OSError as e:
+            LOG.warning("Failed to save the agent state to %(path)s: "
+                        "%(err)s", {'path': self._path, 'err': e})
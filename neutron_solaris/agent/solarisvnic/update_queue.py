@@ -0,0 +1,106 @@
+# Copyright 2021, Guillermo Adrian Molina.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import time
+
+from neutron_solaris.common import metrics
+
+PRIORITY_NEW = 0
+PRIORITY_REFRESH = 1
+
+UPDATES = metrics.REGISTRY.counter(
+    'solarisvnic_agent_port_updates',
+    'Port update notifications received, coalesced with a queued one and '
+    'handed out for processing by the update queue.', ['result'])
+PENDING_UPDATES = metrics.REGISTRY.gauge(
+    'solarisvnic_agent_pending_port_updates',
+    'Devices waiting in the update queue for their debounce window to '
+    'expire.')
+
+
+class CoalescingUpdateQueue(object):
+    """Debounced queue of device update notifications.
+
+    Notifications for a device already in the queue are coalesced into a
+    single entry, only the latest one counts and restarts the debounce
+    window of the device. A device is handed out once no notification for
+    it was received for debounce seconds, or at the latest max_delay
+    seconds after its first queued notification so that a never ending
+    storm can not starve it.
+
+    Every entry is in one of two lanes: PRIORITY_NEW for ports that are
+    not wired yet and PRIORITY_REFRESH for ports that already are. A
+    device queued in both lanes stays in the new one.
+
+    The notifications received, coalesced and processed are also counted
+    in the process metrics, along with the number of pending devices.
+    """
+
+    def __init__(self, debounce, max_delay=None):
+        self._debounce = debounce
+        self._max_delay = (max_delay if max_delay is not None
+                           else 10 * debounce)
+        # device -> (priority, first notification, last notification)
+        self._pending = {}
+        self._stats = {'received': 0, 'coalesced': 0, 'processed': 0}
+
+    def __len__(self):
+        return len(self._pending)
+
+    def __contains__(self, device):
+        return device in self._pending
+
+    def add(self, device, priority=PRIORITY_REFRESH, now=None):
+        now = time.time() if now is None else now
+        self._count('received')
+        entry = self._pending.get(device)
+        if entry is None:
+            self._pending[device] = (priority, now, now)
+            PENDING_UPDATES.set(len(self._pending))
+        else:
+            self._count('coalesced')
+            self._pending[device] = (min(priority, entry[0]), entry[1], now)
+
+    def _count(self, result, count=1):
+        self._stats[result] += count
+        UPDATES.inc(count, result=result)
+
+    def pop_ready(self, now=None):
+        """Remove the devices whose debounce window expired.
+
+        :returns: tuple of two sets, the devices in the new lane and the
+                  devices in the refresh lane.
+        """
+        now = time.time() if now is None else now
+        new = set()
+        refresh = set()
+        for device, (priority, first, last) in list(self._pending.items()):
+            if (now - last < self._debounce and
+                    now - first < self._max_delay):
+                continue
+            del self._pending[device]
+            if priority == PRIORITY_NEW:
+                new.add(device)
+            else:
+                refresh.add(device)
+        if new or refresh:
+            self._count('processed', len(new) + len(refresh))
+            PENDING_UPDATES.set(len(self._pending))
+        return new, refresh
+
+    def get_stats(self):
+        stats = dict(self._stats)
+        stats['pending'] = len(self._pending)
+        return stats
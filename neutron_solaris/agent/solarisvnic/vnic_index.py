@@ -0,0 +1,114 @@
+# Copyright 2021, Guillermo Adrian Molina.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import time
+
+from oslo_log import log as logging
+
+from neutron_solaris.common import state_file
+
+LOG = logging.getLogger(__name__)
+
+
+class VNICGenerationIndex(object):
+    """Generation index of the VNICs on the host, keyed by MAC address.
+
+    dladm(1M) does not report when a VNIC was created, so every VNIC is
+    given a generation number and the time it was first seen with its
+    current identity: link name, lower link, VLAN ID and the crtime of its
+    kstats. When a VNIC is re-created with the same MAC address, as
+    happens on a Nova rebuild, it gets a new generation and timestamp,
+    even if it got the same name, lower link and VLAN ID back.
+
+    The index is kept up to date from the inventory snapshots the agent
+    already takes, so it never runs a command of its own, and is persisted
+    to path (if set) whenever it changes.
+    """
+
+    VERSION = 2
+
+    def __init__(self, path=None):
+        self._path = path
+        self._generation = 0
+        self._entries = {}
+        self._load()
+
+    def _load(self):
+        if not self._path:
+            return
+        data = state_file.load(self._path, self.VERSION)
+        if not data:
+            return
+        self._generation = data.get('generation', 0)
+        self._entries = data.get('entries', {})
+
+    def _save(self):
+        if not self._path:
+            return
+        data = {'generation': self._generation, 'entries': self._entries}
+        try:
+            state_file.save(self._path, data, self.VERSION)
+        except OSError as e:
+            LOG.warning("Failed to save the VNIC index to %(path)s: %(err)s",
+                        {'path': self._path, 'err': e})
+
+    @staticmethod
+    def _identity(vnic, crtime):
+        return [vnic.link, vnic.over, vnic.vid, crtime]
+
+    @staticmethod
+    def _same(identity, other):
+        # a crtime that could not be read matches any
+        return (identity[:3] == other[:3] and
+                (identity[3] is None or other[3] is None or
+                 identity[3] == other[3]))
+
+    def update(self, inventory, crtimes=None, now=None):
+        """Bring the index in line with a net_lib.VNICInventory snapshot.
+
+        :param crtimes: {link: kstat crtime} of the links, as returned by
+                        net_lib.Datalink.get_link_crtimes(), if available.
+        """
+        now = time.time() if now is None else now
+        crtimes = crtimes or {}
+        changed = False
+        for vnic in inventory:
+            identity = self._identity(vnic, crtimes.get(vnic.link))
+            entry = self._entries.get(vnic.mac)
+            if entry is not None and self._same(entry['identity'], identity):
+                if entry['identity'][3] is None and identity[3] is not None:
+                    entry['identity'] = identity
+                    changed = True
+                continue
+            self._generation += 1
+            self._entries[vnic.mac] = {'identity': identity,
+                                       'generation': self._generation,
+                                       'first_seen': now}
+            changed = True
+
+        for mac in set(self._entries) - inventory.macs:
+            del self._entries[mac]
+            changed = True
+
+        if changed:
+            self._save()
+
+    def get_generation(self, mac):
+        entry = self._entries.get(mac)
+        return entry['generation'] if entry else None
+
+    def get_timestamps(self, devices):
+        return {mac: self._entries[mac]['first_seen']
+                for mac in devices if mac in self._entries}
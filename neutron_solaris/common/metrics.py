@@ -0,0 +1,312 @@
+# Copyright 2021, Guillermo Adrian Molina.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Process wide metrics exposed in the OpenMetrics text format.
+
+Metrics are registered once at import time of the module that updates
+them and live in the REGISTRY of the process. The MetricsExporter serves
+them from a local HTTP listener and/or writes them to a file.
+"""
+
+import abc
+import contextlib
+import threading
+import time
+
+import eventlet
+from eventlet import wsgi
+from oslo_log import log as logging
+
+from neutron_solaris.common import state_file
+
+LOG = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0, 30.0, 60.0)
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return '%d' % value
+    return repr(value)
+
+
+def _format_bound(bound):
+    return '+Inf' if bound == float('inf') else repr(float(bound))
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = ('%s="%s"' % (name, str(value).replace('\\', '\\\\')
+                            .replace('"', '\\"').replace('\n', '\\n'))
+               for name, value in pairs)
+    return '{%s}' % ','.join(escaped)
+
+
+class _Metric(abc.ABC):
+    TYPE = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError("Metric %s takes labels %s, got %s" %
+                             (self.name, self.labelnames, sorted(labels)))
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    @abc.abstractmethod
+    def samples(self):
+        """Return the (suffix, label values, extra labels, value) samples."""
+
+    def render(self):
+        lines = ['# TYPE %s %s' % (self.name, self.TYPE),
+                 '# HELP %s %s' % (self.name, self.documentation)]
+        for suffix, labels, extra, value in self.samples():
+            lines.append('%s%s%s %s' % (
+                self.name, suffix,
+                _format_labels(self.labelnames, labels, extra),
+                _format_value(value)))
+        return lines
+
+
+class Counter(_Metric):
+    TYPE = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            return [('_total', key, (), value)
+                    for key, value in sorted(self._values.items())]
+
+
+class Gauge(_Metric):
+    TYPE = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def get(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            return [('', key, (), value)
+                    for key, value in sorted(self._values.items())]
+
+
+class Histogram(_Metric):
+    TYPE = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(),
+                 buckets=DEFAULT_BUCKETS):
+        super(Histogram, self).__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0, 0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += 1
+            entry[2] += value
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.observe(time.time() - start, **labels)
+
+    def get_count(self, **labels):
+        entry = self._values.get(self._key(labels))
+        return entry[1] if entry else 0
+
+    def get_sum(self, **labels):
+        entry = self._values.get(self._key(labels))
+        return entry[2] if entry else 0.0
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, (buckets, count, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket in zip(self.buckets, buckets):
+                    cumulative += bucket
+                    samples.append(('_bucket', key,
+                                    (('le', _format_bound(bound)),),
+                                    cumulative))
+                samples.append(('_count', key, (), count))
+                samples.append(('_sum', key, (), total))
+        return samples
+
+
+class MetricsRegistry(object):
+    """Collection of the metrics of a process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _register(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError("Metric %s is already registered as a %s" %
+                                 (name, metric.TYPE))
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(),
+                  buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, documentation, labelnames,
+                              buckets=buckets)
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def clear(self):
+        """Reset the values of all the metrics, mainly for tests."""
+        for metric in list(self._metrics.values()):
+            metric.clear()
+
+    def render(self):
+        lines = []
+        for name in sorted(self._metrics):
+            lines.extend(self._metrics[name].render())
+        lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+
+class TimedProxy(object):
+    """Proxy timing every method call of an object in a histogram.
+
+    The histogram must take a single 'method' label, which is set to the
+    name of the method called.
+    """
+
+    def __init__(self, obj, histogram):
+        self._obj = obj
+        self._histogram = histogram
+
+    def __getattr__(self, name):
+        attr = getattr(self._obj, name)
+        if not callable(attr) or name.startswith('_'):
+            return attr
+
+        def _timed(*args, **kwargs):
+            with self._histogram.time(method=name):
+                return attr(*args, **kwargs)
+        return _timed
+
+
+class MetricsExporter(object):
+    """Expose a MetricsRegistry over HTTP and/or in a file.
+
+    :param registry: the MetricsRegistry to expose.
+    :param listen_address: address of the HTTP listener.
+    :param port: port of the HTTP listener, no listener is started if it
+                 is not set.
+    :param path: file the metrics are written to on every write() call,
+                 nothing is written if it is not set.
+    """
+
+    def __init__(self, registry, listen_address='127.0.0.1', port=None,
+                 path=None):
+        self._registry = registry
+        self._listen_address = listen_address
+        self._port = port
+        self._path = path
+        self._server = None
+        self._socket = None
+
+    @property
+    def enabled(self):
+        return bool(self._port or self._path)
+
+    def start(self):
+        if not self._port:
+            return
+        self._socket = eventlet.listen((self._listen_address, self._port))
+        self._server = eventlet.spawn(wsgi.server, self._socket, self._app,
+                                      log=LOG, log_output=False)
+        LOG.info("Serving metrics on http://%(addr)s:%(port)s/metrics",
+                 {'addr': self._listen_address, 'port': self._port})
+
+    def stop(self):
+        if self._server is not None:
+            self._server.kill()
+            self._server = None
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+    def _app(self, environ, start_response):
+        if (environ.get('REQUEST_METHOD') != 'GET' or
+                environ.get('PATH_INFO') not in ('/', '/metrics')):
+            start_response('404 Not Found', [('Content-Type', 'text/plain')])
+            return [b'Not Found\n']
+        body = self._registry.render().encode('utf-8')
+        start_response('200 OK', [('Content-Type', CONTENT_TYPE),
+                                  ('Content-Length', str(len(body)))])
+        return [body]
+
+    def write(self):
+        if not self._path:
+            return
+        try:
+            state_file.write(self._path, self._registry.render())
+        except OSError as e:
+            LOG.warning("Failed to write the metrics to %(path)s: %(err)s",
+                        {'path': self._path, 'err': e})
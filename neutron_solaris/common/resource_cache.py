@@ -0,0 +1,188 @@
+# Copyright 2021, Guillermo Adrian Molina.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Cache of the objects of the Neutron API, shared by all its users.
+
+The Neutron client and the network cache of the interface drivers keep
+their objects in a ResourceCache. Every ResourceCache of the process is
+invalidated by invalidate_network() and handle_notification(), so that a
+change is dropped from all of them in one place.
+"""
+
+import collections
+import threading
+import time
+import weakref
+
+from neutron_solaris.common import metrics
+
+NETWORK = 'network'
+SUBNET = 'subnet'
+PORT = 'port'
+
+LOOKUPS = metrics.REGISTRY.counter(
+    'neutron_solaris_api_cache_lookups',
+    'Neutron API cache lookups by resource and result.',
+    ['resource', 'result'])
+
+# returned by get() for the objects not in the cache
+MISSING = object()
+# returned by get() for the objects the API did not find
+NOT_FOUND = object()
+
+# every ResourceCache of the process
+_CACHES = weakref.WeakSet()
+
+
+class ResourceCache(object):
+    """Cache of Neutron API objects with per-resource TTL and LRU eviction.
+
+    ttls maps every cached resource, e.g. 'port', to the seconds its
+    objects are kept for, the resources not in it are not cached. At most
+    max_size objects are kept, the least recently used one is evicted
+    first. The objects the API did not find are remembered as missing for
+    negative_ttl seconds.
+
+    The objects are loaded without holding the lock of the cache, an
+    object loaded while the cache was invalidated may be stale already and
+    is not stored if the generation read before loading it is passed to
+    set().
+    """
+
+    def __init__(self, ttls, max_size=1000, negative_ttl=10,
+                 clock=time.time):
+        self.ttls = dict((resource, ttl) for resource, ttl in ttls.items()
+                         if ttl > 0)
+        self.max_size = max_size
+        self.negative_ttl = negative_ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        # (resource, id) -> (object, expiry), in least recently used order
+        self._objects = collections.OrderedDict()
+        self._stats = collections.Counter()
+        # bumped by every invalidation
+        self.generation = 0
+        _CACHES.add(self)
+
+    def __len__(self):
+        return len(self._objects)
+
+    def caches(self, resource):
+        return resource in self.ttls
+
+    def get(self, resource, obj_id):
+        """Return the cached object, NOT_FOUND or MISSING."""
+        key = (resource, obj_id)
+        with self._lock:
+            entry = self._objects.get(key)
+            if entry is not None and entry[1] <= self._clock():
+                del self._objects[key]
+                entry = None
+            if entry is None:
+                result = 'miss'
+                value = MISSING
+            else:
+                self._objects.move_to_end(key)
+                result = 'negative_hit' if entry[0] is NOT_FOUND else 'hit'
+                value = entry[0]
+            self._stats[result] += 1
+        LOOKUPS.inc(resource=resource, result=result)
+        return value
+
+    def _set(self, resource, obj_id, value, ttl, generation):
+        if ttl <= 0:
+            return
+        key = (resource, obj_id)
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._objects[key] = (value, self._clock() + ttl)
+            self._objects.move_to_end(key)
+            while len(self._objects) > self.max_size:
+                self._objects.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def set(self, resource, obj_id, obj, generation=None):
+        self._set(resource, obj_id, obj, self.ttls.get(resource, 0),
+                  generation)
+
+    def set_not_found(self, resource, obj_id, generation=None):
+        self._set(resource, obj_id, NOT_FOUND, self.negative_ttl,
+                  generation)
+
+    def invalidate(self, resource=None, obj_id=None):
+        """Drop obj_id, all the objects of resource, or everything."""
+        with self._lock:
+            self.generation += 1
+            if resource is None:
+                self._objects.clear()
+            elif obj_id is not None:
+                self._objects.pop((resource, obj_id), None)
+            else:
+                for key in [key for key in self._objects
+                            if key[0] == resource]:
+                    del self._objects[key]
+
+    def invalidate_network(self, network_id):
+        """Drop a network, and the subnets and ports cached for it."""
+        with self._lock:
+            self.generation += 1
+            entry = self._objects.pop((NETWORK, network_id), None)
+            if entry is not None and entry[0] is not NOT_FOUND:
+                for subnet_id in entry[0].get('subnets', []):
+                    self._objects.pop((SUBNET, subnet_id), None)
+            for key, (obj, _expiry) in list(self._objects.items()):
+                if (obj is not NOT_FOUND and
+                        obj.get('network_id') == network_id):
+                    del self._objects[key]
+
+    def handle_notification(self, event_type, payload):
+        """Invalidate the objects a Neutron notification is about.
+
+        :param event_type: e.g. 'port.update.end'.
+        :param payload: the notification payload.
+        """
+        resource = event_type.split('.', 1)[0]
+        if resource not in (NETWORK, SUBNET, PORT):
+            return
+        obj = payload.get(resource) or {}
+        obj_id = obj.get('id') or payload.get('%s_id' % resource)
+        if resource == NETWORK and obj_id is not None:
+            self.invalidate_network(obj_id)
+        else:
+            self.invalidate(resource, obj_id)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['objects'] = len(self._objects)
+        lookups = (stats.get('hit', 0) + stats.get('negative_hit', 0) +
+                   stats.get('miss', 0))
+        stats['hit_ratio'] = (
+            float(lookups - stats.get('miss', 0)) / lookups
+            if lookups else 0.0)
+        return stats
+
+
+def invalidate_network(network_id):
+    """Invalidate a network, its subnets and ports, in all the caches."""
+    for cache in list(_CACHES):
+        cache.invalidate_network(network_id)
+
+
+def handle_notification(event_type, payload):
+    """Invalidate the objects a Neutron notification is about everywhere."""
+    for cache in list(_CACHES):
+        cache.handle_notification(event_type, payload)
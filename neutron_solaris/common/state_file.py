@@ -0,0 +1,76 @@
+# Copyright 2021, Guillermo Adrian Molina.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Versioned JSON state files that survive agent restarts and crashes."""
+
+import os
+import tempfile
+
+from oslo_log import log as logging
+from oslo_serialization import jsonutils
+
+LOG = logging.getLogger(__name__)
+
+
+def load(path, version):
+    """Return the data saved in path, or None if it can not be used.
+
+    A missing or corrupted file, or a file written with another format
+    version, is reported as None so that the caller starts from scratch.
+    """
+    try:
+        with open(path, 'rb') as state_file:
+            state = jsonutils.load(state_file)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        LOG.warning("Ignoring unreadable state file %(path)s: %(err)s",
+                    {'path': path, 'err': e})
+        return None
+
+    found = state.get('version') if isinstance(state, dict) else None
+    if found != version:
+        LOG.info("Ignoring state file %(path)s with format version "
+                 "%(found)s, expected %(expected)s",
+                 {'path': path, 'found': found, 'expected': version})
+        return None
+    return state.get('data')
+
+
+def write(path, content):
+    """Atomically replace path with the content string.
+
+    The content is written and fsync'ed to a temporary file in the same
+    directory, which is then renamed over path, so a crash leaves either
+    the old or the new content but never a partial file.
+    """
+    dirname = os.path.dirname(os.path.abspath(path))
+    os.makedirs(dirname, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=dirname,
+                                    prefix='.%s.' % os.path.basename(path))
+    try:
+        with os.fdopen(fd, 'w') as tmp_file:
+            tmp_file.write(content)
+            tmp_file.flush()
+            os.fsync(tmp_file.fileno())
+        os.rename(tmp_path, path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+
+
+def save(path, data, version):
+    """Atomically replace path with data, see write()."""
+    write(path, jsonutils.dumps({'version': version, 'data': data}))
@@ -0,0 +1,253 @@
+# Copyright 2021, Guillermo Adrian Molina.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Lightweight tracing of the agent hot paths.
+
+Code wraps its steps in spans, either with the span() context manager or
+the traced() decorator. Spans opened while another span is active in the
+same green thread become its children, so that setting up a port yields a
+tree like:
+
+    port.setup -> firewall.setup_pf_rules -> pf.add_rules -> command
+
+The TRACER of the process is disabled by default, in which case opening a
+span only costs a boolean check. Once enabled, sample_rate is the fraction
+of root spans, and of their whole tree, that are recorded. Finished spans
+are handed to an exporter, e.g. JsonLinesExporter or SpanCollector.
+"""
+
+import collections
+import functools
+import json
+import os
+import random
+import threading
+import time
+import uuid
+
+from eventlet import corolocal
+from oslo_log import log as logging
+
+LOG = logging.getLogger(__name__)
+
+
+class Span(object):
+    """A timed step, recorded as a node of a trace."""
+
+    def __init__(self, name, trace_id, parent_id=None, attributes=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attributes = dict(attributes or {})
+        self.start = time.time()
+        self.end = None
+        self.error = None
+
+    @property
+    def duration(self):
+        if self.end is None:
+            return None
+        return self.end - self.start
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def to_dict(self):
+        return {'name': self.name,
+                'trace_id': self.trace_id,
+                'span_id': self.span_id,
+                'parent_id': self.parent_id,
+                'start': self.start,
+                'duration': self.duration,
+                'attributes': self.attributes,
+                'error': self.error}
+
+
+class _NullSpan(object):
+    """Stands for the spans that are not recorded."""
+
+    def set_attribute(self, key, value):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _NullContext(object):
+    """Context manager of span() while tracing is disabled."""
+
+    def __enter__(self):
+        return _NULL_SPAN
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NULL_CONTEXT = _NullContext()
+
+
+class _SpanContext(object):
+
+    def __init__(self, tracer, name, attributes):
+        self._tracer = tracer
+        self._name = name
+        self._attributes = attributes
+        self._span = None
+
+    def __enter__(self):
+        self._span = self._tracer._start_span(self._name, self._attributes)
+        return self._span
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._tracer._end_span(self._span, exc_value)
+        return False
+
+
+class JsonLinesExporter(object):
+    """Appends every finished span to a file, one JSON object per line."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+
+    def export(self, span):
+        line = json.dumps(span.to_dict(), default=str) + '\n'
+        with self._lock:
+            try:
+                if self._file is None:
+                    dirname = os.path.dirname(self.path)
+                    if dirname:
+                        os.makedirs(dirname, exist_ok=True)
+                    self._file = open(self.path, 'a')
+                self._file.write(line)
+                self._file.flush()
+            except (IOError, OSError) as e:
+                LOG.warning("Failed to write span to %(path)s: %(err)s",
+                            {'path': self.path, 'err': e})
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class SpanCollector(object):
+    """Keeps the last max_spans finished spans in memory.
+
+    Stands in for a trace collector, in tests and when looking at the
+    traces from a backdoor shell.
+    """
+
+    def __init__(self, max_spans=10000):
+        self.spans = collections.deque(maxlen=max_spans)
+
+    def export(self, span):
+        self.spans.append(span)
+
+    def get_trace(self, trace_id):
+        return [span for span in self.spans if span.trace_id == trace_id]
+
+    def get_spans(self, name):
+        return [span for span in self.spans if span.name == name]
+
+    def clear(self):
+        self.spans.clear()
+
+    def close(self):
+        pass
+
+
+class Tracer(object):
+    """Opens the spans and hands the finished ones to the exporter."""
+
+    def __init__(self):
+        self.enabled = False
+        self.sample_rate = 1.0
+        self.exporter = None
+        # stack of the spans open in each green thread, unsampled traces
+        # push None so that their children are not recorded either
+        self._local = corolocal.local()
+
+    def configure(self, exporter=None, sample_rate=1.0):
+        """Enable tracing to exporter, or disable it if exporter is None."""
+        if self.exporter is not None and self.exporter is not exporter:
+            self.exporter.close()
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self.enabled = exporter is not None and sample_rate > 0
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def current_span(self):
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    def span(self, name, **attributes):
+        """Context manager timing the block as a span named name."""
+        if not self.enabled:
+            return _NULL_CONTEXT
+        return _SpanContext(self, name, attributes)
+
+    def _start_span(self, name, attributes):
+        stack = self._stack()
+        if stack:
+            parent = stack[-1]
+            span = (Span(name, parent.trace_id, parent.span_id, attributes)
+                    if parent is not None else None)
+        elif random.random() < self.sample_rate:
+            span = Span(name, uuid.uuid4().hex, attributes=attributes)
+        else:
+            span = None
+        stack.append(span)
+        return span if span is not None else _NULL_SPAN
+
+    def _end_span(self, span, error=None):
+        self._stack().pop()
+        if span is _NULL_SPAN:
+            return
+        span.end = time.time()
+        if error is not None:
+            span.error = '%s: %s' % (type(error).__name__, error)
+        exporter = self.exporter
+        if exporter is not None:
+            exporter.export(span)
+
+
+TRACER = Tracer()
+
+
+def span(name, **attributes):
+    """Open a span on the TRACER of the process."""
+    return TRACER.span(name, **attributes)
+
+
+def traced(name):
+    """Decorator running every call of the function in a span."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not TRACER.enabled:
+                return func(*args, **kwargs)
+            with TRACER.span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -15,6 +15,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from keystoneauth1 import loading as ks_loading
 from oslo_config import cfg
 
 from neutron_solaris.common.i18n import _
@@ -42,11 +43,209 @@ SOLARISVNIC_AGENT_OPTS = [
                        "listed in network_vlan_ranges on the server should "
                        "have mappings to appropriate interfaces on each "
                        "agent.")),
+    cfg.StrOpt('device_event_source',
+               default='polling',
+               choices=['polling', 'snapshot', 'monitor'],
+               help=_("How the agent detects VNIC changes. 'polling' scans "
+                      "all the VNICs every polling_interval. 'snapshot' "
+                      "diffs cheap VNIC snapshots taken every "
+                      "device_event_poll_interval seconds and only "
+                      "processes the VNICs that changed. 'monitor' reads "
+                      "datalink notifications from the long-running "
+                      "device_event_monitor_command.")),
+    cfg.IntOpt('device_event_poll_interval',
+               default=1,
+               min=1,
+               help=_("Seconds between two VNIC snapshots when "
+                      "device_event_source is 'snapshot'.")),
+    cfg.ListOpt('device_event_monitor_command',
+                default=[],
+                help=_("Command, and its arguments, printing one "
+                       "'<add|remove|change> <link> [<mac>]' line per "
+                       "datalink notification. Required when "
+                       "device_event_source is 'monitor'.")),
+    cfg.IntOpt('full_resync_interval',
+               default=300,
+               min=0,
+               help=_("Seconds between two full resyncs of all the VNICs "
+                      "when an event driven device_event_source is used. "
+                      "0 disables the periodic resync. A warm start from "
+                      "the state_cache_file is always followed by one full "
+                      "resync, after this many seconds or after "
+                      "polling_interval ones if this is 0.")),
+    cfg.StrOpt('vnic_index_file',
+               default='$state_path/solarisvnic/vnic_index.json',
+               help=_("File where the agent persists the generation and "
+                      "first seen time of every VNIC, used to detect VNICs "
+                      "re-created with the same MAC address.")),
+    cfg.StrOpt('state_cache_file',
+               default='$state_path/solarisvnic/agent_state.json',
+               help=_("File where the agent persists the state of the "
+                      "devices it wired, so that after a restart only the "
+                      "devices that changed are processed again. Set it to "
+                      "an empty value to always process all the devices on "
+                      "start up.")),
+    cfg.IntOpt('plug_workers',
+               default=8,
+               min=1,
+               help=_("Maximum number of devices the agent processes in "
+                      "parallel. Set it to 1 to process the devices one at "
+                      "a time.")),
+    cfg.FloatOpt('update_debounce_interval',
+                 default=0.5,
+                 min=0,
+                 help=_("Seconds without a new port_update, "
+                        "binding_activate or binding_deactivate "
+                        "notification for a device before it is "
+                        "processed. Notifications received for the same "
+                        "device in the meantime are coalesced. 0 processes "
+                        "them in the next agent loop iteration.")),
+    cfg.FloatOpt('link_cache_ttl',
+                 default=10,
+                 min=0,
+                 help=_("Seconds the datalink existence and properties "
+                        "looked up with dladm are cached for. The cache is "
+                        "invalidated when the agent changes a datalink. 0 "
+                        "disables the cache.")),
+    cfg.IntOpt('link_cache_size',
+               default=1024,
+               min=1,
+               help=_("Maximum number of datalinks whose properties are "
+                      "cached. The least recently used datalink is evicted "
+                      "first.")),
+]
+
+SOLARIS_GROUP_NAME = 'SOLARIS'
+
+SOLARIS_GROUP = cfg.OptGroup(
+    SOLARIS_GROUP_NAME,
+    title='Solaris Options',
+    help=('Configuration options shared by the neutron-solarisvnic-agent '
+          'and the Solaris drivers loaded by the DHCP, L3 and Open vSwitch '
+          'agents.')
+)
+
+SOLARIS_OPTS = [
+    cfg.BoolOpt('use_pfexec_daemon',
+                default=False,
+                help=_("Run the privileged commands in a helper daemon "
+                       "started once with pfexec, instead of running "
+                       "pfexec for every command. Commands are run "
+                       "directly while the daemon is unavailable.")),
+    cfg.ListOpt('pfexec_daemon_allowed_commands',
+                default=['/usr/sbin/dladm', '/usr/sbin/ipadm',
+                         '/usr/sbin/pfctl', '/usr/sbin/route',
+                         '/usr/sbin/ndp', '/usr/sbin/arp'],
+                help=_("Absolute paths of the binaries the pfexec daemon "
+                       "is allowed to run.")),
+    cfg.IntOpt('pfexec_daemon_workers',
+               default=4,
+               min=1,
+               help=_("Maximum number of commands the pfexec daemon runs "
+                      "at the same time.")),
+    cfg.StrOpt('trace_file',
+               default='',
+               help=_("File the spans traced through port setup, firewall "
+                      "and command execution are appended to, one JSON "
+                      "object per line. Tracing is disabled if it is not "
+                      "set.")),
+    cfg.FloatOpt('trace_sample_rate',
+                 default=1.0,
+                 min=0.0,
+                 max=1.0,
+                 help=_("Fraction of the traces recorded when trace_file "
+                        "is set.")),
+    cfg.IntOpt('lower_link_refresh_interval',
+               default=300,
+               min=0,
+               help=_("Interval in seconds between reloads of the "
+                      "default_tag, MTU, speed and state of the lower links "
+                      "VNICs are created over. 0 disables the reloads and "
+                      "the lower links are then only looked up once.")),
+    cfg.PortOpt('metrics_port',
+                help=_("Port of the local HTTP listener serving the "
+                       "metrics of the process in the OpenMetrics text "
+                       "format on /metrics. Every agent process needs a "
+                       "port of its own, set it in the configuration file "
+                       "of each agent. No listener is started if it is not "
+                       "set.")),
+    cfg.StrOpt('metrics_listen_address',
+               default='127.0.0.1',
+               help=_("Address the metrics HTTP listener binds to.")),
+    cfg.StrOpt('metrics_file',
+               default='',
+               help=_("File the metrics of the process are written to, in "
+                      "the OpenMetrics text format. {process} is replaced "
+                      "by the name of the agent binary, so that the agents "
+                      "sharing a configuration file write to their own "
+                      "file. Nothing is written if it is not set.")),
+    cfg.IntOpt('metrics_write_interval',
+               default=60,
+               min=0,
+               help=_("Seconds between two writes of metrics_file. The "
+                      "neutron-solarisvnic-agent writes it at the end of "
+                      "every loop iteration as well. 0 disables the "
+                      "periodic writes.")),
+]
+
+NEUTRON_GROUP_NAME = 'neutron'
+
+NEUTRON_GROUP = cfg.OptGroup(
+    NEUTRON_GROUP_NAME,
+    title='Neutron Options',
+    help=('Configuration options for the clients of the Neutron API. The '
+          'keystoneauth session and auth plugin options of this group are '
+          'registered as well.')
+)
+
+NEUTRON_OPTS = [
+    cfg.IntOpt('http_pool_maxsize',
+               default=10,
+               min=1,
+               help=_("Maximum number of HTTP connections kept open to "
+                      "every host of the Neutron and Keystone APIs, per set "
+                      "of credentials. They are reused across requests "
+                      "with keep-alive.")),
+    cfg.BoolOpt('http_pool_block',
+                default=False,
+                help=_("Make the requests wait for a free connection once "
+                       "http_pool_maxsize connections are in use, instead "
+                       "of opening connections that are closed right after "
+                       "the request.")),
+    cfg.IntOpt('cache_network_ttl',
+               default=0,
+               min=0,
+               help=_("Seconds the networks looked up by the Neutron API "
+                      "client are cached for. 0 disables the cache.")),
+    cfg.IntOpt('cache_subnet_ttl',
+               default=0,
+               min=0,
+               help=_("Seconds the subnets looked up by the Neutron API "
+                      "client are cached for. 0 disables the cache.")),
+    cfg.IntOpt('cache_port_ttl',
+               default=0,
+               min=0,
+               help=_("Seconds the ports looked up by the Neutron API "
+                      "client are cached for. 0 disables the cache.")),
+    cfg.IntOpt('cache_negative_ttl',
+               default=10,
+               min=0,
+               help=_("Seconds a network, subnet or port the Neutron API "
+                      "did not find is remembered as missing for, when the "
+                      "cache of its resource is enabled.")),
+    cfg.IntOpt('cache_max_size',
+               default=1000,
+               min=1,
+               help=_("Maximum number of networks, subnets and ports "
+                      "cached. The least recently used one is evicted "
+                      "first.")),
 ]
 
 
 ALL_OPTS = [
-    (SOLARISVNIC_AGENT_GROUP, SOLARISVNIC_AGENT_OPTS)
+    (SOLARISVNIC_AGENT_GROUP, SOLARISVNIC_AGENT_OPTS),
+    (SOLARIS_GROUP, SOLARIS_OPTS),
+    (NEUTRON_GROUP, NEUTRON_OPTS),
 ]
 
 
@@ -55,6 +254,9 @@ def register_opts():
         CONF.register_group(group)
         CONF.register_opts(opts, group=group)
 
+    ks_loading.register_session_conf_options(CONF, NEUTRON_GROUP)
+    ks_loading.register_auth_conf_options(CONF, NEUTRON_GROUP)
+
 
 def list_opts():
     return ALL_OPTS
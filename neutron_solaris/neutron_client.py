@@ -14,37 +14,210 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import itertools
+import threading
+
+from keystoneauth1.identity import generic
 from keystoneauth1 import loading as ks_loading
+from keystoneauth1 import session as ks_session
+from neutronclient.common import exceptions as n_exc
 from neutronclient.v2_0 import client as clientv20
 from oslo_log import log as logging
+import requests
+from requests import adapters
 
 from neutron_solaris.common.i18n import _LW, _LE  # noqa
+from neutron_solaris.common import metrics
+from neutron_solaris.common import resource_cache
 from neutron_solaris import config
 from neutron_solaris import constants
 
 CONF = config.CONF
 LOG = logging.getLogger(__name__)
 
+HTTP_REQUESTS = metrics.REGISTRY.counter(
+    'neutron_solaris_http_requests',
+    'HTTP requests sent to the OpenStack APIs, by connection pool.',
+    ['pool'])
+HTTP_IN_FLIGHT = metrics.REGISTRY.gauge(
+    'neutron_solaris_http_requests_in_flight',
+    'HTTP requests waiting for a response, by connection pool.', ['pool'])
+HTTP_POOL_SATURATED = metrics.REGISTRY.counter(
+    'neutron_solaris_http_pool_saturated',
+    'HTTP requests sent while all the connections of their pool were in '
+    'use.', ['pool'])
+_DEFAULT = object()
+
+
+class PoolAdapter(adapters.HTTPAdapter):
+    """HTTPAdapter reporting how busy its connection pools are.
+
+    :param name: the pool label of the HTTP metrics, it must not identify
+                 the credentials of the pool, e.g. their username.
+    """
+
+    def __init__(self, name, pool_maxsize=10, pool_block=False):
+        self.name = name
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        super(PoolAdapter, self).__init__(pool_maxsize=pool_maxsize,
+                                          pool_block=pool_block)
+
+    def send(self, request, *args, **kwargs):
+        with self._lock:
+            self._in_flight += 1
+            in_flight = self._in_flight
+        HTTP_REQUESTS.inc(pool=self.name)
+        HTTP_IN_FLIGHT.set(in_flight, pool=self.name)
+        if in_flight > self._pool_maxsize:
+            HTTP_POOL_SATURATED.inc(pool=self.name)
+        try:
+            return super(PoolAdapter, self).send(request, *args, **kwargs)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+                in_flight = self._in_flight
+            HTTP_IN_FLIGHT.set(in_flight, pool=self.name)
 
-class NeutronAPIClient(object):
+
+class ClientFactory(object):
+    """Hands out the Neutron clients of the process.
+
+    One keystone session is kept per set of credentials, so that all the
+    clients using the same credentials share the token of its auth plugin,
+    which is only fetched again when it is about to expire, and the HTTP
+    connections of its pool, which are kept alive between requests.
+
+    The pools are labeled pool0, pool1... in their creation order in the
+    HTTP metrics.
+    """
 
     def __init__(self):
+        self._lock = threading.Lock()
+        # credentials -> neutron client
+        self._clients = {}
+        self._pool_ids = itertools.count()
+
+    def _http_session(self):
+        # called with the lock held
+        adapter = PoolAdapter('pool%d' % next(self._pool_ids),
+                              pool_maxsize=CONF.neutron.http_pool_maxsize,
+                              pool_block=CONF.neutron.http_pool_block)
+        http = requests.Session()
+        http.mount('https://', adapter)
+        http.mount('http://', adapter)
+        return http
+
+    def _get_client(self, key, build):
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = self._clients[key] = build()
+            return client
+
+    def get_client(self, conf=CONF, group=config.NEUTRON_GROUP):
+        """Return the client using the keystoneauth options of group."""
+        group_name = getattr(group, 'name', group)
+
+        def _build():
+            auth_plugin = ks_loading.load_auth_from_conf_options(
+                conf, group_name)
+            session = ks_loading.load_session_from_conf_options(
+                conf, group_name, session=self._http_session())
+            return clientv20.Client(session=session, auth=auth_plugin)
+
+        return self._get_client(('conf', id(conf), group_name), _build)
+
+    def get_password_client(self, auth_url, username, password,
+                            tenant_name=None, project_name=None,
+                            project_domain_name=None, user_domain_name=None,
+                            trust_id=None, region_name=None,
+                            auth_strategy='keystone',
+                            endpoint_type='publicURL'):
+        """Return the client authenticating with a password."""
+        key = ('password', auth_url, username, password, tenant_name,
+               project_name, project_domain_name, user_domain_name,
+               trust_id, region_name, auth_strategy, endpoint_type)
+
+        def _build():
+            auth_plugin = generic.Password(
+                auth_url=auth_url,
+                username=username,
+                password=password,
+                tenant_name=tenant_name,
+                project_name=project_name,
+                project_domain_name=project_domain_name,
+                user_domain_name=user_domain_name,
+                trust_id=trust_id)
+            session = ks_session.Session(
+                auth=auth_plugin, session=self._http_session())
+            return clientv20.Client(
+                session=session, region_name=region_name,
+                auth_strategy=auth_strategy, endpoint_type=endpoint_type)
+
+        return self._get_client(key, _build)
+
+    def clear(self):
+        with self._lock:
+            self._clients.clear()
+
+
+CLIENT_FACTORY = ClientFactory()
+
+
+def get_api_cache(conf=CONF):
+    """Return the cache configured in [neutron], or None if disabled."""
+    ttls = {resource_cache.NETWORK: conf.neutron.cache_network_ttl,
+            resource_cache.SUBNET: conf.neutron.cache_subnet_ttl,
+            resource_cache.PORT: conf.neutron.cache_port_ttl}
+    if not any(ttls.values()):
+        return None
+    return resource_cache.ResourceCache(
+        ttls, max_size=conf.neutron.cache_max_size,
+        negative_ttl=conf.neutron.cache_negative_ttl)
+
+
+class NeutronAPIClient(object):
+
+    def __init__(self, cache=_DEFAULT):
+        """:param cache: ResourceCache, by default the one configured in
+                         [neutron]. None disables the cache.
+        """
         self._init_client()
+        self._cache = get_api_cache() if cache is _DEFAULT else cache
 
     def _init_client(self):
-        session = ks_loading.load_session_from_conf_options(
-            CONF, config.NEUTRON_GROUP)
-        auth_plugin = ks_loading.load_auth_from_conf_options(
-            CONF, config.NEUTRON_GROUP)
+        self._client = CLIENT_FACTORY.get_client()
+
+    def _show(self, resource, obj_id):
+        show = getattr(self._client, 'show_%s' % resource)
+        cache = self._cache
+        if cache is None or not cache.caches(resource):
+            return show(obj_id)[resource]
+        # what is loaded after an invalidation is not cached
+        generation = cache.generation
+        obj = cache.get(resource, obj_id)
+        if obj is resource_cache.NOT_FOUND:
+            raise n_exc.NotFound(message="%s %s could not be found" %
+                                 (resource.capitalize(), obj_id))
+        if obj is not resource_cache.MISSING:
+            return obj
+        try:
+            obj = show(obj_id)[resource]
+        except n_exc.NotFound:
+            cache.set_not_found(resource, obj_id, generation)
+            raise
+        cache.set(resource, obj_id, obj, generation)
+        return obj
 
-        self._client = clientv20.Client(
-            session=session,
-            auth=auth_plugin)
+    def invalidate(self, resource=None, obj_id=None):
+        """Drop objects from the cache of this client."""
+        if self._cache is not None:
+            self._cache.invalidate(resource, obj_id)
 
     def get_network_subnets(self, network_id):
         try:
-            net = self._client.show_network(network_id)
-            return net['network']['subnets']
+            return self._show('network', network_id)['subnets']
         except Exception as ex:
             LOG.error("Could not retrieve network %(network_id)s . Error: "
                       "%(ex)s", {'network_id': network_id, 'ex': ex})
@@ -53,7 +226,7 @@ class NeutronAPIClient(object):
 
     def get_network_subnet_cidr_and_gateway(self, subnet_id):
         try:
-            subnet = self._client.show_subnet(subnet_id)['subnet']
+            subnet = self._show('subnet', subnet_id)
             return (str(subnet['cidr']), str(subnet['gateway_ip']))
         except Exception as ex:
             LOG.error("Could not retrieve subnet %(subnet_id)s . Error: "
@@ -63,8 +236,8 @@ class NeutronAPIClient(object):
 
     def get_port_ip_address(self, port_id):
         try:
-            port = self._client.show_port(port_id)
-            fixed_ips = port['port']['fixed_ips'][0]
+            port = self._show('port', port_id)
+            fixed_ips = port['fixed_ips'][0]
             return fixed_ips['ip_address']
         except Exception as ex:
             LOG.error("Could not retrieve port %(port_id)s . Error: "
@@ -81,8 +254,8 @@ class NeutronAPIClient(object):
 
     def get_port_profile_id(self, port_id):
         try:
-            port = self._client.show_port(port_id)
-            return "{%s}" % (port["port"]["binding:vif_details"]
+            port = self._show('port', port_id)
+            return "{%s}" % (port["binding:vif_details"]
                              ["port_profile_id"])
         except Exception:
             LOG.exception("Failed to retrieve profile id for port %s.",
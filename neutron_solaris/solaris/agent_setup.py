@@ -0,0 +1,169 @@
+# Copyright 2021, Guillermo Adrian Molina.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Process wide set up of the Solaris drivers.
+
+The neutron-solarisvnic-agent calls setup() from its main(). The DHCP, L3
+and Open vSwitch agents never run our code before loading a driver, so the
+interface, DHCP and firewall drivers call it when they are created. Only the
+first call does anything.
+
+The interface drivers, which create the VNICs, load the descriptors of their
+lower links once with load_lower_links(), setup() keeps them fresh.
+
+setup() also starts the metrics exporter of the process, if one is
+configured, so that the metrics of the drivers, e.g. the VNIC pool ones, are
+exported by every agent loading them.
+"""
+
+import atexit
+import os
+import sys
+import threading
+
+from oslo_config import cfg
+from oslo_log import log as logging
+from oslo_service import loopingcall
+
+from neutron_solaris import config  # noqa: F401
+from neutron_solaris.common import metrics
+from neutron_solaris.common import tracing
+from neutron_solaris.solaris import net_lib
+from neutron_solaris.solaris import pfexec_daemon
+
+LOG = logging.getLogger(__name__)
+CONF = cfg.CONF
+
+_lock = threading.Lock()
+_done = False
+_lower_link_refresh = None
+_metrics_exporter = None
+_metrics_write = None
+
+
+def setup(conf=CONF):
+    global _done
+    with _lock:
+        if _done:
+            return
+        setup_tracing(conf)
+        setup_command_daemon(conf)
+        setup_lower_links(conf)
+        setup_metrics(conf)
+        _done = True
+
+
+def setup_tracing(conf=CONF):
+    if not conf.SOLARIS.trace_file:
+        return
+    tracing.TRACER.configure(
+        tracing.JsonLinesExporter(conf.SOLARIS.trace_file),
+        sample_rate=conf.SOLARIS.trace_sample_rate)
+
+
+def setup_command_daemon(conf=CONF):
+    if not conf.SOLARIS.use_pfexec_daemon:
+        return
+    net_lib.CommandBase.command_daemon = pfexec_daemon.PfexecDaemonClient(
+        conf.SOLARIS.pfexec_daemon_allowed_commands,
+        workers=conf.SOLARIS.pfexec_daemon_workers)
+    LOG.info("Privileged commands are run through the pfexec daemon")
+
+
+def setup_lower_links(conf=CONF):
+    """Reload the lower links VNICs are created over on a slow timer."""
+    global _lower_link_refresh
+    interval = conf.SOLARIS.lower_link_refresh_interval
+    # the refresh timer keeps the descriptors from expiring
+    net_lib.Datalink.lower_links = net_lib.LowerLinkCache(2 * interval)
+    if interval:
+        _lower_link_refresh = loopingcall.FixedIntervalLoopingCall(
+            _refresh_lower_links)
+        _lower_link_refresh.start(interval=interval, initial_delay=interval)
+
+
+def _refresh_lower_links():
+    try:
+        net_lib.Datalink.lower_links.refresh()
+    except Exception:
+        LOG.exception("Failed to refresh the lower links")
+
+
+def load_lower_links(names):
+    """Look up the lower links a driver creates VNICs over, at its start."""
+    try:
+        net_lib.Datalink.lower_links.load(names)
+    except Exception:
+        # they are looked up again on first use
+        LOG.exception("Failed to load the lower links %s", sorted(names))
+
+
+def _process_name():
+    return os.path.basename(sys.argv[0]) or 'neutron'
+
+
+def setup_metrics(conf=CONF):
+    """Expose the metrics of the process, e.g. the VNIC pool hit rate."""
+    global _metrics_exporter, _metrics_write
+    path = conf.SOLARIS.metrics_file.replace('{process}', _process_name())
+    exporter = metrics.MetricsExporter(
+        metrics.REGISTRY,
+        listen_address=conf.SOLARIS.metrics_listen_address,
+        port=conf.SOLARIS.metrics_port,
+        path=path)
+    if not exporter.enabled:
+        return
+    try:
+        exporter.start()
+    except OSError as e:
+        # the metrics are not worth failing the agent for
+        LOG.error("Failed to serve the metrics on port %(port)s: %(err)s",
+                  {'port': conf.SOLARIS.metrics_port, 'err': e})
+    _metrics_exporter = exporter
+    interval = conf.SOLARIS.metrics_write_interval
+    if path and interval:
+        _metrics_write = loopingcall.FixedIntervalLoopingCall(exporter.write)
+        _metrics_write.start(interval=interval, initial_delay=interval)
+
+
+def get_metrics_exporter():
+    """Return the MetricsExporter of the process, or None."""
+    return _metrics_exporter
+
+
+def shutdown():
+    global _done, _lower_link_refresh, _metrics_exporter, _metrics_write
+    with _lock:
+        daemon = net_lib.CommandBase.command_daemon
+        net_lib.CommandBase.command_daemon = None
+        refresh, _lower_link_refresh = _lower_link_refresh, None
+        exporter, _metrics_exporter = _metrics_exporter, None
+        write, _metrics_write = _metrics_write, None
+        _done = False
+    tracing.TRACER.configure(None)
+    if refresh is not None:
+        refresh.stop()
+    if write is not None:
+        write.stop()
+    if exporter is not None:
+        # the last values are kept in the file
+        exporter.write()
+        exporter.stop()
+    if daemon is not None:
+        daemon.stop()
+
+
+atexit.register(shutdown)
@@ -0,0 +1,129 @@
+# Copyright 2021, Guillermo Adrian Molina.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Lookup of the lower links of the OVS physical networks.
+
+The OVS agent publishes its bridge_mappings in the other_config column of
+the Open_vSwitch table, e.g. 'physnet1:net0,physnet2:aggr0'. The VNICs of
+the VLAN and flat networks are created over the lower link mapped to their
+physical network.
+"""
+
+import threading
+import time
+
+from neutron.agent.common import ovs_lib
+from oslo_log import log as logging
+
+LOG = logging.getLogger(__name__)
+
+
+class BridgeMappingError(Exception):
+    """The bridge_mappings could not be read or are not configured."""
+
+
+def parse_bridge_mappings(bridge_mappings):
+    """Parse 'physnet:link,...' into a {physnet: link} dict."""
+    mappings = {}
+    for mapping in bridge_mappings.split(','):
+        physnet, sep, link = mapping.partition(':')
+        physnet = physnet.strip()
+        link = link.strip()
+        if not sep or not physnet or not link:
+            LOG.warning("Ignoring invalid bridge mapping %s", mapping)
+            continue
+        mappings[physnet] = link
+    return mappings
+
+
+def read_other_config():
+    """Return the other_config column of the Open_vSwitch table."""
+    ovs = ovs_lib.BaseOVS()
+    return ovs.ovsdb.db_get('Open_vSwitch', '.', 'other_config').execute(
+        check_error=True)
+
+
+class BridgeMappingResolver(object):
+    """Caches the physnet -> lower link dict of the bridge_mappings.
+
+    The bridge_mappings are read from OVSDB and parsed on the first lookup
+    only. They are read again when monitor, an OvsdbMonitor of the
+    other_config column, reports a change. Without a running monitor they
+    are read again once they are older than max_age seconds. Looking up a
+    physical network that is not mapped reads them again as well, in case
+    it has just been added.
+
+    :param monitor: optional neutron AsyncProcess printing a line every
+                    time other_config changes.
+    :param max_age: seconds the mappings are used for without a monitor.
+    """
+
+    def __init__(self, monitor=None, max_age=60, reader=read_other_config,
+                 clock=time.time):
+        self._monitor = monitor
+        self.max_age = max_age
+        self._reader = reader
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._mappings = None
+        self._loaded = 0
+        # bumped every time the mappings are read again
+        self.generation = 0
+
+    def invalidate(self):
+        with self._lock:
+            self._mappings = None
+
+    def _changed(self):
+        monitor = self._monitor
+        if monitor is not None and monitor.is_active():
+            # drain the notifications, any of them means other_config
+            # may have changed
+            return bool(list(monitor.iter_stdout()))
+        return self._clock() - self._loaded >= self.max_age
+
+    def _load(self):
+        other_config = self._reader()
+        if not other_config:
+            raise BridgeMappingError(
+                "'other_config' column in 'Open_vSwitch' OVSDB table is not "
+                "configured. Please configure it so that lower-link can be "
+                "determined for the VNICs")
+        bridge_mappings = other_config.get('bridge_mappings')
+        if not bridge_mappings:
+            raise BridgeMappingError(
+                "'bridge_mappings' info is not set in 'other_config' column "
+                "of 'Open_vSwitch' OVSDB table. Please configure it so that "
+                "lower-link can be determined for the VNICs")
+        self._mappings = parse_bridge_mappings(bridge_mappings)
+        self._loaded = self._clock()
+        self.generation += 1
+        LOG.debug("Loaded bridge mappings %s", self._mappings)
+
+    def get_mappings(self):
+        """Return the {physnet: lower link} dict."""
+        with self._lock:
+            if self._mappings is None or self._changed():
+                self._load()
+            return self._mappings
+
+    def resolve(self, physnet):
+        """Return the lower link of physnet, or None if it is not mapped."""
+        link = self.get_mappings().get(physnet)
+        if link is None:
+            with self._lock:
+                self._load()
+                link = self._mappings.get(physnet)
+        return link
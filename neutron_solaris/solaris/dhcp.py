@@ -26,11 +26,13 @@ from oslo_utils import excutils
 
 from neutron._i18n import _, _LI, _LW, _LE
 from neutron.agent.linux import dhcp
-from neutron.agent.linux import utils
 from neutron.common import constants
 from neutron.common import exceptions
 from neutron.common import ipv6_utils
 
+from neutron_solaris.common import resource_cache
+from neutron_solaris.common import tracing
+from neutron_solaris.solaris import agent_setup
 from neutron_solaris.solaris import net_lib
 
 LOG = logging.getLogger(__name__)
@@ -45,6 +47,24 @@ class Dnsmasq(dhcp.Dnsmasq):
                                       version, plugin)
         self.device_manager = DeviceManager(self.conf, plugin)
 
+    # the DHCP agent calls these for the networks it is notified about, so
+    # the copies the interface drivers cached are stale by then
+
+    @tracing.traced('dnsmasq.enable')
+    def enable(self):
+        resource_cache.invalidate_network(self.network.id)
+        return super(Dnsmasq, self).enable()
+
+    @tracing.traced('dnsmasq.disable')
+    def disable(self, *args, **kwargs):
+        resource_cache.invalidate_network(self.network.id)
+        return super(Dnsmasq, self).disable(*args, **kwargs)
+
+    @tracing.traced('dnsmasq.reload_allocations')
+    def reload_allocations(self):
+        resource_cache.invalidate_network(self.network.id)
+        return super(Dnsmasq, self).reload_allocations()
+
     # overrides method in DhcpLocalProcess due to no namespace support
     def _destroy_namespace_and_port(self):
         try:
@@ -85,11 +105,8 @@ class Dnsmasq(dhcp.Dnsmasq):
                 mode = 'static'
             else:
                 # We need to also set the DUID for the DHCPv6 server to use
-                macaddr_cmd = ['/usr/sbin/dladm', 'show-linkprop',
-                               '-co', 'value', '-p', 'mac-address',
-                               self.interface_name]
-                stdout = utils.execute(macaddr_cmd)
-                uid = stdout.splitlines()[0].strip()
+                uid = net_lib.Datalink.show_prop(self.interface_name,
+                                                 'mac-address')
                 # format the MAC address
                 uid = ':'.join(['%.2x' % w for w in netaddr.EUI(uid).words])
                 # IANA assigned ID for Oracle
@@ -166,6 +183,7 @@ class Dnsmasq(dhcp.Dnsmasq):
 
         return cmd
 
+    @tracing.traced('dnsmasq.release_lease')
     def _release_lease(self, mac_address, ip, client_id):
         """Release a DHCP lease."""
         if netaddr.IPAddress(ip).version == constants.IP_VERSION_6:
@@ -177,7 +195,7 @@ class Dnsmasq(dhcp.Dnsmasq):
                ip, mac_address]
         if client_id:
             cmd.append(client_id)
-        utils.execute(cmd)
+        net_lib.CommandBase.execute(cmd)
 
     def _make_subnet_interface_ip_map(self):
         # TODO(gmoodalb): need to complete this when we support metadata
@@ -194,6 +212,7 @@ class Dnsmasq(dhcp.Dnsmasq):
 class DeviceManager(dhcp.DeviceManager):
 
     def __init__(self, conf, plugin):
+        agent_setup.setup()
         super(DeviceManager, self).__init__(conf, plugin)
 
     def _set_default_route(self, network, device_name):
@@ -264,6 +283,7 @@ class DeviceManager(dhcp.DeviceManager):
 
         return port
 
+    @tracing.traced('dhcp.device_setup')
     def setup(self, network):
         """Create and initialize a device for network's DHCP on this host."""
         port = self.setup_dhcp_port(network)
@@ -0,0 +1,324 @@
+# Copyright 2021, Guillermo Adrian Molina.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""In-process gratuitous ARP sender.
+
+Instead of forking arping(1M) for every address, the GarpEngine builds the
+unsolicited ARP replies itself and sends them through a Transport. The
+addresses announced on an interface are coalesced and sent in rounds, one
+per interval seconds like arping -c does. All the frames go through a
+global rate limit, and every round is delayed by a random jitter so that
+the announcements of a failover are spread out.
+"""
+
+import collections
+import ctypes
+import ctypes.util
+import random
+import socket
+import struct
+import threading
+import time
+
+import eventlet
+import netaddr
+from oslo_log import log as logging
+
+LOG = logging.getLogger(__name__)
+
+ETH_P_ARP = 0x0806
+ETH_P_IP = 0x0800
+ARPHRD_ETHER = 1
+ARPOP_REPLY = 2
+BROADCAST_MAC = b'\xff' * 6
+# frames shorter than this, without the FCS, are padded
+ETH_MIN_FRAME_LEN = 60
+
+
+class TransportError(Exception):
+    """A frame could not be sent."""
+
+
+def build_garp_frame(mac, address):
+    """Build the unsolicited ARP reply arping -A sends for address.
+
+    :param mac: MAC address of the interface sending the frame.
+    :param address: IPv4 address announced.
+    :returns: the Ethernet frame, as bytes.
+    """
+    mac_bytes = netaddr.EUI(mac).packed
+    ip_bytes = netaddr.IPAddress(address, version=4).packed
+    frame = (BROADCAST_MAC + mac_bytes + struct.pack('!H', ETH_P_ARP) +
+             struct.pack('!HHBBH', ARPHRD_ETHER, ETH_P_IP, 6, 4,
+                         ARPOP_REPLY) +
+             mac_bytes + ip_bytes + BROADCAST_MAC + ip_bytes)
+    return frame.ljust(ETH_MIN_FRAME_LEN, b'\x00')
+
+
+class Transport(object):
+    """Sends raw Ethernet frames out of an interface."""
+
+    def send(self, ifname, frame):
+        raise NotImplementedError()
+
+    def close(self):
+        pass
+
+
+class PacketSocketTransport(Transport):
+    """Sends the frames through AF_PACKET sockets, on Linux."""
+
+    def __init__(self):
+        if not hasattr(socket, 'AF_PACKET'):
+            raise TransportError("AF_PACKET sockets are not supported")
+        # fails early without the privilege to open raw sockets
+        socket.socket(socket.AF_PACKET, socket.SOCK_RAW).close()
+        self._sockets = {}
+
+    def send(self, ifname, frame):
+        sock = self._sockets.get(ifname)
+        try:
+            if sock is None:
+                sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW)
+                sock.bind((ifname, 0))
+                self._sockets[ifname] = sock
+            sock.send(frame)
+        except OSError as e:
+            self._close(ifname)
+            raise TransportError(str(e))
+
+    def _close(self, ifname):
+        sock = self._sockets.pop(ifname, None)
+        if sock is not None:
+            sock.close()
+
+    def close(self):
+        for ifname in list(self._sockets):
+            self._close(ifname)
+
+
+class DlpiTransport(Transport):
+    """Sends the frames through libdlpi(3LIB) raw mode, on Solaris."""
+
+    DLPI_SUCCESS = 10000
+    DLPI_RAW = 0x0002
+
+    def __init__(self, libdlpi=None, libc=None):
+        if libdlpi is None:
+            path = ctypes.util.find_library('dlpi')
+            if path is None:
+                raise TransportError("libdlpi is not available")
+            libdlpi = ctypes.CDLL(path)
+        if libc is None:
+            libc = ctypes.CDLL(None)
+        # fails early without the privilege to send raw frames, every
+        # dlpi_open() would fail otherwise
+        priv_ineffect = getattr(libc, 'priv_ineffect', None)
+        if priv_ineffect is None or not priv_ineffect(b'net_rawaccess'):
+            raise TransportError("the net_rawaccess privilege is not in "
+                                 "effect")
+        self._lib = libdlpi
+        self._handles = {}
+
+    def _open(self, ifname):
+        handle = ctypes.c_void_p()
+        rc = self._lib.dlpi_open(ifname.encode('utf-8'), ctypes.byref(handle),
+                                 self.DLPI_RAW)
+        if rc != self.DLPI_SUCCESS:
+            raise TransportError("dlpi_open(%s) failed with %d" %
+                                 (ifname, rc))
+        rc = self._lib.dlpi_bind(handle, ETH_P_ARP, None)
+        if rc != self.DLPI_SUCCESS:
+            self._lib.dlpi_close(handle)
+            raise TransportError("dlpi_bind(%s) failed with %d" %
+                                 (ifname, rc))
+        return handle
+
+    def send(self, ifname, frame):
+        handle = self._handles.get(ifname)
+        if handle is None:
+            handle = self._handles[ifname] = self._open(ifname)
+        rc = self._lib.dlpi_send(handle, None, 0, frame, len(frame), None)
+        if rc != self.DLPI_SUCCESS:
+            self._close(ifname)
+            raise TransportError("dlpi_send(%s) failed with %d" %
+                                 (ifname, rc))
+
+    def _close(self, ifname):
+        handle = self._handles.pop(ifname, None)
+        if handle is not None:
+            self._lib.dlpi_close(handle)
+
+    def close(self):
+        for ifname in list(self._handles):
+            self._close(ifname)
+
+
+class CaptureTransport(Transport):
+    """Records the frames instead of sending them, for tests."""
+
+    def __init__(self, clock=time.time):
+        self._clock = clock
+        # (time, ifname, frame)
+        self.frames = []
+
+    def send(self, ifname, frame):
+        self.frames.append((self._clock(), ifname, frame))
+
+
+def default_transport():
+    """Return the raw frame transport of the host, or None."""
+    for transport_class in (DlpiTransport, PacketSocketTransport):
+        try:
+            return transport_class()
+        except (TransportError, OSError) as e:
+            LOG.debug("%(transport)s is not available: %(err)s",
+                      {'transport': transport_class.__name__, 'err': e})
+    return None
+
+
+class RateLimiter(object):
+    """Token bucket refilled with rate tokens per second."""
+
+    def __init__(self, rate, burst=None, clock=time.time,
+                 sleep=eventlet.sleep):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else rate)
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = self.burst
+        self._last = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take a token, sleeping until it is available."""
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.burst, self._tokens +
+                               (now - self._last) * self.rate)
+            self._last = now
+            # the token is reserved now, the bucket goes in debt until the
+            # callers waiting for it are done
+            self._tokens -= 1
+            wait = -self._tokens / self.rate
+        if wait > 0:
+            self._sleep(wait)
+
+
+class GarpEngine(object):
+    """Sends gratuitous ARPs for the announced addresses.
+
+    :param transport: Transport the frames are sent through.
+    :param mac_lookup: callable returning the MAC address of an interface.
+    :param rate: frames per second sent at most, over all interfaces.
+    :param interval: seconds between two rounds for the same address.
+    :param jitter: at most this many seconds are added, at random, before
+                   every round.
+    :param fallback: callable taking an interface, address and count, the
+                     addresses the transport fails to send are handed to
+                     it, in a green thread each.
+    """
+
+    def __init__(self, transport, mac_lookup, rate=100, interval=1.0,
+                 jitter=0.1, clock=time.time, sleep=eventlet.sleep,
+                 fallback=None):
+        self.transport = transport
+        self._mac_lookup = mac_lookup
+        self._fallback = fallback
+        self.interval = interval
+        self.jitter = jitter
+        self._sleep = sleep
+        self._limiter = RateLimiter(rate, clock=clock, sleep=sleep)
+        # ifname -> {address: rounds left}, in announcement order
+        self._pending = collections.OrderedDict()
+        self._worker = None
+        self.stats = collections.Counter()
+
+    def announce(self, ifname, address, count):
+        """Announce address on ifname count times.
+
+        An address already pending on the interface is not announced
+        twice, it gets the highest of the counts left instead.
+        """
+        if count <= 0:
+            return
+        addresses = self._pending.setdefault(ifname,
+                                             collections.OrderedDict())
+        if address in addresses:
+            self.stats['coalesced'] += 1
+        addresses[address] = max(count, addresses.get(address, 0))
+        if self._worker is None:
+            self._worker = eventlet.spawn(self._run)
+
+    def pending(self):
+        return sum(len(addresses) for addresses in self._pending.values())
+
+    def wait(self):
+        """Wait until all the announced addresses are sent."""
+        worker = self._worker
+        if worker is not None:
+            worker.wait()
+
+    def _run(self):
+        try:
+            while self._pending:
+                self._sleep(random.uniform(0, self.jitter))
+                self._send_round()
+                if self._pending:
+                    self._sleep(self.interval)
+        finally:
+            self._worker = None
+
+    def _send_round(self):
+        for ifname in list(self._pending):
+            addresses = self._pending[ifname]
+            try:
+                mac = self._mac_lookup(ifname)
+                if not mac or netaddr.EUI(mac) == netaddr.EUI(0):
+                    raise ValueError("no MAC address")
+                for address in list(addresses):
+                    self._limiter.acquire()
+                    self.transport.send(ifname,
+                                        build_garp_frame(mac, address))
+                    self.stats['sent'] += 1
+                    addresses[address] -= 1
+                    if not addresses[address]:
+                        del addresses[address]
+            except TransportError as e:
+                if self._fallback is None:
+                    self._give_up(ifname, addresses, e)
+                else:
+                    LOG.warning("Failed sending gratuitous ARP to %(addrs)s "
+                                "on interface %(iface)s, falling back: "
+                                "%(err)s", {'addrs': list(addresses),
+                                            'iface': ifname, 'err': e})
+                    for address, count in addresses.items():
+                        eventlet.spawn_n(self._fallback, ifname, address,
+                                         count)
+                    self.stats['fallback'] += len(addresses)
+                    addresses.clear()
+            except Exception as e:
+                self._give_up(ifname, addresses, e)
+            if not addresses:
+                del self._pending[ifname]
+
+    def _give_up(self, ifname, addresses, err):
+        # the interface may have been deleted meanwhile, like arping -w
+        # its remaining addresses are given up
+        LOG.warning("Failed sending gratuitous ARP to %(addrs)s on "
+                    "interface %(iface)s: %(err)s",
+                    {'addrs': list(addresses), 'iface': ifname, 'err': err})
+        self.stats['failed'] += len(addresses)
+        addresses.clear()
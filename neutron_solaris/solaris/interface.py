@@ -16,19 +16,27 @@
 # @author: Girish Moodalbail, Oracle, Inc.
 
 
+import threading
+
+import eventlet
 from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_serialization import jsonutils
 
-from keystoneclient import session
-from keystoneclient.auth.identity.generic import Password
+from neutron_lib import constants as p_const
+from neutron_lib import exceptions
+from neutron_lib.utils import helpers
 from neutron.agent.common import ovs_lib
+from neutron.agent.common import ovsdb_monitor
 from neutron.agent.linux import utils
-from neutron.common import exceptions
-from neutron.plugins.common import constants as p_const
-from neutronclient.v2_0 import client
 
+from neutron_solaris.common.i18n import _
+from neutron_solaris import neutron_client as neutron_client_lib
+from neutron_solaris.solaris import agent_setup
+from neutron_solaris.solaris import bridge_mappings
 from neutron_solaris.solaris import net_lib
+from neutron_solaris.solaris import network_cache
+from neutron_solaris.solaris import vnic_pool
 
 LOG = logging.getLogger(__name__)
 
@@ -59,8 +67,106 @@ OPTS = [
                help=_("User's domain name")),
     cfg.StrOpt('trust_id',
                help=_("Trust ID")),
+    cfg.IntOpt('network_cache_ttl',
+               default=60,
+               min=0,
+               help=_("Seconds the networks and subnets looked up by the "
+                      "interface drivers are cached for. 0 disables the "
+                      "cache.")),
+    cfg.ListOpt('physical_interface_mappings',
+                default=[],
+                help=_("Comma-separated list of "
+                       "<physical_network>:<physical_interface> tuples "
+                       "mapping the physical networks to the datalinks "
+                       "the Solaris interface driver creates the VNICs of "
+                       "flat and VLAN networks over.")),
+    cfg.IntOpt('vnic_pool_size',
+               default=0,
+               min=0,
+               help=_("Number of temporary VNICs the Solaris interface "
+                      "driver keeps pre-created over every lower link and "
+                      "VLAN ID it plugs ports on, so that plugging a port "
+                      "only renames a VNIC and changes its MAC address. 0 "
+                      "disables the pool.")),
+    cfg.ListOpt('vnic_pools',
+                default=[],
+                help=_("Comma-separated list of <lower_link>[:<vlan_id>] "
+                       "pools filled as soon as the driver starts, instead "
+                       "of when a port is first plugged on them.")),
+    cfg.IntOpt('vnic_pool_refill_interval',
+               default=10,
+               min=1,
+               help=_("Maximum seconds between two refills of the VNIC "
+                      "pools. Taking a VNIC from a pool triggers a refill "
+                      "right away.")),
 ]
 
+_AUTH_OPTS = ('auth_url', 'admin_user', 'admin_password',
+              'admin_tenant_name', 'project_name', 'project_domain_name',
+              'user_domain_name', 'trust_id', 'auth_region',
+              'auth_strategy', 'endpoint_type')
+
+_clients_lock = threading.Lock()
+# auth options -> (neutron client, network cache), shared by the drivers
+_clients = {}
+
+
+def _get_client_and_cache(conf):
+    key = tuple(getattr(conf, opt) for opt in _AUTH_OPTS)
+    with _clients_lock:
+        entry = _clients.get(key)
+        if entry is None:
+            # the factory shares the session, and so the token and the
+            # connection pool, with all the clients using these credentials
+            factory = neutron_client_lib.CLIENT_FACTORY
+            neutron_client = factory.get_password_client(
+                conf.auth_url, conf.admin_user, conf.admin_password,
+                tenant_name=conf.admin_tenant_name,
+                project_name=conf.project_name,
+                project_domain_name=conf.project_domain_name,
+                user_domain_name=conf.user_domain_name,
+                trust_id=conf.trust_id,
+                region_name=conf.auth_region,
+                auth_strategy=conf.auth_strategy,
+                endpoint_type=conf.endpoint_type)
+            cache = network_cache.NetworkCache(
+                lambda: neutron_client, ttl=conf.network_cache_ttl)
+            entry = _clients[key] = (neutron_client, cache)
+        return entry
+
+
+def get_neutron_client(conf):
+    """Return the neutron client shared by the drivers using conf."""
+    return _get_client_and_cache(conf)[0]
+
+
+def get_network_cache(conf):
+    """Return the NetworkCache shared by the drivers using conf."""
+    return _get_client_and_cache(conf)[1]
+
+
+_vnic_pool_lock = threading.Lock()
+_vnic_pool = None
+
+
+def get_vnic_pool(conf):
+    """Return the VNICPool shared by the drivers, or None if disabled."""
+    global _vnic_pool
+    if not conf.vnic_pool_size:
+        return None
+    with _vnic_pool_lock:
+        if _vnic_pool is None:
+            keys = []
+            for pool in conf.vnic_pools:
+                lower_link, _sep, vid = pool.partition(':')
+                keys.append(vnic_pool.VNICPool.key(lower_link.strip(),
+                                                   vid.strip()))
+            pool = vnic_pool.VNICPool(conf.vnic_pool_size, keys)
+            pool.load()
+            pool.start(conf.vnic_pool_refill_interval)
+            _vnic_pool = pool
+        return _vnic_pool
+
 
 class OVSInterfaceDriver(object):
     """Driver used to manage Solaris OVS VNICs.
@@ -80,30 +186,40 @@ class OVSInterfaceDriver(object):
         len(VNIC_NAME_SUFFIX)
 
     def __init__(self, conf):
+        agent_setup.setup()
         self.conf = conf
         self._neutron_client = None
+        self._bridge_mappings = None
+
+    @property
+    def bridge_mappings(self):
+        """The BridgeMappingResolver of the OVS bridge_mappings."""
+        if self._bridge_mappings is None:
+            monitor = ovsdb_monitor.OvsdbMonitor(
+                'Open_vSwitch', columns=['other_config'],
+                respawn_interval=30)
+            try:
+                monitor.start()
+            except Exception as err:
+                # the mappings are then read again every max_age seconds
+                LOG.warning("Failed to monitor the bridge_mappings: "
+                            "%(err)s", {'err': err})
+                monitor = None
+            self._bridge_mappings = bridge_mappings.BridgeMappingResolver(
+                monitor=monitor)
+        return self._bridge_mappings
 
     @property
     def neutron_client(self):
         if self._neutron_client:
             return self._neutron_client
-        auth_plugin = Password(
-            auth_url=self.conf.auth_url,
-            username=self.conf.admin_user,
-            password=self.conf.admin_password,
-            tenant_name=self.conf.admin_tenant_name,
-            project_name=self.conf.project_name,
-            project_domain_name=self.conf.project_domain_name,
-            user_domain_name=self.conf.user_domain_name,
-            trust_id=self.conf.trust_id
-        )
-        sess = session.Session(auth=auth_plugin)
-        self._neutron_client = client.Client(
-            session=sess, region_name=self.conf.auth_region,
-            auth_strategy=self.conf.auth_strategy,
-            endpoint_type=self.conf.endpoint_type)
+        self._neutron_client = get_neutron_client(self.conf)
         return self._neutron_client
 
+    @property
+    def network_cache(self):
+        return get_network_cache(self.conf)
+
     def fini_l3(self, device_name):
         ipif = net_lib.IPInterface(device_name)
         ipif.delete_ip()
@@ -112,11 +228,9 @@ class OVSInterfaceDriver(object):
         """Set the L3 settings for the interface using data from the port.
            ip_cidrs: list of 'X.X.X.X/YY' strings
         """
+        # addresses of the interface not in ip_cidrs are removed
         ipif = net_lib.IPInterface(device_name)
-        for ip_cidr in ip_cidrs:
-            ipif.create_address(ip_cidr)
-        if addrconf:
-            ipif.create_addrconf()
+        ipif.reconcile(ip_cidrs, addrconf=addrconf)
 
     # TODO(gmoodalb): - probably take PREFIX?? for L3
     def get_device_name(self, port):
@@ -125,30 +239,12 @@ class OVSInterfaceDriver(object):
         vnicname += self.VNIC_NAME_SUFFIX
         return vnicname.replace('-', '_')
 
-    def plug(self, tenant_id, network_id, port_id, datalink_name, mac_address,
-             network=None, bridge=None, namespace=None, prefix=None,
-             protection=False, mtu=None, vif_type=None):
-        """Plug in the interface."""
-
-        if net_lib.Datalink.datalink_exists(datalink_name):
-            LOG.info(_("Device %s already exists"), datalink_name)
-            return
-
-        if bridge is None:
-            bridge = self.conf.ovs_integration_bridge
-
-        # check if bridge exists
-        ovs = ovs_lib.OVSBridge(bridge)
-        if not ovs.bridge_exists(bridge):
-            raise exceptions.BridgeDoesNotExist(bridge=bridge)
-
-        if network is None:
-            network = self.neutron_client.show_network(network_id)['network']
-            mtu = network.get('mtu')
-
+    def _get_lower_link(self, datalink_name, network, bridge):
+        """Return the lower link and VLAN ID of the VNIC of network."""
         network_type = network.get('provider:network_type')
         vid = None
         lower_link = None
+        phys_network = None
         if network_type == p_const.TYPE_VXLAN:
             lower_link = 'ovs.vxlan1'
         elif network_type in [p_const.TYPE_VLAN, p_const.TYPE_FLAT]:
@@ -159,29 +255,13 @@ class OVSInterfaceDriver(object):
                 vid = network.get('provider:segmentation_id')
             # need to determine the bridge mapping
             try:
-                results = get_ovsdb_info('Open_vSwitch', ['other_config'])
+                lower_link = self.bridge_mappings.resolve(phys_network)
+            except bridge_mappings.BridgeMappingError as err:
+                raise exceptions.Invalid(message=str(err))
             except Exception as err:
                 LOG.exception(_("Failed to retrieve other_config from %s: %s"),
                               bridge, err)
                 raise
-            other_config = results[0]['other_config']
-            if not other_config:
-                msg = (_("'other_config' column in 'Open_vSwitch' OVSDB table "
-                         "is not configured. Please configure it so that "
-                         "lower-link can be determined for the VNICs"))
-                raise exceptions.Invalid(message=msg)
-            bridge_mappings = other_config.get('bridge_mappings')
-            if not bridge_mappings:
-                msg = (_("'bridge_mappings' info is not set in 'other_config' "
-                         "column of 'Open_vSwitch' OVSDB table. Please "
-                         "configure it so that lower-link can be determined "
-                         "for the VNICs"))
-                raise exceptions.Invalid(message=msg)
-            for bridge_mapping in bridge_mappings.split(','):
-                if phys_network not in bridge_mapping:
-                    continue
-                lower_link = bridge_mapping.split(':')[1]
-                break
         else:
             # TYPE_GRE and TYPE_LOCAL
             msg = (_("Unsupported network type: %s") % network_type)
@@ -195,7 +275,9 @@ class OVSInterfaceDriver(object):
                    (datalink_name, phys_network))
             LOG.error(msg)
             raise exceptions.Invalid(message=msg)
+        return lower_link, vid
 
+    def _check_vif_type(self, datalink_name, vif_type):
         if vif_type == 'binding_failed':
             msg = (_('Port binding has failed for %s. Ensure that '
                      'OVS agent is running and/or bridge_mappings are '
@@ -203,26 +285,147 @@ class OVSInterfaceDriver(object):
                      'connectivity') % datalink_name)
             LOG.error(msg)
 
+    def _set_mtu(self, datalink_name, mtu, lower_link):
+        try:
+            net_lib.Datalink(datalink_name).set_prop('mtu', mtu)
+        except Exception:
+            msg = (_("Failed to set mtu value of '%s' on '%s' over lower "
+                     "link '%s'. If you are using VLANs, then ensure that "
+                     "either the mapping of physical networks to MTU "
+                     "values (ml2_conf.ini`physical_network_mtus option) "
+                     "or neutron.conf`global_physnet_mtu value is set "
+                     "correctly. If you are using VXLANs, make sure that "
+                     "ml2_conf.ini`path_mtu value is set correctly.") %
+                   (mtu, datalink_name, lower_link))
+            LOG.error(msg)
+
+    @staticmethod
+    def _port_attrs(port_id, mac_address):
+        return [('external_ids', {'iface-id': port_id,
+                                  'iface-status': 'active',
+                                  'attached-mac': mac_address})]
+
+    def _get_bridge(self, bridge):
+        if bridge is None:
+            bridge = self.conf.ovs_integration_bridge
+
+        # check if bridge exists
+        ovs = ovs_lib.OVSBridge(bridge)
+        if not ovs.bridge_exists(bridge):
+            raise exceptions.BridgeDoesNotExist(bridge=bridge)
+        return ovs
+
+    def plug(self, tenant_id, network_id, port_id, datalink_name, mac_address,
+             network=None, bridge=None, namespace=None, prefix=None,
+             protection=False, mtu=None, vif_type=None):
+        """Plug in the interface."""
+
+        if net_lib.Datalink.datalink_exists(datalink_name):
+            LOG.info(_("Device %s already exists"), datalink_name)
+            return
+
+        ovs = self._get_bridge(bridge)
+
+        if network is None:
+            network = self.network_cache.get_network(network_id)
+            mtu = network.get('mtu')
+
+        lower_link, vid = self._get_lower_link(datalink_name, network,
+                                               ovs.br_name)
+        self._check_vif_type(datalink_name, vif_type)
+
         dl = net_lib.Datalink(datalink_name)
         dl.create_vnic(lower_link, mac_address, vid, temp=True)
         if mtu:
+            self._set_mtu(datalink_name, mtu, lower_link)
+
+        ovs.replace_port(datalink_name,
+                         *self._port_attrs(port_id, mac_address))
+
+    def plug_many(self, ports, bridge=None, workers=8):
+        """Plug in many interfaces at once.
+
+        The existing datalinks are listed once, the VNICs are created up to
+        workers at a time and all of them are added to the bridge in a
+        single OVSDB transaction. A port that fails does not keep the
+        others from being plugged.
+
+        :param ports: list of dicts with the network_id, port_id,
+                      datalink_name and mac_address arguments of plug(),
+                      and optionally its network, mtu and vif_type ones.
+        :returns: dict of the datalink names that failed to be plugged to
+                  their exception.
+        """
+        ovs = self._get_bridge(bridge)
+        existing = set(net_lib.Datalink.show_link())
+
+        errors = {}
+        specs = []
+        to_plug = {}
+        for port in ports:
+            datalink_name = port['datalink_name']
+            if datalink_name in existing or datalink_name in to_plug:
+                LOG.info(_("Device %s already exists"), datalink_name)
+                continue
             try:
-                dl.set_prop('mtu', mtu)
-            except Exception:
-                msg = (_("Failed to set mtu value of '%s' on '%s' over lower "
-                         "link '%s'. If you are using VLANs, then ensure that "
-                         "either the mapping of physical networks to MTU "
-                         "values (ml2_conf.ini`physical_network_mtus option) "
-                         "or neutron.conf`global_physnet_mtu value is set "
-                         "correctly. If you are using VXLANs, make sure that "
-                         "ml2_conf.ini`path_mtu value is set correctly.") %
-                       (mtu, datalink_name, lower_link))
-                LOG.error(msg)
-
-        attrs = [('external_ids', {'iface-id': port_id,
-                                   'iface-status': 'active',
-                                   'attached-mac': mac_address})]
-        ovs.replace_port(datalink_name, *attrs)
+                network = port.get('network')
+                mtu = port.get('mtu')
+                if network is None:
+                    network = self.network_cache.get_network(
+                        port['network_id'])
+                    mtu = network.get('mtu')
+                lower_link, vid = self._get_lower_link(
+                    datalink_name, network, ovs.br_name)
+            except Exception as err:
+                errors[datalink_name] = err
+                continue
+            self._check_vif_type(datalink_name, port.get('vif_type'))
+            specs.append(net_lib.VNICSpec(datalink_name, lower_link,
+                                          port['mac_address'], vid, mtu))
+            to_plug[datalink_name] = port
+
+        # the MTU is set afterwards, as plug() does, so that an invalid MTU
+        # does not fail the port
+        results = net_lib.Datalink.create_vnics(
+            [spec._replace(mtu=None) for spec in specs], temp=True,
+            workers=workers)
+        created = []
+        for spec, result in zip(specs, results):
+            if result.status == net_lib.VNICResult.CREATED:
+                created.append(spec)
+            else:
+                errors[spec.name] = result.error
+
+        pool = eventlet.GreenPool(workers)
+        for spec in created:
+            if spec.mtu:
+                pool.spawn_n(self._set_mtu, spec.name, spec.mtu,
+                             spec.lower_link)
+        pool.waitall()
+
+        if not created:
+            return errors
+        try:
+            with ovs.ovsdb.transaction(check_error=True) as txn:
+                for spec in created:
+                    port = to_plug[spec.name]
+                    txn.add(ovs.ovsdb.del_port(spec.name))
+                    txn.add(ovs.ovsdb.add_port(ovs.br_name, spec.name,
+                                               may_exist=False))
+                    txn.add(ovs.ovsdb.db_set(
+                        'Interface', spec.name,
+                        *self._port_attrs(port['port_id'],
+                                          port['mac_address'])))
+        except Exception as err:
+            LOG.error("Failed adding %(count)d ports to bridge %(bridge)s: "
+                      "%(err)s", {'count': len(created),
+                                  'bridge': ovs.br_name, 'err': err})
+            # the VNICs are useless off the bridge
+            net_lib.Datalink.delete_vnics([spec.name for spec in created],
+                                          workers=workers)
+            for spec in created:
+                errors[spec.name] = err
+        return errors
 
     def unplug(self, datalink_name, bridge=None, namespace=None, prefix=None):
         """Unplug the interface."""
@@ -234,13 +437,7 @@ class OVSInterfaceDriver(object):
         dl = net_lib.Datalink(datalink_name)
         dl.delete_vnic()
 
-        if bridge is None:
-            bridge = self.conf.ovs_integration_bridge
-
-        # check if bridge exists
-        ovs = ovs_lib.OVSBridge(bridge)
-        if not ovs.bridge_exists(bridge):
-            raise exceptions.BridgeDoesNotExist(bridge=bridge)
+        ovs = self._get_bridge(bridge)
 
         try:
             ovs.delete_port(datalink_name)
@@ -249,6 +446,59 @@ class OVSInterfaceDriver(object):
             LOG.exception(_("Failed unplugging interface '%s': %s") %
                           (datalink_name, err))
 
+    def unplug_many(self, datalink_names, bridge=None, workers=8):
+        """Unplug many interfaces at once.
+
+        The IP interfaces and datalinks are listed once, the VNICs are
+        deleted up to workers at a time and all of them are removed from
+        the bridge in a single OVSDB transaction.
+
+        :returns: dict of the datalink names that failed to be unplugged to
+                  their exception.
+        """
+        datalink_names = list(datalink_names)
+        ovs = self._get_bridge(bridge)
+
+        errors = {}
+        ip_ifnames = net_lib.IPInterface.get_ifnames()
+
+        def _fini_l3(datalink_name):
+            try:
+                net_lib.IPInterface(datalink_name).delete_ip(ifcheck=False)
+            except Exception as err:
+                return datalink_name, err
+            return datalink_name, None
+
+        pool = eventlet.GreenPool(workers)
+        for datalink_name, err in pool.imap(
+                _fini_l3, [datalink_name for datalink_name in datalink_names
+                           if datalink_name in ip_ifnames]):
+            if err is not None:
+                errors[datalink_name] = err
+
+        to_delete = [datalink_name for datalink_name in datalink_names
+                     if datalink_name not in errors]
+        for result in net_lib.Datalink.delete_vnics(to_delete,
+                                                    workers=workers):
+            if not result.ok:
+                errors[result.name] = result.error
+
+        to_remove = [datalink_name for datalink_name in to_delete
+                     if datalink_name not in errors]
+        if not to_remove:
+            return errors
+        try:
+            with ovs.ovsdb.transaction(check_error=True) as txn:
+                for datalink_name in to_remove:
+                    txn.add(ovs.ovsdb.del_port(datalink_name, ovs.br_name))
+            LOG.debug("Unplugged interfaces %s", to_remove)
+        except Exception as err:
+            LOG.exception(_("Failed unplugging interfaces %s: %s") %
+                          (to_remove, err))
+            for datalink_name in to_remove:
+                errors[datalink_name] = err
+        return errors
+
     @property
     def use_gateway_ips(self):
         """Whether to use gateway IPs instead of unique IP allocations.
@@ -306,31 +556,25 @@ class SolarisInterfaceDriver(object):
         len(VNIC_NAME_SUFFIX)
 
     def __init__(self, conf):
+        agent_setup.setup()
         self.conf = conf
         self._neutron_client = None
+        self._interface_mappings = helpers.parse_mappings(
+            conf.physical_interface_mappings)
+        agent_setup.load_lower_links(set(self._interface_mappings.values()))
 
     @property
     def neutron_client(self):
         LOG.debug('neutron_client')
         if self._neutron_client:
             return self._neutron_client
-        auth_plugin = Password(
-            auth_url=self.conf.auth_url,
-            username=self.conf.admin_user,
-            password=self.conf.admin_password,
-            tenant_name=self.conf.admin_tenant_name,
-            project_name=self.conf.project_name,
-            project_domain_name=self.conf.project_domain_name,
-            user_domain_name=self.conf.user_domain_name,
-            trust_id=self.conf.trust_id
-        )
-        sess = session.Session(auth=auth_plugin)
-        self._neutron_client = client.Client(
-            session=sess, region_name=self.conf.auth_region,
-            auth_strategy=self.conf.auth_strategy,
-            endpoint_type=self.conf.endpoint_type)
+        self._neutron_client = get_neutron_client(self.conf)
         return self._neutron_client
 
+    @property
+    def network_cache(self):
+        return get_network_cache(self.conf)
+
     def fini_l3(self, device_name):
         LOG.debug('fini_l3 %s', device_name)
         ipif = net_lib.IPInterface(device_name)
@@ -341,11 +585,9 @@ class SolarisInterfaceDriver(object):
            ip_cidrs: list of 'X.X.X.X/YY' strings
         """
         LOG.debug('fini_l3 %s, %s, %s', device_name, ip_cidrs, addrconf)
+        # addresses of the interface not in ip_cidrs are removed
         ipif = net_lib.IPInterface(device_name)
-        for ip_cidr in ip_cidrs:
-            ipif.create_address(ip_cidr)
-        if addrconf:
-            ipif.create_addrconf()
+        ipif.reconcile(ip_cidrs, addrconf=addrconf)
 
     # TODO(gmoodalb): - probably take PREFIX?? for L3
     def get_device_name(self, port):
@@ -356,16 +598,74 @@ class SolarisInterfaceDriver(object):
         LOG.debug('get_device_name %s', vnicname)
         return vnicname
 
+    def _get_lower_link(self, datalink_name, network):
+        """Return the lower link and VLAN ID of the VNIC of network."""
+        network_type = network.get('provider:network_type')
+        if network_type not in [p_const.TYPE_VLAN, p_const.TYPE_FLAT]:
+            msg = (_("Unsupported network type: %s") % network_type)
+            LOG.error(msg)
+            raise exceptions.Invalid(message=msg)
+        phys_network = network.get('provider:physical_network')
+        lower_link = self._interface_mappings.get(phys_network)
+        if not lower_link:
+            msg = (_("Failed to determine the lower_link for VNIC "
+                     "%s on physical_network %s") %
+                   (datalink_name, phys_network))
+            LOG.error(msg)
+            raise exceptions.Invalid(message=msg)
+        vid = None
+        if network_type == p_const.TYPE_VLAN:
+            vid = str(network.get('provider:segmentation_id'))
+        return lower_link, vid
+
     def plug(self, tenant_id, network_id, port_id, datalink_name, mac_address,
              network=None, bridge=None, namespace=None, prefix=None,
              protection=False, mtu=None, vif_type=None):
         """Plug in the interface."""
         LOG.debug('plug %s', datalink_name)
 
+        if net_lib.Datalink.datalink_exists(datalink_name, refresh=True):
+            LOG.info(_("Device %s already exists"), datalink_name)
+            return
+
+        if network is None:
+            network = self.network_cache.get_network(network_id)
+            mtu = network.get('mtu')
+
+        lower_link, vid = self._get_lower_link(datalink_name, network)
+
+        pool = get_vnic_pool(self.conf)
+        if pool is None or not pool.acquire(datalink_name, lower_link, vid,
+                                            mac_address):
+            net_lib.Datalink(datalink_name).create_vnic(
+                lower_link, mac_address, vid, temp=True)
+        if mtu:
+            try:
+                net_lib.Datalink(datalink_name).set_prop('mtu', mtu,
+                                                         temp=True)
+            except Exception as err:
+                LOG.error("Failed to set mtu value of %(mtu)s on %(name)s "
+                          "over lower link %(link)s: %(err)s",
+                          {'mtu': mtu, 'name': datalink_name,
+                           'link': lower_link, 'err': err})
+
     def unplug(self, datalink_name, bridge=None, namespace=None, prefix=None):
         """Unplug the interface."""
         LOG.debug('unplug %s', datalink_name)
 
+        # remove any IP addresses on top of this datalink, otherwise we will
+        # get 'device busy' error while deleting the datalink
+        self.fini_l3(datalink_name)
+
+        vnic = net_lib.Datalink.get_vnic(datalink_name)
+        if vnic is None:
+            return
+        pool = get_vnic_pool(self.conf)
+        if pool is not None and pool.release(datalink_name, vnic.over,
+                                             vnic.vid):
+            return
+        net_lib.Datalink(datalink_name).delete_vnic()
+
     @property
     def use_gateway_ips(self):
         """Whether to use gateway IPs instead of unique IP allocations.
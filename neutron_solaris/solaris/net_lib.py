@@ -16,32 +16,307 @@
 # @author: Girish Moodalbail, Oracle, Inc.
 #
 
+import abc
+import collections
+import os
+import threading
+import time
+import types
+
 import eventlet
 import netaddr
+from neutron_lib import exceptions
 
 from oslo_log import log as logging
 
 from neutron.agent.linux import utils
 from neutron._i18n import _
 
+from neutron_solaris.common import metrics
+from neutron_solaris.common import tracing
+from neutron_solaris.solaris import garp
+from neutron_solaris.solaris import parsers
+from neutron_solaris.solaris import pfexec_daemon
+
 LOG = logging.getLogger(__name__)
 
 
+def normalize_mac(mac):
+    # dladm(1M) drops the leading zeros of each octet (2:8:20:d2:1c:3e),
+    # whereas neutron stores MAC addresses in the unix expanded format.
+    try:
+        return str(netaddr.EUI(mac, dialect=netaddr.mac_unix_expanded))
+    except (netaddr.AddrFormatError, TypeError, ValueError):
+        return mac
+
+
+COMMAND_DURATION = metrics.REGISTRY.histogram(
+    'neutron_solaris_command_duration_seconds',
+    'Duration of the dladm, ipadm, pfctl and other commands run.',
+    ['command'])
+COMMAND_ERRORS = metrics.REGISTRY.counter(
+    'neutron_solaris_command_errors',
+    'Commands that failed or exited with an error.',
+    ['command'])
+
+
+def command_verb(cmd):
+    """Name a command line for accounting, e.g. 'dladm show-vnic'.
+
+    pfexec(1) is skipped and a subcommand is only taken from the first
+    argument, so options and link names do not end up in the name.
+    """
+    args = [str(arg) for arg in cmd]
+    if args and os.path.basename(args[0]) == 'pfexec':
+        args = args[1:]
+    if not args:
+        return ''
+    verb = os.path.basename(args[0])
+    if len(args) > 1 and not args[1].startswith('-'):
+        verb = '%s %s' % (verb, args[1])
+    return verb
+
+
+class CommandBackend(object, metaclass=abc.ABCMeta):
+    """Runs the commands of CommandBase.
+
+    Backends implement run(). execute() applies to its result the same
+    exit code handling as neutron.agent.linux.utils.execute().
+    """
+
+    @abc.abstractmethod
+    def run(self, cmd, process_input=None):
+        """Run cmd.
+
+        :returns: tuple of the standard output, standard error and exit
+                  code of the command.
+        """
+
+    @staticmethod
+    def check_result(cmd, stdout, stderr, returncode, process_input=None,
+                     check_exit_code=True, return_stderr=False,
+                     log_fail_as_error=True, extra_ok_codes=None):
+        if returncode and returncode not in (extra_ok_codes or []):
+            msg = ("Exit code: %(returncode)d; "
+                   "Cmd: %(cmd)s; "
+                   "Stdin: %(stdin)s; "
+                   "Stdout: %(stdout)s; "
+                   "Stderr: %(stderr)s" % {
+                       'returncode': returncode,
+                       'cmd': cmd,
+                       'stdin': process_input or '',
+                       'stdout': stdout,
+                       'stderr': stderr})
+            if log_fail_as_error:
+                LOG.error(msg)
+            if check_exit_code:
+                raise exceptions.ProcessExecutionError(msg,
+                                                       returncode=returncode)
+        return (stdout, stderr) if return_stderr else stdout
+
+    def execute(self, cmd, process_input=None, **kwargs):
+        stdout, stderr, returncode = self.run(cmd, process_input)
+        return self.check_result(cmd, stdout, stderr, returncode,
+                                 process_input=process_input, **kwargs)
+
+
+class SubprocessBackend(CommandBackend):
+    """Runs the commands on the host."""
+
+    def run(self, cmd, process_input=None):
+        try:
+            stdout, stderr = utils.execute(
+                cmd, process_input=process_input, return_stderr=True,
+                log_fail_as_error=False)
+        except exceptions.ProcessExecutionError as e:
+            # utils.execute() only reports the output in the message
+            return '', str(e), e.returncode
+        return stdout, stderr, 0
+
+    def execute(self, cmd, **kwargs):
+        return utils.execute(cmd, **kwargs)
+
+
 class CommandBase(object):
+    # CommandBackend running the commands, the simulator backend lets the
+    # wrappers run off Solaris.
+    backend = SubprocessBackend()
+
+    # pfexec_daemon.PfexecDaemonClient running the privileged commands, if
+    # set. Commands it does not allow, or all of them while it is
+    # unavailable, are run with pfexec(1).
+    command_daemon = None
+
     @classmethod
     def execute_with_pfexec(cls, cmd, **kwargs):
+        daemon = cls.command_daemon
+        if daemon is not None and daemon.allows(cmd):
+            try:
+                return cls._execute_with_daemon(daemon, cmd, **kwargs)
+            except pfexec_daemon.DaemonUnavailable:
+                LOG.debug("pfexec daemon unavailable, running %s directly",
+                          cmd)
         # uses pfexec
         cmd.insert(0, '/usr/bin/pfexec')
-        return utils.execute(cmd, **kwargs)
+        return cls.execute(cmd, **kwargs)
+
+    @classmethod
+    def _execute_with_daemon(cls, daemon, cmd, process_input=None,
+                             **kwargs):
+        verb = command_verb(cmd)
+        start = time.time()
+        try:
+            with tracing.span('command', command=verb, daemon=True):
+                stdout, stderr, returncode = daemon.execute(cmd,
+                                                            process_input)
+        except pfexec_daemon.DaemonUnavailable:
+            raise
+        except pfexec_daemon.DaemonError as e:
+            # the command may have been run already, running it again with
+            # pfexec is not safe
+            COMMAND_ERRORS.inc(command=verb)
+            COMMAND_DURATION.observe(time.time() - start, command=verb)
+            raise exceptions.ProcessExecutionError(str(e), returncode=-1)
+        except Exception:
+            COMMAND_ERRORS.inc(command=verb)
+            COMMAND_DURATION.observe(time.time() - start, command=verb)
+            raise
+        COMMAND_DURATION.observe(time.time() - start, command=verb)
+        try:
+            return CommandBackend.check_result(
+                cmd, stdout, stderr, returncode,
+                process_input=process_input, **kwargs)
+        except Exception:
+            COMMAND_ERRORS.inc(command=verb)
+            raise
 
     @classmethod
     def execute(cls, cmd, **kwargs):
-        return utils.execute(cmd, **kwargs)
+        verb = command_verb(cmd)
+        start = time.time()
+        try:
+            with tracing.span('command', command=verb):
+                return cls.backend.execute(cmd, **kwargs)
+        except Exception:
+            COMMAND_ERRORS.inc(command=verb)
+            raise
+        finally:
+            COMMAND_DURATION.observe(time.time() - start, command=verb)
+
+
+class IPAddress(collections.namedtuple('IPAddress',
+                                       ['addrobj', 'type', 'addr'])):
+    '''A single address object as reported by ipadm show-addr.'''
+    __slots__ = ()
+
+
+class AddressPlan(object):
+    '''ipadm changes turning the current addresses into the desired ones.
+
+    The changes are applied in order: the IP interfaces are created, then
+    the unwanted address objects are deleted and the missing addresses
+    are created, as (ifname, type, addr) tuples.
+    '''
+
+    def __init__(self):
+        self.create_ip = []
+        self.delete = []
+        self.create = []
+
+    def __bool__(self):
+        return bool(self.create_ip or self.delete or self.create)
+
+    def __repr__(self):
+        return ('AddressPlan(create_ip=%r, delete=%r, create=%r)' %
+                (self.create_ip, self.delete, self.create))
+
+
+class AddressIndex(object):
+    '''Snapshot of the IP addresses of the host, indexed for lookups.
+
+    The snapshot is built from a single parseable ipadm show-addr call and
+    can be shared by a batch of operations instead of listing the
+    addresses for every check. It is not updated by the changes made
+    after it was built.
+
+    Addresses are matched on their IP address and, when the looked up
+    address has one, on their prefix length, rather than as substrings of
+    the ipadm output.
+    '''
+
+    def __init__(self, addresses=None):
+        # ifname -> [IPAddress]
+        self._addresses = {}
+        # ifname -> {(ip, prefixlen): IPNetwork}
+        self._networks = {}
+        # ip -> [(ifname, IPAddress, IPNetwork)]
+        self._by_ip = {}
+        for ifname, ifaddresses in (addresses or {}).items():
+            self._addresses[ifname] = list(ifaddresses)
+            networks = self._networks[ifname] = collections.OrderedDict()
+            for address in ifaddresses:
+                try:
+                    network = netaddr.IPNetwork(address.addr)
+                except (netaddr.AddrFormatError, ValueError):
+                    continue
+                networks[(network.ip, network.prefixlen)] = network
+                self._by_ip.setdefault(network.ip, []).append(
+                    (ifname, address, network))
+
+    @classmethod
+    def build(cls, ifnames=None):
+        return cls(IPInterface.get_addresses(ifnames))
+
+    def __contains__(self, ipaddr):
+        return self.find(ipaddr) is not None
+
+    @property
+    def interfaces(self):
+        return frozenset(self._addresses)
+
+    def has_interface(self, ifname):
+        return ifname in self._addresses
+
+    def addresses(self, ifname):
+        return list(self._addresses.get(ifname, ()))
+
+    def addrobjs(self, ifname):
+        return [address.addrobj for address in self.addresses(ifname)]
+
+    def networks(self, ifname):
+        return list(self._networks.get(ifname, {}).values())
+
+    def find(self, ipaddr, ifname=None):
+        """Look up the address object holding ipaddr.
+
+        :param ipaddr: IP address, with or without a prefix length.
+        :param ifname: only look on this interface.
+        :returns: the IPAddress, or None.
+        """
+        try:
+            network = netaddr.IPNetwork(ipaddr)
+        except (netaddr.AddrFormatError, ValueError):
+            return None
+        with_prefix = '/' in str(ipaddr)
+        for owner, address, owned in self._by_ip.get(network.ip, ()):
+            if ifname is not None and owner != ifname:
+                continue
+            if with_prefix and owned.prefixlen != network.prefixlen:
+                continue
+            return address
+        return None
+
+    def contains(self, ipaddr, ifname=None):
+        return self.find(ipaddr, ifname) is not None
 
 
 class IPInterface(CommandBase):
     '''Wrapper around Solaris ipadm(1m) command.'''
 
+    # Stands for an addrconf address in the desired addresses given to
+    # reconcile_addresses()
+    ADDRCONF = 'addrconf'
+
     def __init__(self, ifname):
         self._ifname = ifname
 
@@ -55,53 +330,53 @@ class IPInterface(CommandBase):
         return True
 
     @classmethod
-    def ipaddr_exists(cls, ipaddr, ifname=None):
-        cmd = ['/usr/sbin/ipadm', 'show-addr', '-po', 'addr']
-        if ifname:
-            cmd.append(ifname)
+    def get_ifnames(cls):
+        """Return the set of all the IP interfaces, with one ipadm call."""
+        cmd = ['/usr/sbin/ipadm', 'show-if', '-po', 'ifname']
         stdout = cls.execute(cmd)
+        return set(interface.ifname for interface in
+                   parsers.iter_parseable(stdout, 'ifname'))
 
-        return ipaddr in stdout
+    @classmethod
+    def ipaddr_exists(cls, ipaddr, ifname=None, index=None):
+        if index is None:
+            index = AddressIndex.build([ifname] if ifname else None)
+        return index.contains(ipaddr, ifname)
 
     def ipaddr_list(self, filters=None):
         cmd = ['/usr/sbin/ipadm', 'show-addr', '-po', 'type,addr',
                self._ifname]
         stdout = self.execute(cmd)
-        atype_addrs = stdout.strip().split('\n')
         result = {}
-        for atype_addr in atype_addrs:
-            atype, addr = atype_addr.split(':', 1)
-            val = result.get(atype)
-            if val is None:
-                result[atype] = []
-                val = result.get(atype)
-            # in the case of IPv6 addresses remove any escape '\' character
-            val.append(addr.replace("\\", ""))
+        for address in parsers.iter_parseable(stdout, 'type,addr'):
+            result.setdefault(address.type, []).append(address.addr)
         return result
 
     def create_address(self, ipaddr, addrobjname=None, temp=True,
-                       ifcheck=True, addrcheck=True):
+                       ifcheck=True, addrcheck=True, index=None):
         if ifcheck and not self.ifname_exists(self._ifname):
             # create ip interface
             cmd = ['/usr/sbin/ipadm', 'create-ip', self._ifname]
             if temp:
                 cmd.insert(2, '-t')
             self.execute_with_pfexec(cmd)
-        elif addrcheck and self.ipaddr_exists(ipaddr, self._ifname):
-            return
+            # a new interface has no addresses
+            index = AddressIndex()
+        elif addrcheck:
+            if index is None:
+                index = AddressIndex.build([self._ifname])
+            if index.contains(ipaddr, self._ifname):
+                return
 
         # If an address is IPv6, then to create a static IPv6 address
         # we need to create link-local address first
         if netaddr.IPNetwork(ipaddr).version == 6:
             # check if link-local address already exists
-            cmd = ['/usr/sbin/dladm', 'show-linkprop', '-co', 'value',
-                   '-p', 'mac-address', self._ifname]
-            stdout = self.execute(cmd)
-            mac_addr = stdout.splitlines()[0].strip()
+            mac_addr = Datalink.show_prop(self._ifname, 'mac-address')
             ll_addr = netaddr.EUI(mac_addr).ipv6_link_local()
 
-            if addrcheck and not self.ipaddr_exists(str(ll_addr),
-                                                    self._ifname):
+            if addrcheck and not index.contains(str(ll_addr),
+                                                self._ifname):
                 # create a link-local address
                 cmd = ['/usr/sbin/ipadm', 'create-addr', '-T', 'static', '-a',
                        str(ll_addr), self._ifname]
@@ -135,127 +410,759 @@ class IPInterface(CommandBase):
             cmd.insert(2, '-t')
         self.execute_with_pfexec(cmd)
 
-    def delete_address(self, ipaddr, addrcheck=True):
-        if addrcheck and not self.ipaddr_exists(ipaddr, self._ifname):
-            return
-
-        cmd = ['/usr/sbin/ipadm', 'show-addr', '-po', 'addrobj,addr',
-               self._ifname]
-        stdout = self.execute(cmd)
-        aobj_addrs = stdout.strip().split('\n')
-        for aobj_addr in aobj_addrs:
-            if ipaddr not in aobj_addr:
-                continue
-            aobj = aobj_addr.split(':')[0]
-            cmd = ['/usr/sbin/ipadm', 'delete-addr', aobj]
+    def delete_address(self, ipaddr, addrcheck=True, index=None):
+        # a single listing tells both whether the address exists and
+        # which address object holds it
+        if index is None:
+            index = AddressIndex.build([self._ifname])
+        addresses = index.addresses(self._ifname)
+        address = index.find(ipaddr, self._ifname)
+        if address is not None:
+            cmd = ['/usr/sbin/ipadm', 'delete-addr', address.addrobj]
             self.execute_with_pfexec(cmd)
-            break
+        elif addrcheck:
+            return
 
         isV6 = netaddr.IPNetwork(ipaddr).version == 6
-        if len(aobj_addrs) == 1 or (isV6 and len(aobj_addrs) == 2):
+        if len(addresses) == 1 or (isV6 and len(addresses) == 2):
             # delete the interface as well
             cmd = ['/usr/sbin/ipadm', 'delete-ip', self._ifname]
             self.execute_with_pfexec(cmd)
 
-    def delete_ip(self):
-        if not self.ifname_exists(self._ifname):
+    def delete_ip(self, ifcheck=True):
+        if ifcheck and not self.ifname_exists(self._ifname):
             return
 
         cmd = ['/usr/sbin/ipadm', 'delete-ip', self._ifname]
         self.execute_with_pfexec(cmd)
 
+    @classmethod
+    def get_addresses(cls, ifnames=None):
+        """List the address objects with a single ipadm show-addr call.
+
+        :param ifnames: interfaces to list, all of them if None. Only a
+                        single interface is passed to ipadm, which fails
+                        for interfaces that do not exist.
+        :returns: dict mapping the name of every IP interface with
+                  addresses to its list of IPAddress.
+        """
+        cmd = ['/usr/sbin/ipadm', 'show-addr', '-p', '-o',
+               'addrobj,type,addr']
+        if ifnames is not None and len(ifnames) == 1:
+            cmd.append(list(ifnames)[0])
+        try:
+            stdout = cls.execute(cmd, log_fail_as_error=False)
+        except exceptions.ProcessExecutionError:
+            if ifnames is not None and len(ifnames) == 1:
+                # the interface does not exist
+                return {}
+            raise
+
+        result = collections.OrderedDict()
+        for address in parsers.iter_parseable(stdout, IPAddress):
+            ifname = address.addrobj.split('/')[0]
+            if ifnames is None or ifname in ifnames:
+                result.setdefault(ifname, []).append(address)
+        return result
+
+    @classmethod
+    def plan_addresses(cls, desired, current, link_local=None):
+        """Compute the minimal changes from current to desired.
+
+        Static and addrconf addresses not desired are deleted, others,
+        e.g. dhcp ones, are left alone. Static IPv6 addresses need a link
+        local address on their interface, which is created from
+        link_local(ifname) unless addrconf or an existing one provides
+        it.
+
+        :param desired: dict mapping interface names to the addresses,
+                        in CIDR notation, or ADDRCONF they should have.
+        :param current: dict as returned by get_addresses().
+        :param link_local: callable returning the link local address of
+                           an interface.
+        """
+        plan = AddressPlan()
+        for ifname, wanted in desired.items():
+            addrconf = cls.ADDRCONF in wanted
+            # IPNetwork equality ignores the host bits, the addresses are
+            # compared as (ip, prefixlen) instead
+            wanted_nets = collections.OrderedDict()
+            for addr in wanted:
+                if addr != cls.ADDRCONF:
+                    net = netaddr.IPNetwork(addr)
+                    wanted_nets.setdefault((net.ip, net.prefixlen), net)
+            needs_link_local = addrconf or any(
+                net.version == 6 for net in wanted_nets.values())
+
+            existing = current.get(ifname)
+            if existing is None:
+                plan.create_ip.append(ifname)
+                existing = []
+            present = set()
+            has_addrconf = has_link_local = False
+            for address in existing:
+                if address.type == 'addrconf':
+                    if addrconf and not has_addrconf:
+                        has_addrconf = has_link_local = True
+                    else:
+                        plan.delete.append(address.addrobj)
+                    continue
+                if address.type != 'static':
+                    continue
+                try:
+                    net = netaddr.IPNetwork(address.addr)
+                except (netaddr.AddrFormatError, ValueError):
+                    continue
+                is_link_local = net.version == 6 and net.ip.is_link_local()
+                key = (net.ip, net.prefixlen)
+                if key in wanted_nets and key not in present:
+                    present.add(key)
+                    has_link_local = has_link_local or is_link_local
+                elif (is_link_local and needs_link_local and
+                        not has_link_local):
+                    has_link_local = True
+                else:
+                    plan.delete.append(address.addrobj)
+
+            if addrconf and not has_addrconf:
+                plan.create.append((ifname, cls.ADDRCONF, None))
+                has_link_local = True
+            missing = [net for key, net in wanted_nets.items()
+                       if key not in present]
+            if any(net.version == 6 and net.ip.is_link_local()
+                   for net in missing):
+                has_link_local = True
+            if (not has_link_local and link_local is not None and
+                    any(net.version == 6 for net in missing)):
+                plan.create.append((ifname, 'static', link_local(ifname)))
+            for net in missing:
+                plan.create.append((ifname, 'static', str(net)))
+        return plan
+
+    @classmethod
+    def apply_address_plan(cls, plan, temp=True):
+        for ifname in plan.create_ip:
+            cmd = ['/usr/sbin/ipadm', 'create-ip', ifname]
+            if temp:
+                cmd.insert(2, '-t')
+            try:
+                cls.execute_with_pfexec(cmd, log_fail_as_error=False)
+            except exceptions.ProcessExecutionError:
+                # an interface without addresses is not listed by
+                # show-addr, so it may exist already
+                if not cls.ifname_exists(ifname):
+                    raise
+        for addrobj in plan.delete:
+            cls.execute_with_pfexec(['/usr/sbin/ipadm', 'delete-addr',
+                                     addrobj])
+        for ifname, addr_type, addr in plan.create:
+            cmd = ['/usr/sbin/ipadm', 'create-addr', '-T', addr_type]
+            if addr is not None:
+                cmd.extend(['-a', addr])
+            cmd.append(ifname)
+            if temp:
+                cmd.insert(2, '-t')
+            cls.execute_with_pfexec(cmd)
+
+    @classmethod
+    def reconcile_addresses(cls, desired, temp=True, index=None):
+        """Make the interfaces have exactly the desired addresses.
+
+        The current addresses are read with a single ipadm call, unless
+        an AddressIndex is given, and only the commands needed to reach
+        the desired state are run.
+
+        :param desired: dict mapping interface names to the addresses,
+                        in CIDR notation, or ADDRCONF they should have.
+        :returns: the AddressPlan that was applied.
+        """
+        if index is None:
+            index = AddressIndex.build(list(desired))
+        current = {ifname: index.addresses(ifname) for ifname in desired
+                   if index.has_interface(ifname)}
+        plan = cls.plan_addresses(desired, current, cls._link_local)
+        if plan:
+            LOG.debug("Reconciling IP addresses: %s", plan)
+            cls.apply_address_plan(plan, temp)
+        return plan
+
+    @staticmethod
+    def _link_local(ifname):
+        mac_addr = Datalink.show_prop(ifname, 'mac-address')
+        return str(netaddr.EUI(mac_addr).ipv6_link_local())
+
+    def reconcile(self, ip_cidrs, addrconf=False, temp=True, index=None):
+        addresses = list(ip_cidrs)
+        if addrconf:
+            addresses.append(self.ADDRCONF)
+        return self.reconcile_addresses({self._ifname: addresses}, temp,
+                                        index)
+
+
+class VNIC(collections.namedtuple('VNIC',
+                                  ['link', 'mac', 'vid', 'over', 'state'])):
+    '''A single VNIC as reported by dladm show-vnic.'''
+    __slots__ = ()
+
+
+class VNICSpec(collections.namedtuple('VNICSpec',
+                                      ['name', 'lower_link', 'mac', 'vid',
+                                       'mtu', 'props'])):
+    '''A VNIC to be created by Datalink.create_vnics().'''
+    __slots__ = ()
+
+    def __new__(cls, name, lower_link, mac=None, vid=None, mtu=None,
+                props=None):
+        return super(VNICSpec, cls).__new__(cls, name, lower_link, mac, vid,
+                                            mtu, props)
+
+
+class VNICResult(collections.namedtuple('VNICResult',
+                                        ['name', 'status', 'error'])):
+    '''Outcome for one link of Datalink.create_vnics()/delete_vnics().'''
+    __slots__ = ()
+
+    CREATED = 'created'
+    EXISTS = 'exists'
+    DELETED = 'deleted'
+    ABSENT = 'absent'
+    ROLLED_BACK = 'rolled_back'
+    FAILED = 'failed'
+
+    @property
+    def ok(self):
+        return self.status != self.FAILED
+
+
+class VNICInventory(object):
+    '''Immutable snapshot of all the VNICs configured on the host.
+
+    The snapshot is built from a single parseable dladm show-vnic call and
+    provides lookups by link name and by MAC address.
+    '''
+
+    __slots__ = ('_vnics', '_by_link', '_by_mac')
+
+    def __init__(self, vnics=()):
+        self._vnics = tuple(vnics)
+        self._by_link = types.MappingProxyType(
+            {vnic.link: vnic for vnic in self._vnics})
+        self._by_mac = types.MappingProxyType(
+            {vnic.mac: vnic for vnic in self._vnics})
+
+    def __iter__(self):
+        return iter(self._vnics)
+
+    def __len__(self):
+        return len(self._vnics)
+
+    def __contains__(self, link):
+        return link in self._by_link
+
+    @property
+    def by_link(self):
+        return self._by_link
+
+    @property
+    def by_mac(self):
+        return self._by_mac
+
+    @property
+    def macs(self):
+        return frozenset(self._by_mac)
+
+    def get(self, link):
+        return self._by_link.get(link)
+
+    def get_by_mac(self, mac):
+        return self._by_mac.get(mac)
+
+    def mac_to_link(self):
+        return {vnic.mac: vnic.link for vnic in self._vnics}
+
+
+LINK_CACHE_LOOKUPS = metrics.REGISTRY.counter(
+    'neutron_solaris_link_cache_lookups',
+    'Datalink property cache lookups by result.', ['result'])
+
+_MISSING = object()
+
+
+class LinkPropertyCache(object):
+    '''Per-link cache of dladm(1M) lookups with TTL and LRU eviction.
+
+    Values are grouped by link so that all the cached values of a link can
+    be invalidated at once. At most max_links links are kept, the least
+    recently used one is evicted first, and every value expires ttl seconds
+    after it was fetched. A ttl of 0 disables the cache.
+    '''
+
+    def __init__(self, ttl=10, max_links=1024):
+        self.ttl = ttl
+        self.max_links = max_links
+        self._lock = threading.Lock()
+        # link -> {key: (value, expiry)}, in least recently used order
+        self._links = collections.OrderedDict()
+        self._stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0}
+
+    def __len__(self):
+        return len(self._links)
+
+    def get(self, dlname, key, now=None):
+        """Return the cached value, or _MISSING if there is none."""
+        now = time.time() if now is None else now
+        with self._lock:
+            entries = self._links.get(dlname)
+            entry = entries.get(key) if entries else None
+            if entry is not None and entry[1] <= now:
+                del entries[key]
+                self._stats['expired'] += 1
+                entry = None
+            if entry is None:
+                self._stats['misses'] += 1
+                LINK_CACHE_LOOKUPS.inc(result='miss')
+                return _MISSING
+            self._links.move_to_end(dlname)
+            self._stats['hits'] += 1
+            LINK_CACHE_LOOKUPS.inc(result='hit')
+            return entry[0]
+
+    def set(self, dlname, key, value, now=None):
+        if self.ttl <= 0:
+            return
+        now = time.time() if now is None else now
+        with self._lock:
+            entries = self._links.setdefault(dlname, {})
+            entries[key] = (value, now + self.ttl)
+            self._links.move_to_end(dlname)
+            while len(self._links) > self.max_links:
+                self._links.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def invalidate(self, dlname=None):
+        """Drop the cached values of dlname, or of all links if not set."""
+        with self._lock:
+            if dlname is None:
+                self._links.clear()
+            else:
+                self._links.pop(dlname, None)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['links'] = len(self._links)
+        return stats
+
+
+class LowerLink(collections.namedtuple('LowerLink',
+                                        ['name', 'default_tag', 'mtu',
+                                         'speed', 'state'])):
+    '''Properties of a link VNICs are created over.'''
+    __slots__ = ()
+
+
+class LowerLinkCache(object):
+    '''Descriptors of the lower links, kept for max_age seconds.
+
+    There are only a few lower links per host and their properties seldom
+    change, so they are loaded once, e.g. from the interface mappings at
+    agent start, and then refreshed on a slow timer or invalidated when
+    the link changes. A link is loaded on first use, and again once its
+    descriptor is older than max_age seconds, 0 keeps it forever.
+    '''
+
+    def __init__(self, max_age=600):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        # name -> (LowerLink, loaded at)
+        self._links = {}
+
+    def __contains__(self, name):
+        return name in self._links
+
+    def load(self, names):
+        """Load the descriptors of names, even if they are cached.
+
+        :returns: dict mapping the names to their LowerLink, or None for
+                  the links that could not be looked up.
+        """
+        loaded = {}
+        for name in names:
+            lower_link = Datalink.get_lower_link(name)
+            with self._lock:
+                if lower_link is None:
+                    self._links.pop(name, None)
+                else:
+                    self._links[name] = (lower_link, time.time())
+            loaded[name] = lower_link
+        return loaded
+
+    def get(self, name, now=None):
+        """Return the LowerLink of name, loading it if needed, or None."""
+        now = time.time() if now is None else now
+        entry = self._links.get(name)
+        if entry is not None and (not self.max_age or
+                                  now - entry[1] < self.max_age):
+            return entry[0]
+        return self.load([name])[name]
+
+    def refresh(self):
+        """Reload every cached descriptor."""
+        return self.load(list(self._links))
+
+    def invalidate(self, name=None):
+        with self._lock:
+            if name is None:
+                self._links.clear()
+            else:
+                self._links.pop(name, None)
+
 
 class Datalink(CommandBase):
-    '''Wrapper around Solaris dladm(1m) command.'''
+    '''Wrapper around Solaris dladm(1m) command.
+
+    Link existence and property lookups go through the shared link_cache.
+    Pass refresh=True to bypass it when the value must be current, the
+    fresh value is cached again.
+    '''
+
+    link_cache = LinkPropertyCache()
+    lower_links = LowerLinkCache()
 
     def __init__(self, dlname):
         self._dlname = dlname
 
     @classmethod
-    def datalink_exists(cls, dlname):
-        try:
-            cmd = ['/usr/sbin/dladm', 'show-link', '-po', 'link', dlname]
-            utils.execute(cmd, log_fail_as_error=False)
-        except Exception:
-            return False
-        return True
+    def _cached(cls, dlname, key, fetch, refresh):
+        if not refresh:
+            value = cls.link_cache.get(dlname, key)
+            if value is not _MISSING:
+                return value
+        value = fetch()
+        cls.link_cache.set(dlname, key, value)
+        return value
 
     @classmethod
-    def get_mac(cls, dlname):
-        try:
+    def datalink_exists(cls, dlname, refresh=False):
+        def _exists():
+            try:
+                cmd = ['/usr/sbin/dladm', 'show-link', '-po', 'link', dlname]
+                cls.execute(cmd, log_fail_as_error=False)
+            except Exception:
+                return False
+            return True
+
+        return cls._cached(dlname, 'exists', _exists, refresh)
+
+    @classmethod
+    def show_prop(cls, dlname, pname, refresh=False):
+        """Return the value of the pname property of dlname.
+
+        Unlike get_prop, errors from dladm are raised and not cached.
+        """
+        def _show_prop():
             cmd = ['/usr/sbin/dladm', 'show-linkprop', '-co', 'value',
-                   '-p', 'mac-address', dlname]
-            stdout = utils.execute(cmd)
-            mac_addr = stdout.splitlines()[0].strip()
+                   '-p', pname, dlname]
+            stdout = cls.execute(cmd)
+            return next(parsers.iter_lines(stdout), '').strip()
+
+        return cls._cached(dlname, ('prop', pname), _show_prop, refresh)
+
+    @classmethod
+    def get_mac(cls, dlname, refresh=False):
+        try:
+            return cls.show_prop(dlname, 'mac-address', refresh=refresh)
         except Exception:
             return "00:00:00:00:00:00"
-        return mac_addr
- 
-    def create_vnic(self, lower_link, mac_address=None, vid=None, temp=False):
-        if self.datalink_exists(self._dlname):
-            return
 
-        if vid:
-            # If the default_tag of lower_link is same as vid, then there
-            # is no need to set vid
-            cmd = ['/usr/sbin/dladm', 'show-linkprop', '-co', 'value',
-                   '-p', 'default_tag', lower_link]
-            stdout = utils.execute(cmd)
-            default_tag = stdout.splitlines()[0].strip()
-            if default_tag == vid or (vid == '1' and default_tag == '0'):
-                vid = '0'
-        else:
-            vid = '0'
-        
-        cmd = ['/usr/sbin/dladm', 'create-vnic', '-l' ]
+    @classmethod
+    def get_lower_link(cls, dlname):
+        """Look up the LowerLink of dlname with a single dladm call.
+
+        :returns: the LowerLink, or None if the link could not be looked
+                  up.
+        """
+        cmd = ['/usr/sbin/dladm', 'show-linkprop', '-c', '-o',
+               'property,value', '-p', ','.join(LowerLink._fields[1:]),
+               dlname]
+        try:
+            stdout = cls.execute(cmd, log_fail_as_error=False)
+        except Exception as e:
+            LOG.debug("Failed to look up lower link %(link)s: %(err)s",
+                      {'link': dlname, 'err': e})
+            return None
+        props = dict.fromkeys(LowerLink._fields[1:], '')
+        for prop in parsers.iter_parseable(stdout, 'property,value'):
+            if prop.property in props:
+                props[prop.property] = prop.value
+        return LowerLink(dlname, **props)
+
+    @classmethod
+    def _default_tag(cls, lower_link):
+        descriptor = cls.lower_links.get(lower_link)
+        if descriptor is None:
+            return cls.show_prop(lower_link, 'default_tag')
+        return descriptor.default_tag
+
+    @staticmethod
+    def _vnic_vid(vid, default_tag):
+        # If the default_tag of lower_link is same as vid, then there
+        # is no need to set vid
+        if not vid or default_tag == vid or (vid == '1' and
+                                             default_tag == '0'):
+            return '0'
+        return vid
+
+    @staticmethod
+    def _create_vnic_cmd(dlname, lower_link, mac_address, vid, temp,
+                         props=None):
+        cmd = ['/usr/sbin/dladm', 'create-vnic', '-l', lower_link]
         if mac_address:
             cmd.extend(['-m', mac_address])
         if vid != '0':
             cmd.extend(['-v', vid])
+        if props:
+            cmd.extend(['-p', ','.join('%s=%s' % (pname, props[pname])
+                                       for pname in sorted(props))])
         if temp:
             cmd.append('-t')
-        cmd.append(self._dlname)    
+        cmd.append(dlname)
+        return cmd
 
-        self.execute_with_pfexec(cmd)
+    def create_vnic(self, lower_link, mac_address=None, vid=None, temp=False):
+        if self.datalink_exists(self._dlname, refresh=True):
+            return
+
+        default_tag = self._default_tag(lower_link) if vid else None
+        cmd = self._create_vnic_cmd(self._dlname, lower_link, mac_address,
+                                    self._vnic_vid(vid, default_tag), temp)
+        try:
+            self.execute_with_pfexec(cmd)
+        finally:
+            self.link_cache.invalidate(self._dlname)
 
     @classmethod
-    def get_prop(cls, dlname, pname):
+    def create_vnics(cls, specs, temp=False, workers=8, rollback=False):
+        """Create many VNICs at once.
+
+        The existing links are listed once and the default_tag of every
+        lower link is looked up once, then up to workers create-vnic
+        commands are run at the same time.
+
+        :param specs: list of VNICSpec.
+        :param rollback: if any VNIC fails to be created, delete the ones
+                         created by this call.
+        :returns: list of VNICResult, in the order of specs.
+        """
+        specs = list(specs)
+        existing = set(cls.show_link())
+        default_tags = {}
+        for spec in specs:
+            if spec.vid and spec.lower_link not in default_tags:
+                try:
+                    default_tags[spec.lower_link] = cls._default_tag(
+                        spec.lower_link)
+                except Exception:
+                    default_tags[spec.lower_link] = ''
+
+        results = [None] * len(specs)
+        pending = []
+        seen = set()
+        for i, spec in enumerate(specs):
+            if spec.name in seen:
+                results[i] = VNICResult(
+                    spec.name, VNICResult.FAILED,
+                    ValueError("VNIC %s is given twice" % spec.name))
+            elif spec.name in existing:
+                results[i] = VNICResult(spec.name, VNICResult.EXISTS, None)
+            else:
+                pending.append((i, spec))
+            seen.add(spec.name)
+
+        def _create(item):
+            i, spec = item
+            props = dict(spec.props or {})
+            if spec.mtu:
+                props['mtu'] = spec.mtu
+            cmd = cls._create_vnic_cmd(
+                spec.name, spec.lower_link, spec.mac,
+                cls._vnic_vid(spec.vid, default_tags.get(spec.lower_link)),
+                temp, props)
+            try:
+                cls.execute_with_pfexec(cmd)
+            except Exception as e:
+                LOG.error("Failed to create VNIC %(name)s: %(err)s",
+                          {'name': spec.name, 'err': e})
+                return i, VNICResult(spec.name, VNICResult.FAILED, e)
+            finally:
+                cls.link_cache.invalidate(spec.name)
+            return i, VNICResult(spec.name, VNICResult.CREATED, None)
+
+        pool = eventlet.GreenPool(workers)
+        for i, result in pool.imap(_create, pending):
+            results[i] = result
+
+        if rollback and any(not result.ok for result in results):
+            created = [i for i, result in enumerate(results)
+                       if result.status == VNICResult.CREATED]
+            for i, deleted in zip(created, pool.imap(
+                    cls._delete_vnic, [results[i].name for i in created])):
+                if deleted.status == VNICResult.DELETED:
+                    results[i] = VNICResult(results[i].name,
+                                            VNICResult.ROLLED_BACK, None)
+        return results
+
+    @classmethod
+    def _delete_vnic(cls, dlname):
+        cmd = ['/usr/sbin/dladm', 'delete-vnic', dlname]
         try:
-            cmd = ['/usr/sbin/dladm', 'show-linkprop', '-co', 'value',
-                   '-p', pname, dlname]
-            stdout = utils.execute(cmd)
-            output = stdout.splitlines()[0].strip()
+            cls.execute_with_pfexec(cmd)
+        except Exception as e:
+            LOG.error("Failed to delete VNIC %(name)s: %(err)s",
+                      {'name': dlname, 'err': e})
+            return VNICResult(dlname, VNICResult.FAILED, e)
+        finally:
+            cls.link_cache.invalidate(dlname)
+        return VNICResult(dlname, VNICResult.DELETED, None)
+
+    @classmethod
+    def delete_vnics(cls, names, workers=8):
+        """Delete many VNICs at once.
+
+        The existing links are listed once, then up to workers
+        delete-vnic commands are run at the same time.
+
+        :returns: list of VNICResult, in the order of names.
+        """
+        names = list(names)
+        existing = set(cls.show_link())
+        to_delete = [name for name in collections.OrderedDict.fromkeys(names)
+                     if name in existing]
+        pool = eventlet.GreenPool(workers)
+        deleted = dict(zip(to_delete, pool.imap(cls._delete_vnic,
+                                                to_delete)))
+        return [deleted.get(name) or
+                VNICResult(name, VNICResult.ABSENT, None) for name in names]
+
+    @classmethod
+    def get_prop(cls, dlname, pname, refresh=False):
+        try:
+            return cls.show_prop(dlname, pname, refresh=refresh)
         except Exception:
             return ""
-        return output
 
     def set_prop(self, pname, pvalue, temp=False):
         cmd = ['/usr/sbin/dladm', 'set-linkprop', '-p', '%s=%s'
                % (pname, pvalue), self._dlname]
         if temp:
             cmd.insert(2, '-t')
-        self.execute_with_pfexec(cmd)
+        try:
+            self.execute_with_pfexec(cmd)
+        finally:
+            self.link_cache.invalidate(self._dlname)
+            self.lower_links.invalidate(self._dlname)
+
+    def modify_vnic(self, mac_address, temp=False):
+        """Change the MAC address of the VNIC, 'random' picks a new one."""
+        cmd = ['/usr/sbin/dladm', 'modify-vnic', '-m', mac_address,
+               self._dlname]
+        if temp:
+            cmd.insert(2, '-t')
+        try:
+            self.execute_with_pfexec(cmd)
+        finally:
+            self.link_cache.invalidate(self._dlname)
+
+    def rename_link(self, new_dlname):
+        cmd = ['/usr/sbin/dladm', 'rename-link', self._dlname, new_dlname]
+        try:
+            self.execute_with_pfexec(cmd)
+        finally:
+            self.link_cache.invalidate(self._dlname)
+            self.link_cache.invalidate(new_dlname)
+        self._dlname = new_dlname
 
     def delete_vnic(self):
-        if not self.datalink_exists(self._dlname):
+        if not self.datalink_exists(self._dlname, refresh=True):
             return
 
         cmd = ['/usr/sbin/dladm', 'delete-vnic', self._dlname]
-        self.execute_with_pfexec(cmd)
+        try:
+            self.execute_with_pfexec(cmd)
+        finally:
+            self.link_cache.invalidate(self._dlname)
 
     @classmethod
     def show_link(cls):
         cmd = ['/usr/sbin/dladm', 'show-link', '-po', 'link']
-        stdout = utils.execute(cmd)
+        stdout = cls.execute(cmd)
 
-        return stdout.splitlines()
+        return [link.link for link in parsers.iter_parseable(stdout, 'link')]
 
     @classmethod
     def get_vnic_names(cls):
         cmd = ['/usr/sbin/dladm', 'show-vnic', '-po', 'link']
-        stdout = utils.execute(cmd)
+        stdout = cls.execute(cmd)
+
+        return [link.link for link in parsers.iter_parseable(stdout, 'link')]
+
+    @classmethod
+    def get_link_states(cls):
+        cmd = ['/usr/sbin/dladm', 'show-link', '-po', 'link,state']
+        stdout = cls.execute(cmd)
+
+        return dict(parsers.iter_parseable(stdout, 'link,state'))
+
+    @classmethod
+    def get_vnic(cls, dlname):
+        """Return the VNIC named dlname, or None if there is none."""
+        cmd = ['/usr/sbin/dladm', 'show-vnic', '-po',
+               'link,macaddress,vid,over', dlname]
+        try:
+            stdout = cls.execute(cmd, log_fail_as_error=False)
+        except exceptions.ProcessExecutionError:
+            return None
+        for vnic in parsers.iter_parseable(stdout,
+                                           'link,macaddress,vid,over'):
+            return VNIC(vnic.link, normalize_mac(vnic.macaddress), vnic.vid,
+                        vnic.over, None)
+        return None
+
+    @classmethod
+    def get_link_crtimes(cls):
+        """Return a {link: creation time} dict of all the links.
+
+        dladm(1M) does not report when a link was created, but the kstats
+        of a link are created along with it. Their crtime tells a link
+        apart from one deleted and created again with the same name, lower
+        link, VLAN ID and MAC address.
+        """
+        cmd = ['/usr/bin/kstat', '-p', '-m', 'link', '-s', 'crtime']
+        stdout = cls.execute(cmd, log_fail_as_error=False)
+        return dict((kstat.name, kstat.value)
+                    for kstat in parsers.iter_kstat(stdout))
+
+    @classmethod
+    def get_vnic_inventory(cls, with_state=False):
+        """Return a VNICInventory snapshot of all the VNICs on the host.
+
+        Name, MAC address, VLAN ID and lower link of every VNIC come from
+        a single dladm show-vnic call. dladm show-vnic does not report the
+        link state, so if with_state is set one more dladm show-link call
+        is made for all the links at once.
+        """
+        cmd = ['/usr/sbin/dladm', 'show-vnic', '-po',
+               'link,macaddress,vid,over']
+        stdout = cls.execute(cmd)
 
-        return stdout.splitlines()
+        states = cls.get_link_states() if with_state else {}
+        vnics = []
+        for vnic in parsers.iter_parseable(stdout,
+                                           'link,macaddress,vid,over'):
+            vnics.append(VNIC(vnic.link, normalize_mac(vnic.macaddress),
+                              vnic.vid, vnic.over, states.get(vnic.link)))
+            cls.link_cache.set(vnic.link, 'exists', True)
+        return VNICInventory(vnics)
 
 
 def _arping(iface_name, address, count):
@@ -264,7 +1171,7 @@ def _arping(iface_name, address, count):
     arping_cmd = ['/usr/sbin/arping', '-A', '-I', iface_name, '-c', count,
                   '-w', 2 * count, address]
     try:
-        utils.execute(arping_cmd, check_exit_code=False)
+        CommandBase.execute(arping_cmd, check_exit_code=False)
     except Exception:
         msg = _("Failed sending gratuitous ARP to %(addr)s on "
                   "an interface %(iface)s")
@@ -288,4 +1195,29 @@ def send_ip_addr_adv_notif(iface_name, address, config):
         _arping(iface_name, address, count)
 
     if count > 0 and netaddr.IPAddress(address).version == 4:
-        eventlet.spawn_n(arping)
+        engine = get_garp_engine()
+        if engine is not None:
+            engine.announce(iface_name, address, count)
+        else:
+            eventlet.spawn_n(arping)
+
+
+_GARP_ENGINE = None
+
+
+def get_garp_engine():
+    """Return the gratuitous ARP engine of the process.
+
+    None is returned when the host has no raw frame transport, arping is
+    then forked for every address. It is forked as well for the addresses
+    the transport fails to send.
+    """
+    global _GARP_ENGINE
+    if _GARP_ENGINE is None:
+        transport = garp.default_transport()
+        # False remembers that there is no transport
+        _GARP_ENGINE = transport and garp.GarpEngine(
+            transport, lambda ifname: Datalink.get_mac(ifname),
+            fallback=_arping)
+        _GARP_ENGINE = _GARP_ENGINE or False
+    return _GARP_ENGINE or None
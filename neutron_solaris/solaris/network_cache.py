@@ -0,0 +1,100 @@
+# Copyright 2021, Guillermo Adrian Molina.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Cache of the network and subnet objects looked up by interface drivers.
+
+Looking up a network costs a REST round trip, and the drivers look up the
+same networks again for every port plugged on them. The NetworkCache keeps
+the networks and subnets it loaded for ttl seconds in a ResourceCache, so
+that resource_cache.invalidate_network() and
+resource_cache.handle_notification() drop them along with the copies the
+other users of the Neutron API cached. A network is loaded with
+show_network and its subnets with a single list_subnets call filtered by
+the network, the rest of the cloud is never listed. The API calls are made
+without holding the lock, so lookups of other networks are not held up by
+a slow one.
+"""
+
+import time
+
+from oslo_log import log as logging
+
+from neutron_solaris.common import resource_cache
+
+LOG = logging.getLogger(__name__)
+
+NETWORK = resource_cache.NETWORK
+SUBNET = resource_cache.SUBNET
+
+
+class NetworkCache(object):
+    """Caches the networks and subnets of the Neutron API.
+
+    :param client_getter: callable returning the neutronclient Client.
+    :param ttl: seconds the objects are served from the cache for, 0
+                disables the cache.
+    :param max_size: number of objects kept at most.
+    """
+
+    def __init__(self, client_getter, ttl=60, max_size=1000,
+                 clock=time.time):
+        self._client_getter = client_getter
+        self.ttl = ttl
+        self._cache = resource_cache.ResourceCache(
+            {NETWORK: ttl, SUBNET: ttl}, max_size=max_size, clock=clock)
+
+    def _load_network(self, network_id):
+        client = self._client_getter()
+        network = client.show_network(network_id)[NETWORK]
+        subnets = client.list_subnets(network_id=network_id)['subnets']
+        LOG.debug("Loaded network %(network)s and its %(count)d subnets",
+                  {'network': network_id, 'count': len(subnets)})
+        return ([(NETWORK, network)] +
+                [(SUBNET, subnet) for subnet in subnets])
+
+    def _load_subnet(self, subnet_id):
+        client = self._client_getter()
+        return [(SUBNET, client.show_subnet(subnet_id)[SUBNET])]
+
+    def _get(self, kind, obj_id, loader):
+        cache = self._cache
+        if not cache.caches(kind):
+            client = self._client_getter()
+            return getattr(client, 'show_%s' % kind)(obj_id)[kind]
+        # what is loaded after an invalidation is not cached
+        generation = cache.generation
+        obj = cache.get(kind, obj_id)
+        if obj is not resource_cache.MISSING:
+            return obj
+        objects = loader(obj_id)
+        for loaded_kind, loaded in objects:
+            cache.set(loaded_kind, loaded['id'], loaded, generation)
+        return objects[0][1]
+
+    def get_network(self, network_id):
+        """Return the network dict, as returned by show_network."""
+        return self._get(NETWORK, network_id, self._load_network)
+
+    def get_subnet(self, subnet_id):
+        """Return the subnet dict, as returned by show_subnet."""
+        return self._get(SUBNET, subnet_id, self._load_subnet)
+
+    def invalidate(self, kind=None, obj_id=None):
+        """Drop obj_id, all the objects of kind, or everything."""
+        self._cache.invalidate(kind, obj_id)
+
+    def invalidate_network(self, network_id):
+        """Drop a network and its subnets, e.g. when it is updated."""
+        self._cache.invalidate_network(network_id)
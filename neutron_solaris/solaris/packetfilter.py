@@ -15,12 +15,14 @@
 
 from oslo_log import log as logging
 
-from neutron.agent.linux import utils
+from neutron_solaris.common import tracing
+from neutron_solaris.solaris import net_lib
+from neutron_solaris.solaris import parsers
 
 LOG = logging.getLogger(__name__)
 
 
-class PacketFilter(object):
+class PacketFilter(net_lib.CommandBase):
     '''Wrapper around Solaris pfctl(1M) command'''
 
     def __init__(self, anchor_name, layer2=False):
@@ -43,7 +45,7 @@ class PacketFilter(object):
         self.layer2 = layer2
 
     def _build_pfctl_cmd(self, options):
-        cmd = ['/usr/bin/pfexec', '/usr/sbin/pfctl']
+        cmd = ['/usr/sbin/pfctl']
         if self.layer2:
             cmd.append('-2')
         cmd.extend(options)
@@ -55,6 +57,7 @@ class PacketFilter(object):
 
         return self.root_anchor_path
 
+    @tracing.traced('pf.add_nested_anchor_rule')
     def add_nested_anchor_rule(self, parent_anchor, child_anchor,
                                anchor_option=None):
         """Adds an anchor rule that evaluates nested anchors.
@@ -80,8 +83,9 @@ class PacketFilter(object):
         existing_anchor_rules.append(anchor_rule)
         process_input = '%s\n' % '\n'.join(sorted(existing_anchor_rules))
         cmd = self._build_pfctl_cmd(['-a', anchor_path, '-f', '-'])
-        utils.execute(cmd, process_input=process_input)
+        self.execute_with_pfexec(cmd, process_input=process_input)
 
+    @tracing.traced('pf.remove_nested_anchor_rule')
     def remove_nested_anchor_rule(self, parent_anchor, child_anchor):
         """ Removes an anchor rule that evaluates nested anchors.
 
@@ -101,56 +105,63 @@ class PacketFilter(object):
         existing_anchor_rules.remove(rule)
         process_input = '%s\n' % '\n'.join(existing_anchor_rules)
         cmd = self._build_pfctl_cmd(['-a', anchor_path, '-f', '-'])
-        utils.execute(cmd, process_input=process_input)
+        self.execute_with_pfexec(cmd, process_input=process_input)
 
+    @tracing.traced('pf.list_anchor_rules')
     def list_anchor_rules(self, subanchors=None):
         anchor_path = self.get_anchor_path(subanchors)
         cmd = self._build_pfctl_cmd(['-a', anchor_path, '-sr'])
         try:
-            stdout = utils.execute(cmd)
+            stdout = self.execute_with_pfexec(cmd)
         except:
             return []
-        return stdout.strip().splitlines()
+        return list(parsers.iter_pfctl(stdout))
 
+    @tracing.traced('pf.list_anchors')
     def list_anchors(self, subanchors=None):
         anchor_path = self.get_anchor_path(subanchors)
         cmd = self._build_pfctl_cmd(['-a', anchor_path, '-sA'])
         try:
-            stdout = utils.execute(cmd)
+            stdout = self.execute_with_pfexec(cmd)
         except:
             return []
-        return stdout.strip().splitlines()
+        return list(parsers.iter_pfctl(stdout))
 
+    @tracing.traced('pf.add_table')
     def add_table(self, name, subanchors=None):
         anchor_path = self.get_anchor_path(subanchors)
         cmd = self._build_pfctl_cmd(['-a', anchor_path, '-t', name,
                                      '-T', 'add'])
-        utils.execute(cmd)
+        self.execute_with_pfexec(cmd)
 
+    @tracing.traced('pf.add_table_entry')
     def add_table_entry(self, name, cidrs, subanchors=None):
         anchor_path = self.get_anchor_path(subanchors)
         cmd = self._build_pfctl_cmd(['-a', anchor_path, '-t', name,
                                      '-T', 'add'])
         cmd.extend(cidrs)
-        utils.execute(cmd)
+        self.execute_with_pfexec(cmd)
 
+    @tracing.traced('pf.replace_table_entry')
     def replace_table_entry(self, name, cidrs, subanchors=None):
         anchor_path = self.get_anchor_path(subanchors)
         cmd = self._build_pfctl_cmd(['-a', anchor_path, '-t', name,
                                      '-T', 'replace'])
         cmd.extend(cidrs)
-        utils.execute(cmd)
+        self.execute_with_pfexec(cmd)
 
+    @tracing.traced('pf.table_exists')
     def table_exists(self, name, subanchors=None):
         anchor_path = self.get_anchor_path(subanchors)
         try:
             cmd = self._build_pfctl_cmd(['-a', anchor_path, '-t', name,
                                          '-T', 'show'])
-            utils.execute(cmd)
+            self.execute_with_pfexec(cmd)
         except:
             return False
         return True
 
+    @tracing.traced('pf.remove_table')
     def remove_table(self, name, subanchors=None):
         if not self.table_exists(name, subanchors):
             LOG.debug(_('Table %s does not exist hence returning without '
@@ -159,8 +170,9 @@ class PacketFilter(object):
         anchor_path = self.get_anchor_path(subanchors)
         cmd = self._build_pfctl_cmd(['-a', anchor_path, '-t', name,
                                      '-T', 'delete'])
-        utils.execute(cmd)
+        self.execute_with_pfexec(cmd)
 
+    @tracing.traced('pf.remove_table_entry')
     def remove_table_entry(self, name, cidrs, subanchors=None):
         if not self.table_exists(name, subanchors):
             LOG.debug(_('Table %s does not exist hence returning without '
@@ -170,23 +182,16 @@ class PacketFilter(object):
         cmd = self._build_pfctl_cmd(['-a', anchor_path, '-t', name,
                                      '-T', 'delete'])
         cmd.extend(cidrs)
-        utils.execute(cmd)
+        self.execute_with_pfexec(cmd)
 
+    @tracing.traced('pf.add_rules')
     def add_rules(self, rules, subanchors=None):
         anchor_path = self.get_anchor_path(subanchors)
         process_input = '\n'.join(rules) + '\n'
         cmd = self._build_pfctl_cmd(['-a', anchor_path, '-f', '-'])
-        utils.execute(cmd, process_input=process_input)
-
-    def _get_rule_label(self, rule):
-        if 'label' not in rule:
-            return None
-        keywords = rule.split(' ')
-        for i, keyword in enumerate(keywords):
-            if keyword == 'label':
-                break
-        return keywords[i + 1].strip('"')
+        self.execute_with_pfexec(cmd, process_input=process_input)
 
+    @tracing.traced('pf.remove_anchor')
     def remove_anchor(self, subanchors=None):
         anchor_path = self.get_anchor_path(subanchors)
 
@@ -194,27 +199,23 @@ class PacketFilter(object):
         # after removing the rules
         cmd = self._build_pfctl_cmd(['-a', anchor_path, '-sr'])
         try:
-            stdout = utils.execute(cmd)
+            stdout = self.execute_with_pfexec(cmd)
         except:
             # rules doesn't exist
             return
-        rules = stdout.strip().splitlines()
+        rules = list(parsers.iter_pfctl_rules(stdout))
         if not rules:
             return
-        labels = []
-        for rule in rules:
-            label = self._get_rule_label(rule.strip())
-            if label:
-                labels.append(label)
+        labels = [rule.label for rule in rules if rule.label]
 
         # delete the rules and tables
         cmd = self._build_pfctl_cmd(['-a', anchor_path, '-F', 'all'])
-        utils.execute(cmd)
+        self.execute_with_pfexec(cmd)
 
         # clear the state
         for label in labels:
             cmd = self._build_pfctl_cmd(['-k', 'label', '-k', label])
-            utils.execute(cmd)
+            self.execute_with_pfexec(cmd)
 
     def _get_relative_nested_anchors(self, anchorname):
         # anchor name always come with absolute path, so we need to
@@ -225,23 +226,21 @@ class PacketFilter(object):
                 subanchors.remove(anchor)
         return subanchors
 
+    @tracing.traced('pf.remove_anchor_recursively')
     def remove_anchor_recursively(self, subanchors=None, recurse_ctxt=False):
         anchor_path = self.get_anchor_path(subanchors)
         cmd = self._build_pfctl_cmd(['-a', anchor_path, '-sA'])
         try:
-            stdout = utils.execute(cmd)
+            stdout = self.execute_with_pfexec(cmd)
         except:
             # anchors doesn't exist
             stdout = ''
-        nested_anchors = stdout.strip().splitlines()
+        nested_anchors = list(parsers.iter_pfctl(stdout))
         if recurse_ctxt and not nested_anchors:
             return
 
         # we have nested anchors to remove so make recursive calls
         for nested_anchor in nested_anchors:
-            nested_anchor = nested_anchor.strip()
-            if not nested_anchor:
-                continue
             anchor_list = self._get_relative_nested_anchors(nested_anchor)
             self.remove_anchor_recursively(anchor_list, True)
             self.remove_anchor(anchor_list)
@@ -0,0 +1,161 @@
+# Copyright 2021, Guillermo Adrian Molina.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Parsers for the output of the Solaris networking commands.
+
+dladm(1M) and ipadm(1M) print one record per line in parseable (-p) mode.
+With more than one -o field, the fields are separated by ':' and any
+literal ':' or '\\' within a field is escaped with a '\\'. A single field
+is printed as is. pfctl(1M) -s listings print one rule, anchor or table
+entry per line, indented with blanks. kstat(1M) -p prints one
+module:instance:name:statistic and its value, separated by a tab, per line.
+
+The parsers take either the whole output or an iterable of lines, like the
+stdout of a running process, and yield the records one at a time.
+"""
+
+import collections
+import io
+
+from oslo_log import log as logging
+
+LOG = logging.getLogger(__name__)
+
+
+def iter_lines(output):
+    """Yield the non blank lines of output, without line terminators.
+
+    :param output: a string, or an iterable of lines such as a file.
+    """
+    if isinstance(output, str):
+        output = io.StringIO(output)
+    for line in output:
+        line = line.rstrip('\r\n')
+        if line.strip():
+            yield line
+
+
+def split_parseable(line):
+    """Split one line of dladm(1M)/ipadm(1M) parseable output into fields.
+
+    MAC addresses, for instance, show up as 2\\:8\\:20\\:d2\\:1c\\:3e.
+    """
+    if '\\' not in line:
+        return line.split(':')
+    fields = []
+    field = []
+    escaped = False
+    for char in line:
+        if escaped:
+            field.append(char)
+            escaped = False
+        elif char == '\\':
+            escaped = True
+        elif char == ':':
+            fields.append(''.join(field))
+            field = []
+        else:
+            field.append(char)
+    fields.append(''.join(field))
+    return fields
+
+
+_RECORDS = {}
+
+
+def record_type(fields):
+    """Return the namedtuple type of the records with the -o fields.
+
+    :param fields: the fields, as passed to -o, e.g. 'link,state'.
+    """
+    record = _RECORDS.get(fields)
+    if record is None:
+        record = _RECORDS[fields] = collections.namedtuple(
+            'Record', fields.replace('-', '_').split(','))
+    return record
+
+
+def iter_parseable(output, fields):
+    """Yield the records of dladm(1M)/ipadm(1M) -p output.
+
+    Lines that do not have as many fields as expected are skipped.
+
+    :param output: the output, or an iterable of its lines.
+    :param fields: the -o fields, e.g. 'link,state', or a namedtuple type
+                   with the fields in the same order.
+    :returns: an iterator of namedtuples.
+    """
+    record = record_type(fields) if isinstance(fields, str) else fields
+    count = len(record._fields)
+    if count == 1:
+        for line in iter_lines(output):
+            yield record(line)
+        return
+    make = record._make
+    for line in iter_lines(output):
+        values = split_parseable(line)
+        if len(values) != count:
+            LOG.debug("Skipping unexpected parseable output line %s", line)
+            continue
+        yield make(values)
+
+
+class PfRule(collections.namedtuple('PfRule', ['rule', 'label'])):
+    """A rule of a pfctl(1M) -s rules listing, and its label if any."""
+
+    __slots__ = ()
+
+
+def rule_label(rule):
+    """Return the label of a pf rule, or None."""
+    if 'label' not in rule:
+        return None
+    keywords = rule.split(' ')
+    for i, keyword in enumerate(keywords[:-1]):
+        if keyword == 'label':
+            return keywords[i + 1].strip('"')
+    return None
+
+
+def iter_pfctl(output):
+    """Yield the entries of a pfctl(1M) -s listing, e.g. -sA or -T show."""
+    for line in iter_lines(output):
+        yield line.strip()
+
+
+def iter_pfctl_rules(output):
+    """Yield a PfRule for every rule of a pfctl(1M) -s rules listing."""
+    for rule in iter_pfctl(output):
+        yield PfRule(rule, rule_label(rule))
+
+
+class KstatValue(collections.namedtuple('KstatValue',
+                                        ['module', 'instance', 'name',
+                                         'statistic', 'value'])):
+    """A statistic of a kstat(1M) -p listing."""
+
+    __slots__ = ()
+
+
+def iter_kstat(output):
+    """Yield a KstatValue for every statistic of a kstat(1M) -p listing."""
+    for line in iter_lines(output):
+        key, sep, value = line.partition('\t')
+        fields = key.split(':')
+        if not sep or len(fields) != 4:
+            LOG.debug("Skipping unexpected kstat output line %s", line)
+            continue
+        yield KstatValue(fields[0], fields[1], fields[2], fields[3],
+                         value.strip())
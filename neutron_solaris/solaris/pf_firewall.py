@@ -29,6 +29,8 @@ from neutron.agent import firewall
 from neutron.common import constants
 from neutron.common import utils as c_utils
 
+from neutron_solaris.common import tracing
+from neutron_solaris.solaris import agent_setup
 from neutron_solaris.solaris import packetfilter
 
 
@@ -59,6 +61,7 @@ class PFFirewallDriver(firewall.FirewallDriver):
     """
 
     def __init__(self):
+        agent_setup.setup()
         self.pf = packetfilter.PacketFilter("_auto/neutron:ovs:agent",
                                             layer2=True)
         # List of port which has security group
@@ -120,6 +123,7 @@ class PFFirewallDriver(firewall.FirewallDriver):
         self.label_num += 1
         return self.label_num
 
+    @tracing.traced('firewall.remove_rules')
     def _remove_rule_port_sec(self, port):
         device_name = self.portid_to_devname.pop(port['id'], None)
         if not device_name:
@@ -149,6 +153,7 @@ class PFFirewallDriver(firewall.FirewallDriver):
         else:
             self.pf.remove_anchor_recursively([instance_name])
 
+    @tracing.traced('firewall.setup_pf_rules')
     def _setup_pf_rules(self, port, update=False):
         if not firewall.port_sec_enabled(port):
             self.unfiltered_ports[port['device']] = port
@@ -320,6 +325,7 @@ class PFFirewallDriver(firewall.FirewallDriver):
                              (DIRECTION_PF_PARAM[direction], device_name,
                               self._get_label_number()))
 
+    @tracing.traced('firewall.add_rules_by_security_group')
     def _add_rules_by_security_group(self, port, direction):
         LOG.debug("Adding rules for Port: %s", port)
 
@@ -0,0 +1,244 @@
+# Copyright 2021, Guillermo Adrian Molina.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Long running helper executing privileged commands on behalf of an agent.
+
+Running every privileged command with pfexec(1) costs a fork/exec of
+pfexec and a profile check on top of the command itself. Instead, the
+agent starts this module once under pfexec and sends it the commands to
+run over a pipe, one JSON object per line:
+
+    request: {"id": 1, "cmd": ["/usr/sbin/dladm", ...], "input": null}
+    reply:   {"id": 1, "returncode": 0, "stdout": "...", "stderr": ""}
+    error:   {"id": 1, "error": "..."}
+
+Requests are run concurrently and replies may come back in any order, so
+a client can pipeline several commands. Only the binaries given with
+--allow may be run.
+"""
+
+import argparse
+import concurrent.futures
+import itertools
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import eventlet
+from eventlet import event
+from eventlet.green import subprocess as green_subprocess
+from eventlet import semaphore
+from oslo_log import log as logging
+
+LOG = logging.getLogger(__name__)
+
+PFEXEC = '/usr/bin/pfexec'
+DEFAULT_ALLOWED_COMMANDS = ('/usr/sbin/dladm', '/usr/sbin/ipadm',
+                            '/usr/sbin/pfctl', '/usr/sbin/route',
+                            '/usr/sbin/ndp', '/usr/sbin/arp')
+
+
+class DaemonUnavailable(Exception):
+    """The daemon is not running and could not be started."""
+
+
+class DaemonError(Exception):
+    """The daemon refused or failed to run a command."""
+
+
+def _run(request, allowed):
+    cmd = request.get('cmd')
+    if (not isinstance(cmd, list) or not cmd or
+            not all(isinstance(arg, str) for arg in cmd)):
+        return {'error': 'Malformed command'}
+    if cmd[0] not in allowed:
+        return {'error': 'Command %s is not allowed' % cmd[0]}
+    try:
+        proc = subprocess.run(cmd, input=request.get('input'),
+                              stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                              universal_newlines=True, close_fds=True)
+    except OSError as e:
+        return {'error': str(e)}
+    return {'returncode': proc.returncode, 'stdout': proc.stdout,
+            'stderr': proc.stderr}
+
+
+def serve(infile, outfile, allowed, workers=4):
+    """Run the requests read from infile until it is closed."""
+    allowed = frozenset(allowed)
+    write_lock = threading.Lock()
+
+    def _handle(request):
+        reply = _run(request, allowed)
+        reply['id'] = request.get('id')
+        with write_lock:
+            outfile.write(json.dumps(reply) + '\n')
+            outfile.flush()
+
+    with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+        for line in infile:
+            try:
+                request = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(request, dict):
+                executor.submit(_handle, request)
+
+
+class PfexecDaemonClient(object):
+    """Client side of the daemon, used by net_lib.CommandBase.
+
+    The daemon is started on first use. If it can not be started, or dies,
+    DaemonUnavailable is raised and no new start is attempted for
+    retry_interval seconds, so that callers fall back to running the
+    commands directly meanwhile.
+
+    :param allowed_commands: binaries the daemon may run.
+    :param workers: commands the daemon runs at the same time.
+    :param use_pfexec: start the daemon with pfexec(1). Disable it to run
+                       unprivileged commands, e.g. in benchmarks.
+    """
+
+    def __init__(self, allowed_commands=DEFAULT_ALLOWED_COMMANDS, workers=4,
+                 use_pfexec=True, retry_interval=60):
+        self.allowed_commands = frozenset(allowed_commands)
+        self._workers = workers
+        self._use_pfexec = use_pfexec
+        self._retry_interval = retry_interval
+        self._ids = itertools.count(1)
+        self._waiters = {}
+        self._write_lock = semaphore.Semaphore()
+        self._start_lock = semaphore.Semaphore()
+        self._process = None
+        self._reader = None
+        self._failed_at = None
+
+    def allows(self, cmd):
+        return bool(cmd) and cmd[0] in self.allowed_commands
+
+    def _daemon_cmd(self):
+        cmd = [sys.executable, '-m', __name__,
+               '--workers', str(self._workers)]
+        for command in sorted(self.allowed_commands):
+            cmd.extend(['--allow', command])
+        if self._use_pfexec:
+            cmd.insert(0, PFEXEC)
+        return cmd
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._process is not None:
+                return
+            if (self._failed_at is not None and
+                    time.time() - self._failed_at < self._retry_interval):
+                raise DaemonUnavailable()
+            try:
+                self._process = green_subprocess.Popen(
+                    self._daemon_cmd(), stdin=subprocess.PIPE,
+                    stdout=subprocess.PIPE, universal_newlines=True,
+                    close_fds=True)
+            except OSError as e:
+                self._failed_at = time.time()
+                LOG.warning("Failed to start the pfexec daemon: %s", e)
+                raise DaemonUnavailable()
+            self._failed_at = None
+            self._reader = eventlet.spawn(self._read_replies, self._process)
+            LOG.info("Started the pfexec daemon with pid %s",
+                     self._process.pid)
+
+    def _read_replies(self, process):
+        for line in process.stdout:
+            try:
+                reply = json.loads(line)
+            except ValueError:
+                LOG.warning("Malformed reply from the pfexec daemon: %s",
+                            line)
+                continue
+            waiter = self._waiters.pop(reply.get('id'), None)
+            if waiter is not None:
+                waiter.send(reply)
+        self._daemon_died(process)
+
+    def _daemon_died(self, process):
+        if self._process is process:
+            LOG.warning("The pfexec daemon exited")
+            self._process = None
+            self._failed_at = time.time()
+        waiters, self._waiters = self._waiters, {}
+        # the commands in flight may or may not have been run
+        for waiter in waiters.values():
+            waiter.send_exception(DaemonError("pfexec daemon exited"))
+
+    def execute(self, cmd, process_input=None):
+        """Run cmd in the daemon.
+
+        :returns: tuple of the standard output, standard error and exit
+                  code of the command.
+        :raises: DaemonUnavailable if the daemon could not be used, in
+                 which case the command was not run, or DaemonError if
+                 the daemon refused or failed to run it.
+        """
+        self._ensure_started()
+        process = self._process
+        request_id = next(self._ids)
+        waiter = event.Event()
+        self._waiters[request_id] = waiter
+        request = {'id': request_id, 'cmd': [str(arg) for arg in cmd],
+                   'input': process_input}
+        try:
+            with self._write_lock:
+                process.stdin.write(json.dumps(request) + '\n')
+                process.stdin.flush()
+        except (OSError, ValueError):
+            self._waiters.pop(request_id, None)
+            self._daemon_died(process)
+            raise DaemonUnavailable()
+
+        reply = waiter.wait()
+        if 'error' in reply:
+            raise DaemonError("pfexec daemon failed to run %s: %s" %
+                               (cmd, reply['error']))
+        return reply['stdout'], reply['stderr'], reply['returncode']
+
+    def stop(self):
+        process, self._process = self._process, None
+        if process is None:
+            return
+        try:
+            process.stdin.close()
+            process.wait()
+        except OSError:
+            pass
+        if self._reader is not None:
+            self._reader.kill()
+            self._reader = None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--allow', action='append', default=[],
+                        help='Absolute path of a binary that may be run.')
+    parser.add_argument('--workers', type=int, default=4,
+                        help='Commands run at the same time.')
+    args = parser.parse_args(argv)
+    allowed = [path for path in args.allow if os.path.isabs(path)]
+    serve(sys.stdin, sys.stdout, allowed, args.workers)
+
+
+if __name__ == '__main__':
+    main()
@@ -25,6 +25,8 @@ import six
 from neutron.agent.linux import utils
 from neutron.common import constants
 
+from neutron_solaris.solaris import net_lib
+
 
 LOG = logging.getLogger(__name__)
 
@@ -88,13 +90,13 @@ class NDPD(object):
     def _refresh_ndpd(self, ndpd_conf):
         cmd = ['/usr/sbin/svccfg', '-s', NDP_SMF_FMRI, 'setprop',
                'routing/config_file', '=', ndpd_conf]
-        utils.execute(cmd)
+        net_lib.CommandBase.execute(cmd)
         cmd = ['/usr/sbin/svccfg', '-s', NDP_SMF_FMRI, 'refresh']
-        utils.execute(cmd)
+        net_lib.CommandBase.execute(cmd)
         # ndpd SMF service doesn't support refresh method, so we
         # need to restart
         cmd = ['/usr/sbin/svcadm', 'restart', NDP_SMF_FMRI]
-        utils.execute(cmd)
+        net_lib.CommandBase.execute(cmd)
         LOG.debug(_("ndpd daemon has been refreshed to re-read the "
                     "configuration file"))
 
@@ -117,5 +119,5 @@ class NDPD(object):
     @property
     def enabled(self):
         cmd = ['/usr/bin/svcs', '-H', '-o', 'state', NDP_SMF_FMRI]
-        stdout = utils.execute(cmd)
+        stdout = net_lib.CommandBase.execute(cmd)
         return 'online' in stdout
@@ -0,0 +1,482 @@
+# Copyright 2021, Guillermo Adrian Molina.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""In-memory simulation of the Solaris dladm(1M) and ipadm(1M) commands.
+
+SolarisSimulator is a net_lib.CommandBackend keeping the datalinks and IP
+interfaces of a fake host in memory. It understands the verbs, options and
+parseable output formats net_lib uses, so the wrappers and the agents
+built on them can be exercised and benchmarked off Solaris:
+
+    sim = simulator.SolarisSimulator(default_latency=0.005)
+    sim.add_physical_link('net0')
+    sim.add_vnics(5000, 'net0')
+    net_lib.CommandBase.backend = sim
+
+Every command sleeps for its configured latency before being run, and the
+commands run are counted per verb in calls.
+"""
+
+import collections
+import getopt
+import itertools
+import os
+import time
+
+import netaddr
+
+from neutron_solaris.solaris import net_lib
+
+NOT_SUPPORTED = 127
+
+# getopt(3C) option strings of the simulated verbs
+_DLADM_OPTIONS = {
+    'show-link': 'po:',
+    'show-vnic': 'po:',
+    'show-linkprop': 'co:p:',
+    'set-linkprop': 'tp:',
+    'create-vnic': 'tl:m:v:p:',
+    'delete-vnic': 't',
+    'modify-vnic': 'tm:',
+    'rename-link': '',
+}
+_IPADM_OPTIONS = {
+    'show-if': 'po:',
+    'show-addr': 'po:',
+    'create-ip': 't',
+    'delete-ip': 't',
+    'create-addr': 'tT:a:',
+    'delete-addr': 'r',
+}
+# kstat(1M) has no subcommands
+_KSTAT_OPTIONS = 'pm:s:'
+_OPTIONS = {'dladm': _DLADM_OPTIONS, 'ipadm': _IPADM_OPTIONS,
+            'kstat': _KSTAT_OPTIONS}
+
+
+class CommandError(Exception):
+    def __init__(self, message, returncode=1):
+        super(CommandError, self).__init__(message)
+        self.returncode = returncode
+
+
+def _dladm_mac(mac):
+    # dladm(1M) prints MAC addresses without the leading zeros of octets
+    return ':'.join('%x' % int(octet, 16) for octet in mac.split(':'))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace(':', '\\:')
+
+
+def _format(rows, fields, parseable):
+    """Format rows (dicts) the way dladm/ipadm -p -o fields do."""
+    lines = []
+    for row in rows:
+        values = [row[field] for field in fields]
+        if parseable and len(fields) > 1:
+            lines.append(':'.join(_escape(value) for value in values))
+        else:
+            lines.append(' '.join(str(value) for value in values))
+    return ''.join(line + '\n' for line in lines)
+
+
+class SimulatedLink(object):
+    def __init__(self, name, link_class, mac, over=None, vid='0',
+                 temporary=False, props=None, crtime='0'):
+        self.name = name
+        # creation time of the kstats of the link
+        self.crtime = crtime
+        self.link_class = link_class
+        self.mac = mac
+        self.over = over
+        self.vid = vid
+        self.temporary = temporary
+        self.state = 'up'
+        self.props = {'mtu': '1500'}
+        self.props.update(props or {})
+
+    def get_prop(self, pname):
+        if pname == 'mac-address':
+            return _dladm_mac(self.mac)
+        if pname == 'state':
+            return self.state
+        if pname not in self.props:
+            raise CommandError("dladm: cannot get link property '%s' for "
+                               "%s: invalid link property" %
+                               (pname, self.name))
+        return self.props[pname]
+
+    def show_link_row(self):
+        return {'link': self.name, 'class': self.link_class,
+                'mtu': self.props['mtu'], 'state': self.state,
+                'over': self.over or ''}
+
+    def show_vnic_row(self):
+        return {'link': self.name, 'over': self.over,
+                'macaddress': _dladm_mac(self.mac),
+                'macaddrtype': 'fixed', 'vid': self.vid}
+
+
+class SimulatedIPInterface(object):
+    def __init__(self, name, temporary=False):
+        self.name = name
+        self.temporary = temporary
+        # addrobj -> (type, addr)
+        self.addrs = collections.OrderedDict()
+        self._count = itertools.count()
+
+    def add(self, addr_type, addr):
+        # ipadm names the address objects <ifname>/_a, <ifname>/_b, ...
+        n = next(self._count)
+        suffix = chr(ord('a') + n) if n < 26 else str(n)
+        addrobj = '%s/_%s' % (self.name, suffix)
+        self.addrs[addrobj] = (addr_type, addr)
+        return addrobj
+
+
+class SolarisSimulator(net_lib.CommandBackend):
+    """Stateful dladm/ipadm simulator.
+
+    :param latency: dict mapping a command verb, as named by
+                    net_lib.command_verb(), to the seconds it takes.
+    :param default_latency: seconds taken by the other commands.
+    """
+
+    def __init__(self, latency=None, default_latency=0.0):
+        self.latency = dict(latency or {})
+        self.default_latency = default_latency
+        self.links = collections.OrderedDict()
+        self.ip_interfaces = collections.OrderedDict()
+        self.calls = collections.Counter()
+        # (lower link, MAC address) of the VNICs
+        self._vnic_macs = set()
+        self._macs = ('fa:16:3f:%02x:%02x:%02x' % (i >> 16 & 0xff,
+                                                   i >> 8 & 0xff, i & 0xff)
+                      for i in itertools.count(1))
+        # every link gets a distinct, increasing kstat crtime
+        self._crtimes = ('%d.000000000' % i for i in itertools.count(1))
+
+    # host set up
+
+    def add_physical_link(self, name, mac=None, default_tag='1', mtu='1500',
+                          speed='10000'):
+        link = SimulatedLink(name, 'phys', mac or next(self._macs),
+                             props={'default_tag': default_tag,
+                                    'mtu': mtu, 'speed': speed},
+                             crtime=next(self._crtimes))
+        self.links[name] = link
+        return link
+
+    def add_vnic(self, name, over, mac=None, vid='0', temporary=False,
+                 props=None):
+        if name in self.links:
+            raise CommandError("dladm: vnic creation failed: object "
+                               "already exists")
+        if over not in self.links:
+            raise CommandError("dladm: vnic creation failed: object not "
+                               "found")
+        mac = (net_lib.normalize_mac(mac) if mac else next(self._macs))
+        if (over, mac) in self._vnic_macs:
+            raise CommandError("dladm: vnic creation failed: MAC address "
+                               "is already in use")
+        link_props = {'mtu': self.links[over].props['mtu']}
+        link_props.update(props or {})
+        link = SimulatedLink(name, 'vnic', mac, over=over, vid=vid,
+                             temporary=temporary, props=link_props,
+                             crtime=next(self._crtimes))
+        self.links[name] = link
+        self._vnic_macs.add((over, mac))
+        return link
+
+    def add_vnics(self, count, over, prefix='vnic', start=0, vid='0'):
+        """Create count VNICs named prefix<n> over a link, for scale runs."""
+        return [self.add_vnic('%s%d' % (prefix, i), over, vid=vid)
+                for i in range(start, start + count)]
+
+    def vnic_macs(self):
+        return {link.mac: name for name, link in self.links.items()
+                if link.link_class == 'vnic'}
+
+    # CommandBackend
+
+    def run(self, cmd, process_input=None):
+        cmd = [str(arg) for arg in cmd]
+        if cmd and os.path.basename(cmd[0]) == 'pfexec':
+            cmd = cmd[1:]
+        verb = net_lib.command_verb(cmd)
+        self.calls[verb] += 1
+        delay = self.latency.get(verb, self.default_latency)
+        if delay:
+            time.sleep(delay)
+
+        binary = os.path.basename(cmd[0]) if cmd else ''
+        options = _OPTIONS.get(binary, {})
+        if isinstance(options, str):
+            optstring, argv, name = options, cmd[1:], '_%s' % binary
+        elif len(cmd) < 2 or cmd[1] not in options:
+            return ('', 'simulator: %s is not supported\n' % verb,
+                    NOT_SUPPORTED)
+        else:
+            optstring, argv = options[cmd[1]], cmd[2:]
+            name = '_%s_%s' % (binary, cmd[1].replace('-', '_'))
+        try:
+            opts, args = getopt.gnu_getopt(argv, optstring)
+            return getattr(self, name)(dict(opts), args), '', 0
+        except getopt.GetoptError as e:
+            return '', '%s: %s\n' % (binary, e), 1
+        except CommandError as e:
+            return '', '%s\n' % e, e.returncode
+
+    # dladm(1M)
+
+    def _get_link(self, name, subcommand):
+        link = self.links.get(name)
+        if link is None:
+            raise CommandError("dladm: %s: object not found" % subcommand)
+        return link
+
+    def _select_links(self, args, subcommand, link_class=None):
+        if args:
+            link = self._get_link(args[0], subcommand)
+            if link_class and link.link_class != link_class:
+                raise CommandError("dladm: %s: object not found" %
+                                   subcommand)
+            return [link]
+        return [link for link in self.links.values()
+                if not link_class or link.link_class == link_class]
+
+    @staticmethod
+    def _fields(opts, default):
+        fields = opts.get('-o', default).split(',')
+        return [field.strip().lower() for field in fields]
+
+    def _show(self, rows, fields, parseable, tool):
+        for field in fields:
+            if rows and field not in rows[0]:
+                raise CommandError("%s: invalid field '%s'" % (tool, field))
+        return _format(rows, fields, parseable)
+
+    def _dladm_show_link(self, opts, args):
+        rows = [link.show_link_row()
+                for link in self._select_links(args, 'show-link')]
+        fields = self._fields(opts, 'link,class,mtu,state,over')
+        return self._show(rows, fields, '-p' in opts, 'dladm')
+
+    def _dladm_show_vnic(self, opts, args):
+        rows = [link.show_vnic_row()
+                for link in self._select_links(args, 'show-vnic', 'vnic')]
+        return self._show(rows, self._fields(opts, 'link,over,macaddress,vid'),
+                          '-p' in opts, 'dladm')
+
+    def _dladm_show_linkprop(self, opts, args):
+        if '-p' not in opts or not args:
+            raise CommandError("dladm: show-linkprop: a link and a "
+                               "property are required")
+        link = self._get_link(args[0], 'show-linkprop')
+        rows = [{'link': link.name, 'property': pname,
+                 'value': link.get_prop(pname)}
+                for pname in opts['-p'].split(',')]
+        return self._show(rows, self._fields(opts, 'link,property,value'),
+                          '-c' in opts, 'dladm')
+
+    def _dladm_set_linkprop(self, opts, args):
+        if '-p' not in opts or not args or '=' not in opts['-p']:
+            raise CommandError("dladm: set-linkprop: a link and a "
+                               "property value are required")
+        link = self._get_link(args[0], 'set-linkprop')
+        pname, pvalue = opts['-p'].split('=', 1)
+        if pname in ('mac-address', 'state'):
+            raise CommandError("dladm: warning: cannot set link property "
+                               "'%s' on '%s': read-only" % (pname, link.name))
+        link.props[pname] = pvalue
+        return ''
+
+    def _dladm_create_vnic(self, opts, args):
+        if '-l' not in opts or len(args) != 1:
+            raise CommandError("dladm: create-vnic: a link and a VNIC name "
+                               "are required")
+        props = {}
+        if '-p' in opts:
+            for prop in opts['-p'].split(','):
+                if '=' not in prop:
+                    raise CommandError("dladm: create-vnic: invalid "
+                                       "property value")
+                pname, pvalue = prop.split('=', 1)
+                props[pname] = pvalue
+        self.add_vnic(args[0], opts['-l'], mac=opts.get('-m'),
+                      vid=opts.get('-v', '0'), temporary='-t' in opts,
+                      props=props)
+        return ''
+
+    def _dladm_delete_vnic(self, opts, args):
+        if len(args) != 1:
+            raise CommandError("dladm: delete-vnic: a VNIC name is "
+                               "required")
+        link = self._get_link(args[0], 'delete-vnic')
+        if link.link_class != 'vnic':
+            raise CommandError("dladm: delete-vnic: invalid link type")
+        if link.name in self.ip_interfaces:
+            raise CommandError("dladm: vnic deletion failed: link busy")
+        del self.links[link.name]
+        self._vnic_macs.discard((link.over, link.mac))
+        return ''
+
+    def _dladm_modify_vnic(self, opts, args):
+        if '-m' not in opts or len(args) != 1:
+            raise CommandError("dladm: modify-vnic: a VNIC name and a MAC "
+                               "address are required")
+        link = self._get_link(args[0], 'modify-vnic')
+        if link.link_class != 'vnic':
+            raise CommandError("dladm: modify-vnic: invalid link type")
+        mac = (next(self._macs) if opts['-m'] == 'random' else
+               net_lib.normalize_mac(opts['-m']))
+        if (link.over, mac) in self._vnic_macs:
+            raise CommandError("dladm: vnic modification failed: MAC "
+                               "address is already in use")
+        self._vnic_macs.discard((link.over, link.mac))
+        self._vnic_macs.add((link.over, mac))
+        link.mac = mac
+        return ''
+
+    def _dladm_rename_link(self, opts, args):
+        if len(args) != 2:
+            raise CommandError("dladm: rename-link: the link and its new "
+                               "name are required")
+        link = self._get_link(args[0], 'rename-link')
+        if args[1] in self.links:
+            raise CommandError("dladm: rename operation failed: object "
+                               "already exists")
+        if link.name in self.ip_interfaces:
+            raise CommandError("dladm: rename operation failed: link busy")
+        del self.links[link.name]
+        link.name = args[1]
+        # the kstats of the link are created again under the new name
+        link.crtime = next(self._crtimes)
+        self.links[link.name] = link
+        return ''
+
+    # ipadm(1M)
+
+    def _get_ip_interface(self, name, subcommand):
+        interface = self.ip_interfaces.get(name)
+        if interface is None:
+            raise CommandError("ipadm: %s: Interface does not exist" %
+                               subcommand)
+        return interface
+
+    def _ipadm_show_if(self, opts, args):
+        if args:
+            interfaces = [self._get_ip_interface(args[0], 'show-if')]
+        else:
+            interfaces = list(self.ip_interfaces.values())
+        rows = [{'ifname': interface.name, 'class': 'ip', 'state': 'ok',
+                 'active': 'yes', 'over': '--'} for interface in interfaces]
+        return self._show(rows,
+                          self._fields(opts, 'ifname,class,state,active,over'),
+                          '-p' in opts, 'ipadm')
+
+    def _ipadm_show_addr(self, opts, args):
+        if args:
+            interfaces = [self._get_ip_interface(args[0], 'show-addr')]
+        else:
+            interfaces = list(self.ip_interfaces.values())
+        rows = [{'addrobj': addrobj, 'type': addr_type, 'state': 'ok',
+                 'addr': addr}
+                for interface in interfaces
+                for addrobj, (addr_type, addr) in interface.addrs.items()]
+        return self._show(rows, self._fields(opts, 'addrobj,type,state,addr'),
+                          '-p' in opts, 'ipadm')
+
+    def _ipadm_create_ip(self, opts, args):
+        if len(args) != 1:
+            raise CommandError("ipadm: create-ip: an interface name is "
+                               "required")
+        name = args[0]
+        if name in self.ip_interfaces:
+            raise CommandError("ipadm: Could not create %s: Interface "
+                               "already exists" % name)
+        if name not in self.links:
+            raise CommandError("ipadm: Could not create %s: No such "
+                               "interface" % name)
+        self.ip_interfaces[name] = SimulatedIPInterface(name, '-t' in opts)
+        return ''
+
+    def _ipadm_delete_ip(self, opts, args):
+        if len(args) != 1:
+            raise CommandError("ipadm: delete-ip: an interface name is "
+                               "required")
+        self._get_ip_interface(args[0], 'delete-ip')
+        del self.ip_interfaces[args[0]]
+        return ''
+
+    def _ipadm_create_addr(self, opts, args):
+        if len(args) != 1:
+            raise CommandError("ipadm: create-addr: an interface or "
+                               "address object name is required")
+        name = args[0].split('/')[0]
+        interface = self._get_ip_interface(name, 'create-addr')
+        addr_type = opts.get('-T')
+        if addr_type == 'static':
+            if '-a' not in opts:
+                raise CommandError("ipadm: create-addr: an address is "
+                                   "required")
+            try:
+                network = netaddr.IPNetwork(opts['-a'])
+            except (netaddr.AddrFormatError, ValueError):
+                raise CommandError("ipadm: Could not create address: "
+                                   "Invalid argument provided")
+            for _type, addr in interface.addrs.values():
+                if netaddr.IPNetwork(addr).ip == network.ip:
+                    raise CommandError("ipadm: Could not create address: "
+                                       "Address already in use")
+            addr = opts['-a']
+            if '/' not in addr:
+                # ipadm always shows a prefix length
+                prefixlen = (10 if network.ip.is_link_local() and
+                             network.version == 6 else network.prefixlen)
+                addr = '%s/%d' % (addr, prefixlen)
+            interface.add('static', addr)
+        elif addr_type == 'addrconf':
+            mac = self.links[name].mac
+            interface.add('addrconf', '%s/10' % netaddr.EUI(
+                mac).ipv6_link_local())
+        else:
+            raise CommandError("ipadm: create-addr: invalid address type")
+        return ''
+
+    def _ipadm_delete_addr(self, opts, args):
+        if len(args) != 1:
+            raise CommandError("ipadm: delete-addr: an address object "
+                               "name is required")
+        name = args[0].split('/')[0]
+        interface = self.ip_interfaces.get(name)
+        if interface is None or args[0] not in interface.addrs:
+            raise CommandError("ipadm: Could not delete address: Address "
+                               "object not found")
+        del interface.addrs[args[0]]
+        return ''
+
+    # kstat(1M)
+
+    def _kstat(self, opts, args):
+        # only the crtime of the link kstats is simulated
+        if opts.get('-m', 'link') != 'link' or args:
+            return ''
+        statistic = opts.get('-s', 'crtime')
+        if statistic != 'crtime':
+            return ''
+        return ''.join('link:0:%s:crtime\t%s\n' % (name, link.crtime)
+                       for name, link in self.links.items())
@@ -0,0 +1,248 @@
+# Copyright 2021, Guillermo Adrian Molina.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Warm pool of pre-created VNICs.
+
+Creating a VNIC is one of the slowest steps of plugging a port. The VNICPool
+keeps up to size temporary VNICs, named <prefix><n>, over every lower link
+and VLAN ID it is asked for. Plugging a port then only changes the MAC
+address of a pooled VNIC and renames it, unplugging gives it a random MAC
+address and a pool name back, and a background green thread creates new
+VNICs, outside of the critical path, to keep every pool at its size.
+"""
+
+import collections
+import itertools
+import re
+import threading
+import time
+
+import eventlet
+from oslo_log import log as logging
+
+from neutron_solaris.common import metrics
+from neutron_solaris.solaris import net_lib
+
+LOG = logging.getLogger(__name__)
+
+POOL_REQUESTS = metrics.REGISTRY.counter(
+    'neutron_solaris_vnic_pool_requests',
+    'VNICs requested from the warm pool, by result.', ['result'])
+POOL_REFILL_DURATION = metrics.REGISTRY.histogram(
+    'neutron_solaris_vnic_pool_refill_duration_seconds',
+    'Duration of the warm VNIC pool refills.')
+POOL_SIZE = metrics.REGISTRY.gauge(
+    'neutron_solaris_vnic_pool_size',
+    'VNICs ready in the warm pool.', ['lower_link', 'vid'])
+
+
+class PoolKey(collections.namedtuple('PoolKey', ['lower_link', 'vid'])):
+    '''The lower link and VLAN ID, as shown by dladm, of a pool.'''
+    __slots__ = ()
+
+
+class VNICPool(object):
+    """Keeps size temporary VNICs ready per lower link and VLAN ID.
+
+    :param size: VNICs kept in every pool.
+    :param keys: PoolKey of the pools filled before they are first used.
+    :param prefix: name prefix of the pooled VNICs.
+    :param workers: VNICs created at the same time by a refill.
+    """
+
+    def __init__(self, size, keys=(), prefix='vpool', workers=4):
+        self.size = size
+        self.prefix = prefix
+        self.workers = workers
+        self._name_re = re.compile(r'^%s(\d+)$' % re.escape(prefix))
+        self._lock = threading.Lock()
+        # PoolKey -> names of the pooled VNICs
+        self._pools = collections.OrderedDict(
+            (PoolKey(*key), []) for key in keys)
+        self._counter = itertools.count()
+        self._wakeup = threading.Event()
+        self._running = False
+        self._refiller = None
+        self.stats = collections.Counter()
+
+    @staticmethod
+    def key(lower_link, vid):
+        """Return the PoolKey of the VNICs created with vid over lower_link.
+
+        dladm shows 0 as the VLAN ID of the VNICs on the default_tag.
+        """
+        if vid:
+            vid = net_lib.Datalink._vnic_vid(
+                str(vid), net_lib.Datalink._default_tag(lower_link))
+        return PoolKey(lower_link, vid or '0')
+
+    @property
+    def hit_rate(self):
+        requests = self.stats['hits'] + self.stats['misses']
+        return float(self.stats['hits']) / requests if requests else 0.0
+
+    def available(self, key=None):
+        with self._lock:
+            if key is not None:
+                return len(self._pools.get(key, ()))
+            return sum(len(names) for names in self._pools.values())
+
+    def _update_size(self, key):
+        POOL_SIZE.set(len(self._pools[key]), lower_link=key.lower_link,
+                      vid=key.vid)
+
+    def load(self):
+        """Adopt the pooled VNICs left over by a previous run."""
+        numbers = [-1]
+        with self._lock:
+            for vnic in net_lib.Datalink.get_vnic_inventory():
+                match = self._name_re.match(vnic.link)
+                if not match:
+                    continue
+                numbers.append(int(match.group(1)))
+                key = PoolKey(vnic.over, vnic.vid)
+                self._pools.setdefault(key, []).append(vnic.link)
+            self._counter = itertools.count(max(numbers) + 1)
+            for key in self._pools:
+                self._update_size(key)
+
+    def acquire(self, name, lower_link, vid, mac_address):
+        """Turn a pooled VNIC into the VNIC name with mac_address.
+
+        :returns: True if a pooled VNIC was used, False if the caller has
+                  to create the VNIC itself.
+        """
+        key = self.key(lower_link, vid)
+        with self._lock:
+            pool = self._pools.setdefault(key, [])
+            pooled = pool.pop() if pool else None
+            self._update_size(key)
+        self._wakeup.set()
+        if pooled is None:
+            self.stats['misses'] += 1
+            POOL_REQUESTS.inc(result='miss')
+            return False
+
+        dl = net_lib.Datalink(pooled)
+        try:
+            dl.modify_vnic(mac_address, temp=True)
+            dl.rename_link(name)
+        except Exception as err:
+            LOG.warning("Failed to use pooled VNIC %(pooled)s for "
+                        "%(name)s: %(err)s",
+                        {'pooled': pooled, 'name': name, 'err': err})
+            self._discard(pooled)
+            self.stats['misses'] += 1
+            POOL_REQUESTS.inc(result='error')
+            return False
+        self.stats['hits'] += 1
+        POOL_REQUESTS.inc(result='hit')
+        return True
+
+    def release(self, name, lower_link, vid):
+        """Put the VNIC name, over lower_link with vid, back in its pool.
+
+        :returns: True if the VNIC was pooled, False if the caller has to
+                  delete it.
+        """
+        key = PoolKey(lower_link, vid or '0')
+        with self._lock:
+            if len(self._pools.get(key, ())) >= self.size:
+                return False
+            pooled = '%s%d' % (self.prefix, next(self._counter))
+        dl = net_lib.Datalink(name)
+        try:
+            # the MAC address may be given to another port next, and the
+            # MTU of this one must not be left to it
+            dl.modify_vnic('random', temp=True)
+            dl.set_prop('mtu', self._lower_mtu(lower_link), temp=True)
+            dl.rename_link(pooled)
+        except Exception as err:
+            LOG.warning("Failed to return VNIC %(name)s to the pool: "
+                        "%(err)s", {'name': name, 'err': err})
+            return False
+        with self._lock:
+            self._pools.setdefault(key, []).append(pooled)
+            self._update_size(key)
+        self.stats['released'] += 1
+        return True
+
+    @staticmethod
+    def _lower_mtu(lower_link):
+        """Return the MTU the VNICs created over lower_link start with."""
+        descriptor = net_lib.Datalink.lower_links.get(lower_link)
+        if descriptor is None:
+            return net_lib.Datalink.show_prop(lower_link, 'mtu')
+        return descriptor.mtu
+
+    def _discard(self, name):
+        try:
+            net_lib.Datalink(name).delete_vnic()
+        except Exception as err:
+            LOG.warning("Failed to delete VNIC %(name)s: %(err)s",
+                        {'name': name, 'err': err})
+
+    def refill(self):
+        """Create the VNICs missing from every pool."""
+        specs = []
+        with self._lock:
+            for key, names in self._pools.items():
+                for _ in range(self.size - len(names)):
+                    specs.append((key, net_lib.VNICSpec(
+                        '%s%d' % (self.prefix, next(self._counter)),
+                        key.lower_link,
+                        vid=key.vid if key.vid != '0' else None)))
+        if not specs:
+            return 0
+
+        start = time.time()
+        results = net_lib.Datalink.create_vnics(
+            [spec for _, spec in specs], temp=True, workers=self.workers)
+        POOL_REFILL_DURATION.observe(time.time() - start)
+
+        created = 0
+        with self._lock:
+            for (key, spec), result in zip(specs, results):
+                if result.status == net_lib.VNICResult.CREATED:
+                    self._pools[key].append(spec.name)
+                    created += 1
+            for key in self._pools:
+                self._update_size(key)
+        self.stats['created'] += created
+        LOG.debug("Created %(created)d of %(count)d pooled VNICs",
+                  {'created': created, 'count': len(specs)})
+        return created
+
+    def _run(self, interval):
+        while self._running:
+            try:
+                self.refill()
+            except Exception:
+                LOG.exception("Failed to refill the VNIC pool")
+            self._wakeup.wait(interval)
+            self._wakeup.clear()
+
+    def start(self, interval=10):
+        """Refill the pools in a green thread, at least every interval."""
+        if self._refiller is None:
+            self._running = True
+            self._refiller = eventlet.spawn(self._run, interval)
+
+    def stop(self):
+        self._running = False
+        self._wakeup.set()
+        refiller, self._refiller = self._refiller, None
+        if refiller is not None:
+            refiller.wait()
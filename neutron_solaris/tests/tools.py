@@ -0,0 +1,121 @@
+# Copyright 2021, Guillermo Adrian Molina.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import copy
+
+import fixtures
+from neutronclient.common import exceptions as n_exc
+
+from neutron_solaris import neutron_client
+from neutron_solaris.solaris import net_lib
+from neutron_solaris.solaris import simulator
+
+
+class SolarisSimulatorFixture(fixtures.Fixture):
+    """Run the net_lib commands against a SolarisSimulator.
+
+    The simulator is available as the simulator attribute. The datalink
+    caches are replaced by empty ones and the pfexec daemon is disabled
+    for the duration of the fixture.
+    """
+
+    def __init__(self, physical_links=('net0',), **kwargs):
+        super(SolarisSimulatorFixture, self).__init__()
+        self._physical_links = physical_links
+        self._kwargs = kwargs
+
+    def _setUp(self):
+        self.simulator = simulator.SolarisSimulator(**self._kwargs)
+        for name in self._physical_links:
+            self.simulator.add_physical_link(name)
+        for attr, value in (
+                ('CommandBase.backend', self.simulator),
+                ('CommandBase.command_daemon', None),
+                ('Datalink.link_cache', net_lib.LinkPropertyCache()),
+                ('Datalink.lower_links', net_lib.LowerLinkCache())):
+            self.useFixture(fixtures.MonkeyPatch(
+                '%s.%s' % (net_lib.__name__, attr), value))
+
+
+class FakeNeutronClient(object):
+    """In-memory stand-in for the neutronclient Client.
+
+    Serves the show_network, show_subnet, show_port and list_ports calls
+    from the networks, subnets and ports dicts, keyed by id. Looking up an
+    object that is not there raises NotFound like the API does. Every call
+    is counted in calls, e.g. calls['show_port'].
+    """
+
+    def __init__(self):
+        self.networks = {}
+        self.subnets = {}
+        self.ports = {}
+        self.calls = collections.Counter()
+
+    def add_network(self, network_id, **attrs):
+        self.networks[network_id] = dict(id=network_id, subnets=[], **attrs)
+        return self.networks[network_id]
+
+    def add_subnet(self, subnet_id, network_id, cidr, gateway_ip=None):
+        self.subnets[subnet_id] = {'id': subnet_id,
+                                   'network_id': network_id,
+                                   'cidr': cidr,
+                                   'gateway_ip': gateway_ip}
+        self.networks[network_id]['subnets'].append(subnet_id)
+        return self.subnets[subnet_id]
+
+    def add_port(self, port_id, network_id, ip_address, **attrs):
+        self.ports[port_id] = dict(
+            id=port_id, network_id=network_id,
+            fixed_ips=[{'ip_address': ip_address}], **attrs)
+        return self.ports[port_id]
+
+    def _show(self, resource, objects, obj_id):
+        self.calls['show_%s' % resource] += 1
+        if obj_id not in objects:
+            raise n_exc.NotFound(message="%s %s could not be found" %
+                                 (resource.capitalize(), obj_id))
+        # like the API, every call returns a new copy
+        return {resource: copy.deepcopy(objects[obj_id])}
+
+    def show_network(self, network_id):
+        return self._show('network', self.networks, network_id)
+
+    def show_subnet(self, subnet_id):
+        return self._show('subnet', self.subnets, subnet_id)
+
+    def show_port(self, port_id):
+        return self._show('port', self.ports, port_id)
+
+    def list_ports(self, **filters):
+        self.calls['list_ports'] += 1
+        return {'ports': [copy.deepcopy(port)
+                          for port in self.ports.values()
+                          if all(port.get(key) == value
+                                 for key, value in filters.items())]}
+
+
+class FakeNeutronFixture(fixtures.Fixture):
+    """Hand out a FakeNeutronClient from the neutron client factory.
+
+    The fake is available as the client attribute.
+    """
+
+    def _setUp(self):
+        self.client = FakeNeutronClient()
+        self.useFixture(fixtures.MockPatchObject(
+            neutron_client.CLIENT_FACTORY, 'get_client',
+            return_value=self.client))
@@ -0,0 +1,96 @@
+# Copyright 2021, Guillermo Adrian Molina.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Unit tests for the Solaris VNIC agent device event sources.
+"""
+
+from unittest import mock
+
+from neutron_solaris.agent.solarisvnic import device_events
+from neutron_solaris.solaris import net_lib
+from neutron_solaris.tests import base
+
+MAC1 = 'fa:16:3e:00:00:01'
+MAC2 = 'fa:16:3e:00:00:02'
+MAC3 = 'fa:16:3e:00:00:03'
+
+
+def _inventory(*vnics):
+    return net_lib.VNICInventory(
+        [net_lib.VNIC(link, mac, vid, 'net0', None)
+         for link, mac, vid in vnics])
+
+
+class TestSnapshotDiffEventSource(base.BaseTestCase):
+
+    def test_diff(self):
+        previous = _inventory(('vnic1', MAC1, '0'), ('vnic2', MAC2, '0'))
+        current = _inventory(('vnic1', MAC1, '100'), ('vnic3', MAC3, '0'))
+
+        events = device_events.SnapshotDiffEventSource.diff(previous,
+                                                            current)
+
+        self.assertEqual(
+            sorted([device_events.DeviceEvent('change', 'vnic1', MAC1),
+                    device_events.DeviceEvent('add', 'vnic3', MAC3),
+                    device_events.DeviceEvent('remove', 'vnic2', MAC2)]),
+            sorted(events))
+
+    @mock.patch.object(device_events.eventlet, 'sleep')
+    def test_get_events(self, mock_sleep):
+        snapshots = [_inventory(('vnic1', MAC1, '0')),
+                     _inventory(('vnic1', MAC1, '0')),
+                     _inventory(('vnic1', MAC1, '0'), ('vnic2', MAC2, '0'))]
+        source = device_events.SnapshotDiffEventSource(
+            mock.Mock(side_effect=snapshots), 1)
+
+        events = source.get_events(10)
+
+        self.assertEqual([device_events.DeviceEvent('add', 'vnic2', MAC2)],
+                         events)
+        self.assertEqual(2, mock_sleep.call_count)
+
+    def test_get_events_timeout(self):
+        snapshot_func = mock.Mock(return_value=_inventory())
+        source = device_events.SnapshotDiffEventSource(snapshot_func, 1)
+
+        self.assertEqual([], source.get_events(0))
+        snapshot_func.assert_called_once_with()
+
+
+class TestMonitorEventSource(base.BaseTestCase):
+
+    def test_parse_line(self):
+        parse = device_events.MonitorEventSource.parse_line
+        self.assertEqual(
+            device_events.DeviceEvent('add', 'vnic1', '02:08:20:00:00:01'),
+            parse('add vnic1 2:8:20:0:0:1\n'))
+        self.assertEqual(device_events.DeviceEvent('remove', 'vnic1', None),
+                         parse('remove vnic1'))
+        self.assertIsNone(parse('bogus vnic1'))
+        self.assertIsNone(parse(''))
+
+    def test_get_events_drains_queue(self):
+        source = device_events.MonitorEventSource(['monitor'])
+        source.handle_line('add vnic1 %s' % MAC1)
+        source.handle_line('garbage')
+        source.handle_line('change vnic2 %s' % MAC2)
+
+        self.assertEqual(
+            [device_events.DeviceEvent('add', 'vnic1', MAC1),
+             device_events.DeviceEvent('change', 'vnic2', MAC2)],
+            source.get_events(1))
+        self.assertEqual([], source.get_events(0.01))
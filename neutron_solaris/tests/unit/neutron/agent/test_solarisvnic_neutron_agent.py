@@ -0,0 +1,565 @@
+# Copyright 2021, Guillermo Adrian Molina.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Unit tests for the Solaris VNIC neutron agent.
+"""
+
+import collections
+import os
+from unittest import mock
+
+import eventlet
+import fixtures
+
+from neutron_solaris.agent.solarisvnic import device_events
+from neutron_solaris.agent.solarisvnic import solarisvnic_neutron_agent as \
+    solarisvnic_agent
+from neutron_solaris.agent.solarisvnic import state_cache
+from neutron_solaris.solaris import net_lib
+from neutron_solaris.tests import base
+from neutron_solaris.tests import tools
+
+MAC1 = 'fa:16:3e:00:00:01'
+MAC2 = 'fa:16:3e:00:00:02'
+MAC3 = 'fa:16:3e:00:00:03'
+
+WARM_DETAILS = {'device': MAC1, 'port_id': 'port1', 'network_id': 'net1',
+                'network_type': 'vlan', 'physical_network': 'physnet1',
+                'segmentation_id': 100, 'mtu': 1500, 'admin_state_up': True,
+                'device_owner': 'compute:nova', 'fixed_ips': []}
+
+
+class TestSolarisVNICNetworkManager(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestSolarisVNICNetworkManager, self).setUp()
+        self.config(vnic_index_file=None, group='SOLARISVNIC')
+        mock.patch.object(net_lib.Datalink, 'datalink_exists',
+                          return_value=True).start()
+        self.crtimes_patcher = mock.patch.object(
+            net_lib.Datalink, 'get_link_crtimes', return_value={})
+        self.crtimes_patcher.start()
+        self.mgr = solarisvnic_agent.SolarisVNICNetworkManager(
+            {'physnet1': 'net0'})
+
+    @mock.patch.object(net_lib.Datalink, 'get_vnic_inventory')
+    def test_get_all_devices_uses_prefetched_inventory(self, mock_inventory):
+        mock_inventory.return_value = net_lib.VNICInventory()
+        self.mgr.refresh_inventory()
+        self.mgr.get_all_devices()
+        self.assertEqual(1, mock_inventory.call_count)
+
+        self.mgr.get_all_devices()
+        self.assertEqual(2, mock_inventory.call_count)
+
+    @mock.patch.object(net_lib.Datalink, 'get_mac')
+    @mock.patch.object(net_lib.Datalink, 'get_vnic_inventory')
+    def test_get_all_devices(self, mock_inventory, mock_get_mac):
+        mock_inventory.return_value = net_lib.VNICInventory([
+            net_lib.VNIC('vnic0', 'fa:16:3e:00:00:01', '0', 'net0', None),
+            net_lib.VNIC('vnic1', 'fa:16:3e:00:00:02', '0', 'net0', None)])
+
+        devices = self.mgr.get_all_devices()
+
+        self.assertEqual({'fa:16:3e:00:00:01', 'fa:16:3e:00:00:02'},
+                         devices)
+        self.assertEqual({'fa:16:3e:00:00:01': 'vnic0',
+                          'fa:16:3e:00:00:02': 'vnic1'},
+                         self.mgr.mac_device_name_mappings)
+        self.assertIs(mock_inventory.return_value, self.mgr.vnic_inventory)
+        mock_get_mac.assert_not_called()
+
+    @mock.patch.object(net_lib.Datalink, 'get_vnic_inventory')
+    def test_get_devices_modified_timestamps(self, mock_inventory):
+        mock_inventory.return_value = net_lib.VNICInventory([
+            net_lib.VNIC('vnic0', MAC1, '0', 'net0', None)])
+        self.mgr.get_all_devices()
+
+        timestamps = self.mgr.get_devices_modified_timestamps({MAC1, MAC2})
+
+        self.assertEqual({MAC1}, set(timestamps))
+        self.assertEqual(1, mock_inventory.call_count)
+
+    def test_get_devices_modified_timestamps_rebuild(self):
+        self.crtimes_patcher.stop()
+        sim = self.useFixture(tools.SolarisSimulatorFixture()).simulator
+        sim.add_vnic('vnic0', 'net0', mac=MAC1)
+        self.mgr.get_all_devices()
+        generation = self.mgr.vnic_index.get_generation(MAC1)
+
+        # a fast rebuild gives the VNIC back its name, lower link, VLAN ID
+        # and MAC address
+        net_lib.Datalink('vnic0').delete_vnic()
+        sim.add_vnic('vnic0', 'net0', mac=MAC1)
+        self.mgr.get_all_devices()
+
+        self.assertEqual(generation + 1,
+                         self.mgr.vnic_index.get_generation(MAC1))
+
+    def test_process_devices(self):
+        self.config(plug_workers=2, group='SOLARISVNIC')
+        mgr = solarisvnic_agent.SolarisVNICNetworkManager({})
+        processed = []
+
+        def _process(details):
+            if details['device'] == MAC2:
+                raise ValueError()
+            processed.append(details['device'])
+
+        results = mgr.process_devices(
+            [{'device': MAC1}, {'device': MAC2}, {'device': MAC3}],
+            _process)
+
+        self.assertEqual([MAC1, MAC3], sorted(processed))
+        self.assertIsNone(results[MAC1])
+        self.assertIsNone(results[MAC3])
+        self.assertIsInstance(results[MAC2], ValueError)
+
+    def test_process_devices_bounded(self):
+        self.config(plug_workers=2, group='SOLARISVNIC')
+        mgr = solarisvnic_agent.SolarisVNICNetworkManager({})
+        running = []
+        peak = []
+
+        def _process(details):
+            running.append(details['device'])
+            peak.append(len(running))
+            eventlet.sleep(0.01)
+            running.remove(details['device'])
+
+        results = mgr.process_devices(
+            [{'device': 'fa:16:3e:00:00:%02x' % i} for i in range(10)],
+            _process)
+
+        self.assertEqual(10, len(results))
+        self.assertEqual(2, max(peak))
+
+    def test_device_exists(self):
+        sim = self.useFixture(tools.SolarisSimulatorFixture()).simulator
+        sim.add_vnic('vnic0', 'net0', mac=MAC1)
+        self.mgr.mac_device_name_mappings = {MAC1: 'vnic0', MAC2: 'vnic1'}
+
+        self.assertTrue(self.mgr.device_exists(MAC1))
+        self.assertFalse(self.mgr.device_exists(MAC2))
+        self.assertFalse(self.mgr.device_exists(MAC3))
+
+        # the VNIC was re-created for another device
+        net_lib.Datalink('vnic0').delete_vnic()
+        sim.add_vnic('vnic0', 'net0', mac=MAC3)
+
+        self.assertFalse(self.mgr.device_exists(MAC1))
+
+    def test_network_index(self):
+        self.mgr.mark_plugged(MAC1, 'net1')
+        self.mgr.mark_plugged(MAC2, 'net1')
+        self.mgr.mark_plugged(MAC3, 'net2')
+        self.assertEqual({MAC1, MAC2}, self.mgr.get_network_devices('net1'))
+
+        # a device moved to another network is only indexed there
+        self.mgr.mark_plugged(MAC2, 'net2')
+        self.mgr.remove_devices([MAC3])
+
+        self.assertEqual({MAC1}, self.mgr.get_network_devices('net1'))
+        self.assertEqual({MAC2}, self.mgr.get_network_devices('net2'))
+        self.assertFalse(self.mgr.is_plugged(MAC3))
+
+    def test_unplug_network(self):
+        self.mgr.mark_plugged(MAC1, 'net1')
+        self.mgr.mark_plugged(MAC2, 'net2')
+
+        self.assertEqual({MAC1}, self.mgr.unplug_network('net1'))
+
+        self.assertFalse(self.mgr.is_plugged(MAC1))
+        self.assertTrue(self.mgr.is_plugged(MAC2))
+        self.assertEqual(set(), self.mgr.unplug_network('net1'))
+
+
+class TestSolarisVNICRPCCallBack(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestSolarisVNICRPCCallBack, self).setUp()
+        self.config(update_debounce_interval=0, group='SOLARISVNIC')
+        self.agent = mock.Mock()
+        self.agent.mgr.is_plugged.side_effect = lambda mac: mac == MAC1
+        self.agent.network_ports = {'net1': [{'port_id': 'port1',
+                                              'device': MAC1}]}
+        self.callbacks = solarisvnic_agent.SolarisVNICRPCCallBack(
+            mock.sentinel.context, self.agent, mock.Mock())
+
+    def test_port_update(self):
+        self.callbacks.port_update(mock.sentinel.context,
+                                   port={'mac_address': MAC1})
+        self.callbacks.port_update(mock.sentinel.context,
+                                   port={'mac_address': MAC1})
+        self.callbacks.port_update(mock.sentinel.context,
+                                   port={'mac_address': MAC2})
+        self.assertTrue(self.callbacks.has_pending_updates())
+
+        updated = self.callbacks.get_and_clear_updated_devices()
+
+        self.assertEqual({MAC1, MAC2}, updated)
+        self.assertEqual({MAC2},
+                         self.callbacks.get_and_clear_priority_devices())
+        self.assertEqual(1, self.callbacks.update_queue.get_stats()[
+            'coalesced'])
+        self.assertFalse(self.callbacks.has_pending_updates())
+
+    @mock.patch.object(solarisvnic_agent, 'cfg')
+    def test_binding_activate(self, mock_cfg):
+        mock_cfg.CONF.host = 'host1'
+        self.callbacks.binding_activate(mock.sentinel.context,
+                                        port_id='port1', host='host1')
+        self.callbacks.binding_activate(mock.sentinel.context,
+                                        port_id='port2', host='host1')
+        self.callbacks.binding_activate(mock.sentinel.context,
+                                        port_id='port1', host='host2')
+
+        self.assertEqual({MAC1},
+                         self.callbacks.get_and_clear_updated_devices())
+
+
+    def test_network_delete(self):
+        self.callbacks.network_map['net1'] = mock.sentinel.segment
+
+        self.callbacks.network_delete(mock.sentinel.context,
+                                      network_id='net1')
+        self.callbacks.network_delete(mock.sentinel.context,
+                                      network_id='net1')
+
+        self.assertNotIn('net1', self.callbacks.network_map)
+        self.agent.teardown_network.assert_called_once_with('net1')
+
+    def test_network_delete_unknown(self):
+        self.callbacks.network_delete(mock.sentinel.context,
+                                      network_id='net2')
+
+        self.agent.teardown_network.assert_not_called()
+
+
+class FakeEventSource(device_events.DeviceEventSource):
+    """Event source replaying a scripted list of event batches."""
+
+    def __init__(self, batches):
+        self.batches = list(batches)
+
+    def get_events(self, timeout):
+        if self.batches:
+            return self.batches.pop(0)
+        return []
+
+
+class TestSolarisVNICAgentLoop(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestSolarisVNICAgentLoop, self).setUp()
+        self.mgr = mock.Mock(spec=solarisvnic_agent.SolarisVNICNetworkManager)
+        self.event_source = FakeEventSource([])
+        self.loop = solarisvnic_agent.SolarisVNICAgentLoop(
+            self.mgr, 2, 2, 'Solaris agent', 'neutron-solarisvnic-agent',
+            event_source=self.event_source, resync_interval=300)
+        self.loop.rpc_callbacks = mock.Mock(updated_devices=set())
+        self.loop.rpc_callbacks.has_pending_updates.return_value = False
+        self.loop.sg_agent = mock.Mock()
+        self.loop.sg_agent.firewall_refresh_needed.return_value = False
+        self.loop.fullsync = False
+        self.scan = mock.patch.object(self.loop, 'scan_devices').start()
+        self.scan.return_value = {'current': set(), 'added': set(),
+                                  'updated': set(), 'removed': set()}
+        self.process = mock.patch.object(
+            self.loop, 'process_network_devices').start()
+
+    def test_first_iteration_syncs(self):
+        device_info, sync = self.loop.run_iteration(None, True)
+
+        self.scan.assert_called_once_with(previous=None, sync=True)
+        self.assertFalse(sync)
+        self.assertEqual(self.scan.return_value, device_info)
+
+    def test_idle_iteration_skips_scan(self):
+        device_info, _ = self.loop.run_iteration(None, True)
+        self.scan.reset_mock()
+
+        self.loop.wait_for_events()
+        self.loop.run_iteration(device_info, False)
+
+        self.scan.assert_not_called()
+
+    def test_changed_devices_are_updated(self):
+        device_info, _ = self.loop.run_iteration(None, True)
+        self.event_source.batches.append(
+            [device_events.DeviceEvent('change', 'vnic1', MAC1),
+             device_events.DeviceEvent('add', 'vnic2', MAC2)])
+
+        self.loop.wait_for_events()
+        self.loop.run_iteration(device_info, False)
+
+        self.scan.assert_called_with(previous=device_info, sync=False)
+        self.assertEqual({MAC1}, self.loop.rpc_callbacks.updated_devices)
+
+    def test_periodic_resync(self):
+        device_info, _ = self.loop.run_iteration(None, True)
+        self.loop._last_resync -= 301
+
+        self.loop.run_iteration(device_info, False)
+
+        self.scan.assert_called_with(previous=device_info, sync=True)
+
+    def _setup_warm_start(self, details):
+        vnic1 = net_lib.VNIC('vnic1', MAC1, '100', 'net0', None)
+        vnic2 = net_lib.VNIC('vnic2', MAC2, '0', 'net0', None)
+        self.mgr.vnic_inventory = net_lib.VNICInventory([vnic1, vnic2])
+        path = os.path.join(self.useFixture(fixtures.TempDir()).path,
+                            'state.json')
+        cache = state_cache.AgentStateCache(path)
+        cache.update(MAC1, WARM_DETAILS, vnic1)
+        cache.update(MAC3, dict(WARM_DETAILS, device=MAC3, port_id='port3'),
+                     None)
+        self.loop.state_cache = cache
+        self.loop.network_ports = collections.defaultdict(list)
+        self.loop.context = mock.sentinel.context
+        self.loop.agent_id = 'solaris0'
+        self.loop.ext_manager = mock.Mock()
+        self.loop.plugin_rpc = mock.Mock()
+        self.loop.plugin_rpc.get_devices_details_list.return_value = [
+            details]
+        return {'current': {MAC1, MAC2}, 'added': {MAC1, MAC2},
+                'updated': set(), 'removed': set()}
+
+    @mock.patch.object(solarisvnic_agent, 'cfg')
+    def test_warm_start(self, mock_cfg):
+        device_info = self._setup_warm_start(WARM_DETAILS)
+
+        self.loop._warm_start(device_info)
+
+        self.assertEqual({MAC2}, device_info['added'])
+        self.assertEqual({MAC3}, device_info['removed'])
+        self.loop.plugin_rpc.get_devices_details_list.assert_called_once_with(
+            mock.sentinel.context, {MAC1}, 'solaris0',
+            host=mock_cfg.CONF.host)
+        self.assertEqual([{'port_id': 'port1', 'device': MAC1}],
+                         self.loop.network_ports['net1'])
+        self.loop.rpc_callbacks.add_network.assert_called_once_with(
+            'net1', mock.ANY)
+        self.mgr.mark_plugged.assert_called_once_with(MAC1, 'net1')
+        self.loop.sg_agent.setup_port_filters.assert_called_once_with(
+            {MAC1}, set())
+        self.loop.ext_manager.handle_port.assert_called_once_with(
+            mock.sentinel.context, WARM_DETAILS)
+
+    @mock.patch.object(solarisvnic_agent, 'cfg')
+    def test_warm_start_config_changed(self, mock_cfg):
+        # the segment changed on the server while the agent was down
+        device_info = self._setup_warm_start(
+            dict(WARM_DETAILS, segmentation_id=200))
+
+        self.loop._warm_start(device_info)
+
+        self.assertEqual({MAC1, MAC2}, device_info['added'])
+        self.mgr.mark_plugged.assert_not_called()
+        self.loop.ext_manager.handle_port.assert_not_called()
+        self.assertIsNone(self.loop._resync_due)
+
+    @mock.patch.object(solarisvnic_agent, 'cfg')
+    def test_warm_start_details_failure(self, mock_cfg):
+        device_info = self._setup_warm_start(WARM_DETAILS)
+        self.loop.plugin_rpc.get_devices_details_list.side_effect = (
+            Exception())
+
+        self.loop._warm_start(device_info)
+
+        self.assertEqual({MAC1, MAC2}, device_info['added'])
+
+    @mock.patch.object(solarisvnic_agent, 'cfg')
+    def test_warm_start_resync(self, mock_cfg):
+        self.loop.event_source = None
+        self.loop.resync_interval = 0
+        device_info = self._setup_warm_start(WARM_DETAILS)
+        self.loop._warm_start(device_info)
+        self.scan.return_value = device_info
+
+        device_info, _ = self.loop.run_iteration(None, True)
+        self.loop.run_iteration(device_info, False)
+        self.scan.assert_called_with(previous=device_info, sync=False)
+
+        # one full resync follows the warm start, even when polling
+        self.loop._resync_due -= self.loop.polling_interval
+        self.loop.run_iteration(device_info, False)
+        self.scan.assert_called_with(previous=device_info, sync=True)
+        self.loop.run_iteration(device_info, False)
+        self.scan.assert_called_with(previous=device_info, sync=False)
+
+    @mock.patch.object(solarisvnic_agent, 'cfg')
+    def test_treat_devices_added_updated_retries_failed(self, mock_cfg):
+        self.loop.context = mock.sentinel.context
+        self.loop.agent_id = 'solaris0'
+        self.loop.plugin_rpc = mock.Mock()
+        self.loop.plugin_rpc.get_devices_details_list.return_value = [
+            {'device': MAC1}, {'device': MAC2}]
+        self.loop._priority_devices = {MAC2}
+        self.mgr.process_devices.return_value = {MAC1: None,
+                                                 MAC2: ValueError()}
+
+        resync = self.loop.treat_devices_added_updated({MAC1, MAC2})
+
+        self.assertFalse(resync)
+        self.mgr.process_devices.assert_called_once_with(
+            [{'device': MAC2}, {'device': MAC1}],
+            self.loop._process_device_if_exists)
+        self.assertEqual({MAC2}, self.loop.rpc_callbacks.updated_devices)
+
+    def test_missing_device_does_not_rescan(self):
+        self.mgr.device_exists.return_value = False
+
+        with self.loop._ignore_missing_device_exceptions(MAC1):
+            raise RuntimeError('VNIC vanished')
+
+        self.mgr.device_exists.assert_called_once_with(MAC1)
+        self.mgr.get_all_devices.assert_not_called()
+
+    def test_failure_of_existing_device_is_raised(self):
+        self.mgr.device_exists.return_value = True
+
+        def _process():
+            with self.loop._ignore_missing_device_exceptions(MAC1):
+                raise RuntimeError('dladm failed')
+
+        self.assertRaises(RuntimeError, _process)
+
+    @mock.patch.object(solarisvnic_agent, 'cfg')
+    def test_treat_devices_added_updated_isolates_errors(self, mock_cfg):
+        self.config(plug_workers=4, vnic_index_file=None,
+                    group='SOLARISVNIC')
+        mgr = solarisvnic_agent.SolarisVNICNetworkManager({})
+        mgr.device_exists = mock.Mock(return_value=True)
+        self.loop.mgr = mgr
+        self.loop.context = mock.sentinel.context
+        self.loop.agent_id = 'solaris0'
+        self.loop.plugin_rpc = mock.Mock()
+        self.loop.plugin_rpc.get_devices_details_list.return_value = [
+            {'device': MAC1}, {'device': MAC2}, {'device': MAC3}]
+        processed = []
+
+        def _process(details):
+            with self.loop._ignore_missing_device_exceptions(
+                    details['device']):
+                if details['device'] == MAC2:
+                    raise RuntimeError('dladm failed')
+                processed.append(details['device'])
+
+        with mock.patch.object(self.loop, '_process_device_if_exists',
+                               side_effect=_process):
+            resync = self.loop.treat_devices_added_updated(
+                {MAC1, MAC2, MAC3})
+
+        self.assertFalse(resync)
+        self.assertEqual([MAC1, MAC3], sorted(processed))
+        # only the failed device is retried in the next iteration
+        self.assertEqual({MAC2}, self.loop.rpc_callbacks.updated_devices)
+
+    def test_process_failure_requests_sync(self):
+        self.scan.return_value['added'] = {MAC1}
+        self.process.side_effect = Exception()
+
+        _, sync = self.loop.run_iteration(None, True)
+
+        self.assertTrue(sync)
+
+    def test_iteration_metrics(self):
+        solarisvnic_agent.metrics.REGISTRY.clear()
+        self.addCleanup(solarisvnic_agent.metrics.REGISTRY.clear)
+        self.loop.metrics_exporter = mock.Mock()
+        self.scan.return_value['added'] = {MAC1, MAC2}
+        self.scan.return_value['removed'] = {MAC3}
+
+        self.loop.run_iteration(None, True)
+
+        self.assertEqual(1, solarisvnic_agent.CYCLE_DURATION.get_count())
+        self.assertEqual(1, solarisvnic_agent.CYCLE_PHASE_DURATION.get_count(
+            phase='process'))
+        self.assertEqual(2, solarisvnic_agent.CYCLE_DEVICES.get(
+            event='added'))
+        self.assertEqual(1, solarisvnic_agent.DEVICES.get(event='removed'))
+        self.loop.metrics_exporter.write.assert_called_once_with()
+
+    def test_polling_without_event_source(self):
+        self.loop.event_source = None
+        device_info, _ = self.loop.run_iteration(None, True)
+        self.scan.reset_mock()
+
+        self.loop.run_iteration(device_info, False)
+
+        self.scan.assert_called_once_with(previous=device_info, sync=False)
+
+    def test_teardown_network(self):
+        self.loop.context = mock.sentinel.context
+        self.loop.ext_manager = mock.Mock()
+        self.loop.state_cache = mock.Mock()
+        self.loop.network_ports = collections.defaultdict(list)
+        self.loop.network_ports['net1'] = [{'port_id': 'port1',
+                                            'device': MAC1}]
+        self.loop.network_ports['net2'] = [{'port_id': 'port2',
+                                            'device': MAC2}]
+        self.mgr.unplug_network.return_value = {MAC1}
+
+        devices = self.loop.teardown_network('net1')
+
+        self.assertEqual({MAC1}, devices)
+        self.assertNotIn('net1', self.loop.network_ports)
+        self.assertIn('net2', self.loop.network_ports)
+        self.loop.sg_agent.remove_devices_filter.assert_called_once_with(
+            {MAC1})
+        self.loop.ext_manager.delete_port.assert_called_once_with(
+            mock.sentinel.context, {'device': MAC1, 'port_id': 'port1'})
+        self.loop.state_cache.remove.assert_called_once_with(MAC1)
+        self.loop.state_cache.save.assert_called_once_with()
+
+    def test_teardown_network_bookkeeping(self):
+        self.config(vnic_index_file=None, group='SOLARISVNIC')
+        mgr = solarisvnic_agent.SolarisVNICNetworkManager({})
+        self.loop.mgr = mgr
+        self.loop.context = mock.sentinel.context
+        self.loop.ext_manager = mock.Mock()
+        path = os.path.join(self.useFixture(fixtures.TempDir()).path,
+                            'state.json')
+        self.loop.state_cache = state_cache.AgentStateCache(path)
+        self.loop.network_ports = collections.defaultdict(list)
+        for mac, port_id, network_id in ((MAC1, 'port1', 'net1'),
+                                         (MAC2, 'port2', 'net1'),
+                                         (MAC3, 'port3', 'net2')):
+            mgr.mark_plugged(mac, network_id)
+            self.loop.network_ports[network_id].append(
+                {'port_id': port_id, 'device': mac})
+            self.loop.state_cache.update(
+                mac, dict(WARM_DETAILS, device=mac, port_id=port_id,
+                          network_id=network_id), None)
+        self.loop.state_cache.save()
+
+        devices = self.loop.teardown_network('net1')
+
+        self.assertEqual({MAC1, MAC2}, devices)
+        self.assertEqual({MAC3: 'net2'}, mgr.plugged_devices)
+        self.assertEqual({'net2': {MAC3}}, dict(mgr.network_devices))
+        self.assertEqual(2, self.loop.ext_manager.delete_port.call_count)
+        # the removal is persisted right away
+        self.assertEqual({MAC3},
+                         state_cache.AgentStateCache(path).devices)
+
+    def test_teardown_unknown_network(self):
+        self.loop.network_ports = collections.defaultdict(list)
+        self.mgr.unplug_network.return_value = set()
+
+        self.assertEqual(set(), self.loop.teardown_network('net1'))
+        self.loop.sg_agent.remove_devices_filter.assert_not_called()
@@ -0,0 +1,79 @@
+# Copyright 2021, Guillermo Adrian Molina.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Unit tests for the Solaris VNIC agent warm start state cache.
+"""
+
+import os
+
+import fixtures
+
+from neutron_solaris.agent.solarisvnic import state_cache
+from neutron_solaris.solaris import net_lib
+from neutron_solaris.tests import base
+
+MAC1 = 'fa:16:3e:00:00:01'
+
+DETAILS = {'device': MAC1, 'port_id': 'port1', 'network_id': 'net1',
+           'network_type': 'vlan', 'physical_network': 'physnet1',
+           'segmentation_id': 100, 'mtu': 1500, 'admin_state_up': True,
+           'device_owner': 'compute:nova', 'fixed_ips': []}
+
+
+class TestAgentStateCache(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestAgentStateCache, self).setUp()
+        self.path = os.path.join(self.useFixture(fixtures.TempDir()).path,
+                                 'state.json')
+        self.vnic = net_lib.VNIC('vnic1', MAC1, '100', 'net0', None)
+
+    def test_update_and_reload(self):
+        cache = state_cache.AgentStateCache(self.path)
+        self.assertTrue(cache.update(MAC1, DETAILS, self.vnic))
+        self.assertFalse(cache.update(MAC1, DETAILS, self.vnic))
+        cache.save()
+
+        cache = state_cache.AgentStateCache(self.path)
+        entry = cache.get(MAC1)
+        self.assertEqual('net1', entry['network_id'])
+        self.assertEqual(100, entry['segment']['segmentation_id'])
+        self.assertTrue(cache.matches(entry, self.vnic))
+        self.assertFalse(cache.matches(entry, self.vnic._replace(vid='0')))
+        self.assertFalse(cache.matches(entry, None))
+
+    def test_config_hash(self):
+        changed = dict(DETAILS, admin_state_up=False)
+        self.assertNotEqual(state_cache.AgentStateCache.config_hash(DETAILS),
+                            state_cache.AgentStateCache.config_hash(changed))
+
+    def test_is_current(self):
+        cache = state_cache.AgentStateCache(self.path)
+        cache.update(MAC1, DETAILS, self.vnic)
+        entry = cache.get(MAC1)
+
+        self.assertTrue(cache.is_current(entry, dict(DETAILS)))
+        self.assertFalse(cache.is_current(
+            entry, dict(DETAILS, network_id='net2')))
+
+    def test_remove(self):
+        cache = state_cache.AgentStateCache(self.path)
+        cache.update(MAC1, DETAILS, self.vnic)
+        cache.save()
+        cache.remove(MAC1)
+        cache.save()
+
+        self.assertNotIn(MAC1, state_cache.AgentStateCache(self.path))
@@ -0,0 +1,75 @@
+# Copyright 2021, Guillermo Adrian Molina.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Unit tests for the Solaris VNIC agent coalescing update queue.
+"""
+
+from neutron_solaris.agent.solarisvnic import update_queue
+from neutron_solaris.tests import base
+
+
+class TestCoalescingUpdateQueue(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestCoalescingUpdateQueue, self).setUp()
+        self.queue = update_queue.CoalescingUpdateQueue(1, max_delay=5)
+
+    def test_debounce_and_coalesce(self):
+        self.queue.add('mac1', now=0)
+        self.queue.add('mac1', now=0.5)
+        self.queue.add('mac2', update_queue.PRIORITY_NEW, now=0.5)
+
+        self.assertEqual((set(), set()), self.queue.pop_ready(now=1.2))
+        self.assertEqual(({'mac2'}, {'mac1'}),
+                         self.queue.pop_ready(now=1.5))
+        self.assertEqual(0, len(self.queue))
+        self.assertEqual({'received': 3, 'coalesced': 1, 'processed': 2,
+                          'pending': 0}, self.queue.get_stats())
+
+    def test_metrics(self):
+        update_queue.metrics.REGISTRY.clear()
+        self.addCleanup(update_queue.metrics.REGISTRY.clear)
+        self.queue.add('mac1', now=0)
+        self.queue.add('mac1', now=0.5)
+        self.queue.add('mac2', now=0.5)
+        self.assertEqual(2, update_queue.PENDING_UPDATES.get())
+
+        self.queue.pop_ready(now=1.5)
+
+        self.assertEqual(3, update_queue.UPDATES.get(result='received'))
+        self.assertEqual(1, update_queue.UPDATES.get(result='coalesced'))
+        self.assertEqual(2, update_queue.UPDATES.get(result='processed'))
+        self.assertEqual(0, update_queue.PENDING_UPDATES.get())
+        self.assertIn('solarisvnic_agent_port_updates_total{result="coalesced"'
+                      '} 1', update_queue.metrics.REGISTRY.render())
+
+    def test_new_lane_wins(self):
+        self.queue.add('mac1', update_queue.PRIORITY_NEW, now=0)
+        self.queue.add('mac1', update_queue.PRIORITY_REFRESH, now=0)
+
+        self.assertEqual(({'mac1'}, set()), self.queue.pop_ready(now=1))
+
+    def test_max_delay(self):
+        for now in range(6):
+            self.queue.add('mac1', now=now * 0.9)
+
+        self.assertEqual((set(), {'mac1'}), self.queue.pop_ready(now=5))
+
+    def test_no_debounce(self):
+        queue = update_queue.CoalescingUpdateQueue(0)
+        queue.add('mac1', now=10)
+
+        self.assertEqual((set(), {'mac1'}), queue.pop_ready(now=10))
@@ -0,0 +1,108 @@
+# Copyright 2021, Guillermo Adrian Molina.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Unit tests for the Solaris VNIC agent generation index.
+"""
+
+import os
+
+import fixtures
+
+from neutron_solaris.agent.solarisvnic import vnic_index
+from neutron_solaris.common import state_file
+from neutron_solaris.solaris import net_lib
+from neutron_solaris.tests import base
+
+MAC1 = 'fa:16:3e:00:00:01'
+MAC2 = 'fa:16:3e:00:00:02'
+
+
+def _inventory(*vnics):
+    return net_lib.VNICInventory(
+        [net_lib.VNIC(link, mac, vid, 'net0', None)
+         for link, mac, vid in vnics])
+
+
+class TestVNICGenerationIndex(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestVNICGenerationIndex, self).setUp()
+        self.path = os.path.join(self.useFixture(fixtures.TempDir()).path,
+                                 'index.json')
+
+    def test_update(self):
+        index = vnic_index.VNICGenerationIndex()
+        index.update(_inventory(('vnic1', MAC1, '0'), ('vnic2', MAC2, '0')),
+                     now=10)
+        self.assertEqual({MAC1: 10, MAC2: 10},
+                         index.get_timestamps([MAC1, MAC2]))
+
+        # same identity keeps the generation, a re-created VNIC gets a new
+        # one and a removed VNIC is forgotten
+        index.update(_inventory(('vnic1', MAC1, '0'), ('vnic3', MAC2, '0')),
+                     now=20)
+        self.assertEqual({MAC1: 10, MAC2: 20},
+                         index.get_timestamps([MAC1, MAC2]))
+        self.assertEqual(1, index.get_generation(MAC1))
+        self.assertEqual(3, index.get_generation(MAC2))
+
+        index.update(_inventory(), now=30)
+        self.assertEqual({}, index.get_timestamps([MAC1, MAC2]))
+        self.assertIsNone(index.get_generation(MAC1))
+
+    def test_rebuild_same_identity(self):
+        index = vnic_index.VNICGenerationIndex()
+        index.update(_inventory(('vnic1', MAC1, '0')), {'vnic1': '10.5'},
+                     now=10)
+
+        # deleted and created again between two scans, with the same name,
+        # lower link, VLAN ID and MAC address
+        index.update(_inventory(('vnic1', MAC1, '0')), {'vnic1': '15.5'},
+                     now=20)
+
+        self.assertEqual(2, index.get_generation(MAC1))
+        self.assertEqual({MAC1: 20}, index.get_timestamps([MAC1]))
+
+    def test_crtime_unavailable(self):
+        index = vnic_index.VNICGenerationIndex()
+        index.update(_inventory(('vnic1', MAC1, '0')), now=10)
+        index.update(_inventory(('vnic1', MAC1, '0')), {'vnic1': '10.5'},
+                     now=20)
+        index.update(_inventory(('vnic1', MAC1, '0')), now=30)
+
+        self.assertEqual(1, index.get_generation(MAC1))
+
+        index.update(_inventory(('vnic1', MAC1, '0')), {'vnic1': '25.5'},
+                     now=40)
+
+        self.assertEqual(2, index.get_generation(MAC1))
+
+    def test_persistence(self):
+        index = vnic_index.VNICGenerationIndex(self.path)
+        index.update(_inventory(('vnic1', MAC1, '0')), now=10)
+
+        index = vnic_index.VNICGenerationIndex(self.path)
+        index.update(_inventory(('vnic1', MAC1, '0')), now=20)
+
+        self.assertEqual({MAC1: 10}, index.get_timestamps([MAC1]))
+        self.assertEqual(1, index.get_generation(MAC1))
+
+    def test_version_mismatch(self):
+        state_file.save(self.path, {'generation': 5, 'entries': {}}, 0)
+
+        index = vnic_index.VNICGenerationIndex(self.path)
+
+        self.assertEqual(0, index._generation)
@@ -0,0 +1,152 @@
+# Copyright 2021, Guillermo Adrian Molina.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Unit tests for the metrics module.
+"""
+
+import os
+from unittest import mock
+
+import fixtures
+
+from neutron_solaris.common import metrics
+from neutron_solaris.tests import base
+
+
+class TestMetricsRegistry(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestMetricsRegistry, self).setUp()
+        self.registry = metrics.MetricsRegistry()
+
+    def test_counter(self):
+        counter = self.registry.counter('requests', 'Requests.', ['verb'])
+        counter.inc(verb='get')
+        counter.inc(2, verb='get')
+        counter.inc(verb='put')
+
+        self.assertEqual(
+            '# TYPE requests counter\n'
+            '# HELP requests Requests.\n'
+            'requests_total{verb="get"} 3\n'
+            'requests_total{verb="put"} 1\n'
+            '# EOF\n',
+            self.registry.render())
+
+    def test_gauge(self):
+        gauge = self.registry.gauge('pending', 'Pending.')
+        gauge.set(4)
+        gauge.set(2)
+
+        self.assertIn('\npending 2\n', self.registry.render())
+
+    def test_histogram(self):
+        histogram = self.registry.histogram('latency', 'Latency.',
+                                            buckets=(0.1, 1))
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        histogram.observe(5)
+
+        self.assertEqual(
+            '# TYPE latency histogram\n'
+            '# HELP latency Latency.\n'
+            'latency_bucket{le="0.1"} 1\n'
+            'latency_bucket{le="1.0"} 2\n'
+            'latency_bucket{le="+Inf"} 3\n'
+            'latency_count 3\n'
+            'latency_sum 5.55\n'
+            '# EOF\n',
+            self.registry.render())
+
+    def test_label_values_are_escaped(self):
+        counter = self.registry.counter('requests', 'Requests.', ['verb'])
+        counter.inc(verb='a "b"\\')
+
+        self.assertIn('requests_total{verb="a \\"b\\"\\\\"} 1',
+                      self.registry.render())
+
+    def test_wrong_labels(self):
+        counter = self.registry.counter('requests', 'Requests.', ['verb'])
+        self.assertRaises(ValueError, counter.inc, method='get')
+
+    def test_register_twice(self):
+        counter = self.registry.counter('requests', 'Requests.')
+        self.assertIs(counter, self.registry.counter('requests', 'Other.'))
+        self.assertRaises(ValueError, self.registry.gauge, 'requests',
+                          'Requests.')
+
+    def test_timed_proxy(self):
+        histogram = self.registry.histogram('rpc', 'RPC.', ['method'])
+        obj = mock.Mock(timeout=30)
+        proxy = metrics.TimedProxy(obj, histogram)
+
+        proxy.report_state(1, key=2)
+
+        obj.report_state.assert_called_once_with(1, key=2)
+        self.assertEqual(1, histogram.get_count(method='report_state'))
+        self.assertEqual(30, proxy.timeout)
+
+
+class TestMetric(base.BaseTestCase):
+
+    def test_abstract(self):
+        class NoSamples(metrics._Metric):
+            TYPE = 'gauge'
+
+        self.assertRaises(TypeError, NoSamples, 'broken', 'Broken.')
+
+
+class TestMetricsExporter(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestMetricsExporter, self).setUp()
+        self.registry = metrics.MetricsRegistry()
+        self.registry.counter('requests', 'Requests.').inc()
+
+    def test_write(self):
+        path = os.path.join(self.useFixture(fixtures.TempDir()).path,
+                            'metrics', 'agent.prom')
+        exporter = metrics.MetricsExporter(self.registry, path=path)
+
+        self.assertTrue(exporter.enabled)
+        exporter.write()
+
+        with open(path) as f:
+            self.assertEqual(self.registry.render(), f.read())
+
+    def test_disabled(self):
+        self.assertFalse(metrics.MetricsExporter(self.registry).enabled)
+
+    def test_app(self):
+        exporter = metrics.MetricsExporter(self.registry, port=9795)
+        start_response = mock.Mock()
+
+        body = exporter._app({'REQUEST_METHOD': 'GET',
+                              'PATH_INFO': '/metrics'}, start_response)
+
+        self.assertEqual([self.registry.render().encode('utf-8')], body)
+        start_response.assert_called_once_with('200 OK', mock.ANY)
+        headers = dict(start_response.call_args[0][1])
+        self.assertEqual(metrics.CONTENT_TYPE, headers['Content-Type'])
+
+    def test_app_not_found(self):
+        exporter = metrics.MetricsExporter(self.registry, port=9795)
+        start_response = mock.Mock()
+
+        exporter._app({'REQUEST_METHOD': 'GET', 'PATH_INFO': '/other'},
+                      start_response)
+
+        start_response.assert_called_once_with('404 Not Found', mock.ANY)
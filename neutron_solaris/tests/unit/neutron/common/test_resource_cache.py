@@ -0,0 +1,124 @@
+# Copyright 2021, Guillermo Adrian Molina.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Unit tests for the cache of the Neutron API objects.
+"""
+
+from neutron_solaris.common import resource_cache
+from neutron_solaris.tests import base
+
+
+class TestResourceCache(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestResourceCache, self).setUp()
+        self.now = 100
+        self._cache = resource_cache.ResourceCache(
+            {'network': 60, 'port': 10, 'subnet': 0}, max_size=3,
+            negative_ttl=5, clock=lambda: self.now)
+
+    def test_ttl(self):
+        self._cache.set('network', 'net1', {'id': 'net1'})
+        self._cache.set('port', 'port1', {'id': 'port1'})
+
+        self.now = 110
+        self.assertIs(resource_cache.MISSING,
+                      self._cache.get('port', 'port1'))
+        self.now = 159
+        self.assertEqual({'id': 'net1'}, self._cache.get('network', 'net1'))
+        self.now = 160
+        self.assertIs(resource_cache.MISSING,
+                      self._cache.get('network', 'net1'))
+
+    def test_resource_not_cached(self):
+        self._cache.set('subnet', 'subnet1', {'id': 'subnet1'})
+
+        self.assertEqual(0, len(self._cache))
+
+    def test_lru(self):
+        for i in range(3):
+            self._cache.set('network', 'net%d' % i, {'id': i})
+        # net0 is now the most recently used one
+        self._cache.get('network', 'net0')
+        self._cache.set('port', 'port1', {'id': 'port1'})
+
+        self.assertIs(resource_cache.MISSING,
+                      self._cache.get('network', 'net1'))
+        self.assertEqual({'id': 0}, self._cache.get('network', 'net0'))
+        self.assertEqual(1, self._cache.get_stats()['evictions'])
+
+    def test_not_found(self):
+        self._cache.set_not_found('port', 'port1')
+
+        self.now = 104
+        self.assertIs(resource_cache.NOT_FOUND,
+                      self._cache.get('port', 'port1'))
+        self.now = 105
+        self.assertIs(resource_cache.MISSING,
+                      self._cache.get('port', 'port1'))
+
+    def test_stale_generation(self):
+        generation = self._cache.generation
+        self._cache.invalidate('port', 'port1')
+
+        # loaded before the invalidation, it may be stale
+        self._cache.set('port', 'port1', {'id': 'port1'}, generation)
+        self._cache.set_not_found('port', 'port2', generation)
+
+        self.assertEqual(0, len(self._cache))
+
+    def test_invalidate_network(self):
+        cache = resource_cache.ResourceCache(
+            {'network': 60, 'subnet': 60, 'port': 60})
+        cache.set('network', 'net1', {'id': 'net1', 'subnets': ['sub1']})
+        cache.set('subnet', 'sub1', {'id': 'sub1'})
+        cache.set('port', 'port1', {'id': 'port1', 'network_id': 'net1'})
+        cache.set_not_found('port', 'port2')
+
+        cache.invalidate_network('net1')
+
+        self.assertEqual(1, len(cache))
+        self.assertIs(resource_cache.NOT_FOUND, cache.get('port', 'port2'))
+
+    def test_handle_notification(self):
+        self._cache.set('network', 'net1', {'id': 'net1'})
+        self._cache.set('port', 'port1', {'id': 'port1'})
+        self._cache.set('port', 'port2', {'id': 'port2'})
+
+        self._cache.handle_notification('port.update.end',
+                                        {'port': {'id': 'port1'}})
+        self._cache.handle_notification('router.update.end',
+                                        {'router': {'id': 'router1'}})
+
+        self.assertIs(resource_cache.MISSING,
+                      self._cache.get('port', 'port1'))
+        self.assertEqual(2, len(self._cache))
+
+        self._cache.handle_notification('port.delete.end', {})
+        self.assertEqual(1, len(self._cache))
+
+    def test_invalidated_everywhere(self):
+        other = resource_cache.ResourceCache({'network': 60})
+        for cache in (self._cache, other):
+            cache.set('network', 'net1', {'id': 'net1'})
+            cache.set('network', 'net2', {'id': 'net2'})
+
+        resource_cache.invalidate_network('net1')
+        resource_cache.handle_notification('network.update.end',
+                                           {'network': {'id': 'net2'}})
+
+        self.assertEqual(0, len(self._cache))
+        self.assertEqual(0, len(other))
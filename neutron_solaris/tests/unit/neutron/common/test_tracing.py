@@ -0,0 +1,131 @@
+# Copyright 2021, Guillermo Adrian Molina.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Unit tests for the tracing module.
+"""
+
+import json
+import os
+from unittest import mock
+
+import fixtures
+
+from neutron_solaris.common import tracing
+from neutron_solaris.solaris import net_lib
+from neutron_solaris.solaris import packetfilter
+from neutron_solaris.tests import base
+
+
+class TestTracer(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestTracer, self).setUp()
+        self.tracer = tracing.Tracer()
+        self.collector = tracing.SpanCollector()
+
+    def test_disabled(self):
+        with self.tracer.span('root') as span:
+            span.set_attribute('key', 'value')
+
+        self.assertFalse(self.tracer.enabled)
+        self.assertIsNone(self.tracer.current_span())
+
+    def test_nested_spans(self):
+        self.tracer.configure(self.collector)
+
+        with self.tracer.span('root', device='d1') as root:
+            with self.tracer.span('child') as child:
+                self.assertIs(child, self.tracer.current_span())
+
+        self.assertEqual(['child', 'root'],
+                         [span.name for span in self.collector.spans])
+        self.assertEqual(root.span_id, child.parent_id)
+        self.assertEqual(root.trace_id, child.trace_id)
+        self.assertIsNone(root.parent_id)
+        self.assertEqual({'device': 'd1'}, root.attributes)
+        self.assertGreaterEqual(root.duration, child.duration)
+
+    def test_error(self):
+        self.tracer.configure(self.collector)
+
+        def _fail():
+            with self.tracer.span('root'):
+                raise ValueError('boom')
+
+        self.assertRaises(ValueError, _fail)
+        self.assertEqual('ValueError: boom', self.collector.spans[0].error)
+        self.assertIsNone(self.tracer.current_span())
+
+    @mock.patch.object(tracing.random, 'random', return_value=0.5)
+    def test_sampling(self, mock_random):
+        self.tracer.configure(self.collector, sample_rate=0.25)
+
+        with self.tracer.span('root'):
+            with self.tracer.span('child'):
+                pass
+
+        self.assertEqual(0, len(self.collector.spans))
+        # only the root spans draw
+        mock_random.assert_called_once_with()
+
+        self.tracer.configure(self.collector, sample_rate=0.75)
+        with self.tracer.span('root'):
+            with self.tracer.span('child'):
+                pass
+
+        self.assertEqual(2, len(self.collector.spans))
+
+    def test_json_lines_exporter(self):
+        path = os.path.join(self.useFixture(fixtures.TempDir()).path,
+                            'traces', 'agent.jsonl')
+        self.tracer.configure(tracing.JsonLinesExporter(path))
+
+        with self.tracer.span('root'):
+            with self.tracer.span('child', command='dladm show-vnic'):
+                pass
+        self.tracer.configure(None)
+
+        with open(path) as f:
+            spans = [json.loads(line) for line in f]
+        self.assertEqual(['child', 'root'], [span['name'] for span in spans])
+        self.assertEqual({'command': 'dladm show-vnic'},
+                         spans[0]['attributes'])
+        self.assertEqual(spans[1]['span_id'], spans[0]['parent_id'])
+        self.assertFalse(self.tracer.enabled)
+
+
+class TestHotPathTracing(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestHotPathTracing, self).setUp()
+        self.collector = tracing.SpanCollector()
+        tracing.TRACER.configure(self.collector)
+        self.addCleanup(tracing.TRACER.configure, None)
+
+    @mock.patch.object(net_lib.utils, 'execute', return_value='')
+    def test_packetfilter_commands(self, mock_execute):
+        pf = packetfilter.PacketFilter('_auto/neutron:l3:agent')
+
+        with tracing.span('port.setup', device='d1') as root:
+            pf.add_rules(['pass in all'], ['l3i1'])
+
+        spans = self.collector.get_trace(root.trace_id)
+        self.assertEqual(['command', 'pf.add_rules', 'port.setup'],
+                         [span.name for span in spans])
+        command, add_rules, _ = spans
+        self.assertEqual(add_rules.span_id, command.parent_id)
+        self.assertEqual(root.span_id, add_rules.parent_id)
+        self.assertEqual('pfctl', command.attributes['command'])
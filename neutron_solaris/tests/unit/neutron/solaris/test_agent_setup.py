@@ -0,0 +1,195 @@
+# Copyright 2021, Guillermo Adrian Molina.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Unit tests for the process wide set up of the Solaris drivers.
+"""
+
+import os
+from unittest import mock
+
+import fixtures
+
+from neutron_solaris.solaris import agent_setup
+from neutron_solaris.solaris import interface
+from neutron_solaris.solaris import net_lib
+from neutron_solaris.tests import base
+from neutron_solaris.tests.unit.neutron.solaris import test_interface
+
+
+class TestAgentSetup(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestAgentSetup, self).setUp()
+        mock.patch.object(agent_setup, '_done', False).start()
+        mock.patch.object(net_lib.CommandBase, 'command_daemon',
+                          None).start()
+        self.mock_client = mock.patch.object(
+            agent_setup.pfexec_daemon, 'PfexecDaemonClient').start()
+        mock.patch.object(agent_setup.tracing, 'TRACER',
+                          agent_setup.tracing.Tracer()).start()
+        mock.patch.object(net_lib.Datalink, 'lower_links',
+                          net_lib.LowerLinkCache()).start()
+        self.mock_looping_call = mock.patch.object(
+            agent_setup.loopingcall, 'FixedIntervalLoopingCall').start()
+        self.mock_exporter = mock.patch.object(
+            agent_setup.metrics, 'MetricsExporter').start()
+        mock.patch.object(agent_setup, '_metrics_exporter', None).start()
+        mock.patch.object(agent_setup, '_metrics_write', None).start()
+
+    def test_setup_disabled(self):
+        agent_setup.setup()
+
+        self.mock_client.assert_not_called()
+        self.assertIsNone(net_lib.CommandBase.command_daemon)
+        self.assertFalse(agent_setup.tracing.TRACER.enabled)
+
+    def test_setup_command_daemon(self):
+        self.config(use_pfexec_daemon=True, pfexec_daemon_workers=2,
+                    pfexec_daemon_allowed_commands=['/usr/sbin/dladm'],
+                    group='SOLARIS')
+
+        agent_setup.setup()
+        agent_setup.setup()
+
+        self.mock_client.assert_called_once_with(['/usr/sbin/dladm'],
+                                                 workers=2)
+        self.assertIs(self.mock_client.return_value,
+                      net_lib.CommandBase.command_daemon)
+
+    def test_setup_tracing(self):
+        trace_file = os.path.join(
+            self.useFixture(fixtures.TempDir()).path, 'trace.json')
+        self.config(trace_file=trace_file, trace_sample_rate=0.5,
+                    group='SOLARIS')
+
+        agent_setup.setup()
+
+        tracer = agent_setup.tracing.TRACER
+        self.assertTrue(tracer.enabled)
+        self.assertEqual(trace_file, tracer.exporter.path)
+        self.assertEqual(0.5, tracer.sample_rate)
+
+    def test_setup_lower_links(self):
+        self.config(lower_link_refresh_interval=60, group='SOLARIS')
+
+        agent_setup.setup()
+
+        self.assertEqual(120, net_lib.Datalink.lower_links.max_age)
+        self.mock_looping_call.assert_called_once_with(
+            agent_setup._refresh_lower_links)
+        self.mock_looping_call.return_value.start.assert_called_once_with(
+            interval=60, initial_delay=60)
+
+    def test_setup_lower_links_no_refresh(self):
+        self.config(lower_link_refresh_interval=0, group='SOLARIS')
+
+        agent_setup.setup()
+
+        self.assertEqual(0, net_lib.Datalink.lower_links.max_age)
+        self.mock_looping_call.assert_not_called()
+
+    def test_setup_metrics_disabled(self):
+        self.mock_exporter.return_value.enabled = False
+
+        agent_setup.setup()
+
+        self.mock_exporter.return_value.start.assert_not_called()
+        self.assertIsNone(agent_setup.get_metrics_exporter())
+
+    @mock.patch.object(agent_setup.sys, 'argv', ['/usr/bin/neutron-l3-agent'])
+    def test_setup_metrics(self):
+        self.config(lower_link_refresh_interval=0, metrics_port=9100,
+                    metrics_file='/var/lib/neutron/{process}.prom',
+                    metrics_write_interval=30, group='SOLARIS')
+
+        agent_setup.setup()
+
+        self.mock_exporter.assert_called_once_with(
+            agent_setup.metrics.REGISTRY, listen_address='127.0.0.1',
+            port=9100, path='/var/lib/neutron/neutron-l3-agent.prom')
+        exporter = self.mock_exporter.return_value
+        exporter.start.assert_called_once_with()
+        self.assertIs(exporter, agent_setup.get_metrics_exporter())
+        self.mock_looping_call.assert_called_once_with(exporter.write)
+        self.mock_looping_call.return_value.start.assert_called_once_with(
+            interval=30, initial_delay=30)
+
+    def test_setup_metrics_port_in_use(self):
+        self.config(lower_link_refresh_interval=0, metrics_port=9100,
+                    group='SOLARIS')
+        exporter = self.mock_exporter.return_value
+        exporter.start.side_effect = OSError()
+
+        agent_setup.setup()
+
+        # the file is still written
+        self.assertIs(exporter, agent_setup.get_metrics_exporter())
+        self.mock_looping_call.assert_not_called()
+
+    def test_shutdown_metrics(self):
+        self.config(lower_link_refresh_interval=0, metrics_file='m.prom',
+                    group='SOLARIS')
+        agent_setup.setup()
+
+        agent_setup.shutdown()
+        agent_setup.shutdown()
+
+        exporter = self.mock_exporter.return_value
+        exporter.write.assert_called_once_with()
+        exporter.stop.assert_called_once_with()
+        self.mock_looping_call.return_value.stop.assert_called_once_with()
+        self.assertIsNone(agent_setup.get_metrics_exporter())
+
+    @mock.patch.object(net_lib.Datalink, 'get_lower_link')
+    def test_load_lower_links(self, mock_get_lower_link):
+        interface.SolarisInterfaceDriver(test_interface.make_conf(
+            physical_interface_mappings=['physnet1:net0', 'physnet2:net1']))
+
+        self.assertIn('net0', net_lib.Datalink.lower_links)
+        self.assertIn('net1', net_lib.Datalink.lower_links)
+
+    @mock.patch.object(net_lib.Datalink, 'get_lower_link')
+    def test_load_lower_links_failure(self, mock_get_lower_link):
+        mock_get_lower_link.side_effect = RuntimeError()
+
+        agent_setup.load_lower_links(['net0'])
+
+        self.assertNotIn('net0', net_lib.Datalink.lower_links)
+
+    def test_shutdown(self):
+        self.config(use_pfexec_daemon=True, group='SOLARIS')
+        self.mock_exporter.return_value.enabled = False
+        self.config(trace_file='trace.json', group='SOLARIS')
+        agent_setup.setup()
+
+        agent_setup.shutdown()
+        agent_setup.shutdown()
+
+        self.mock_client.return_value.stop.assert_called_once_with()
+        self.mock_looping_call.return_value.stop.assert_called_once_with()
+        self.assertIsNone(net_lib.CommandBase.command_daemon)
+        self.assertFalse(agent_setup.tracing.TRACER.enabled)
+        # the daemon is started again by the next set up
+        agent_setup.setup()
+        self.assertEqual(2, self.mock_client.call_count)
+
+    def test_interface_driver(self):
+        self.config(use_pfexec_daemon=True, group='SOLARIS')
+
+        interface.OVSInterfaceDriver(test_interface.make_conf())
+        interface.SolarisInterfaceDriver(test_interface.make_conf())
+
+        self.mock_client.assert_called_once_with(mock.ANY, workers=4)
@@ -0,0 +1,94 @@
+# Copyright 2021, Guillermo Adrian Molina.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Unit tests for the bridge_mappings resolver.
+"""
+
+from unittest import mock
+
+from neutron_solaris.solaris import bridge_mappings
+from neutron_solaris.tests import base
+
+
+class TestParseBridgeMappings(base.BaseTestCase):
+
+    def test_parse(self):
+        self.assertEqual(
+            {'physnet1': 'net0', 'physnet10': 'aggr0'},
+            bridge_mappings.parse_bridge_mappings(
+                'physnet1:net0, physnet10:aggr0,bogus,:net1'))
+
+
+class TestBridgeMappingResolver(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestBridgeMappingResolver, self).setUp()
+        self.now = 1000.0
+        self.reader = mock.Mock(return_value={
+            'bridge_mappings': 'physnet10:aggr0,physnet1:net0'})
+        self.monitor = mock.Mock()
+        self.monitor.is_active.return_value = True
+        self.monitor.iter_stdout.return_value = iter([])
+        self.resolver = bridge_mappings.BridgeMappingResolver(
+            monitor=self.monitor, reader=self.reader, clock=lambda: self.now)
+
+    def test_exact_match(self):
+        # physnet1 is a substring of physnet10, listed first
+        self.assertEqual('net0', self.resolver.resolve('physnet1'))
+        self.assertEqual('aggr0', self.resolver.resolve('physnet10'))
+        self.assertEqual(1, self.reader.call_count)
+
+    def test_monitor_invalidates(self):
+        self.resolver.resolve('physnet1')
+        self.now += 3600
+        self.resolver.resolve('physnet1')
+        self.assertEqual(1, self.reader.call_count)
+
+        self.reader.return_value = {'bridge_mappings': 'physnet1:net1'}
+        self.monitor.iter_stdout.return_value = iter(['row changed'])
+
+        self.assertEqual('net1', self.resolver.resolve('physnet1'))
+        self.assertEqual(2, self.reader.call_count)
+        self.assertEqual(2, self.resolver.generation)
+
+    def test_max_age_without_monitor(self):
+        self.monitor.is_active.return_value = False
+
+        self.resolver.resolve('physnet1')
+        self.now += 59
+        self.resolver.resolve('physnet1')
+        self.assertEqual(1, self.reader.call_count)
+
+        self.now += 1
+        self.resolver.resolve('physnet1')
+        self.assertEqual(2, self.reader.call_count)
+
+    def test_unknown_physnet_reloads(self):
+        self.resolver.resolve('physnet1')
+        self.reader.return_value = {'bridge_mappings': 'physnet2:net2'}
+
+        self.assertEqual('net2', self.resolver.resolve('physnet2'))
+        self.assertIsNone(self.resolver.resolve('physnet3'))
+        self.assertEqual(3, self.reader.call_count)
+
+    def test_not_configured(self):
+        self.reader.return_value = {}
+        self.assertRaises(bridge_mappings.BridgeMappingError,
+                          self.resolver.resolve, 'physnet1')
+
+        self.reader.return_value = {'other': 'value'}
+        self.assertRaises(bridge_mappings.BridgeMappingError,
+                          self.resolver.resolve, 'physnet1')
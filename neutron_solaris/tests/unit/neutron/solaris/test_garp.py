@@ -0,0 +1,231 @@
+# Copyright 2021, Guillermo Adrian Molina.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Unit tests for the gratuitous ARP engine.
+"""
+
+from unittest import mock
+
+from neutron_solaris.solaris import garp
+from neutron_solaris.solaris import net_lib
+from neutron_solaris.tests import base
+
+MAC1 = 'fa:16:3e:00:00:01'
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TestBuildGarpFrame(base.BaseTestCase):
+
+    def test_frame(self):
+        frame = garp.build_garp_frame('2:8:20:d2:1c:3e', '10.0.0.2')
+
+        self.assertEqual(60, len(frame))
+        self.assertEqual(b'\xff' * 6, frame[0:6])
+        self.assertEqual(b'\x02\x08\x20\xd2\x1c\x3e', frame[6:12])
+        self.assertEqual(b'\x08\x06', frame[12:14])
+        # Ethernet/IPv4, reply
+        self.assertEqual(b'\x00\x01\x08\x00\x06\x04\x00\x02', frame[14:22])
+        self.assertEqual(b'\x02\x08\x20\xd2\x1c\x3e\x0a\x00\x00\x02',
+                         frame[22:32])
+        self.assertEqual(b'\xff' * 6 + b'\x0a\x00\x00\x02', frame[32:42])
+        self.assertEqual(b'\x00' * 18, frame[42:])
+
+
+class TestRateLimiter(base.BaseTestCase):
+
+    def test_rate(self):
+        clock = FakeClock()
+        limiter = garp.RateLimiter(10, burst=2, clock=clock.time,
+                                   sleep=clock.sleep)
+
+        for _ in range(4):
+            limiter.acquire()
+
+        # the burst is free, then one token every 0.1s
+        self.assertAlmostEqual(1000.2, clock.now)
+
+
+class TestGarpEngine(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestGarpEngine, self).setUp()
+        self.clock = FakeClock()
+        self.transport = garp.CaptureTransport(clock=self.clock.time)
+        self.macs = {'vnic0': MAC1, 'vnic1': 'fa:16:3e:00:00:02'}
+        self.engine = garp.GarpEngine(
+            self.transport, self.macs.get, rate=100, interval=1.0,
+            jitter=0.0, clock=self.clock.time, sleep=self.clock.sleep)
+
+    def test_rounds(self):
+        self.engine.announce('vnic0', '10.0.0.2', 3)
+        self.engine.announce('vnic0', '10.0.0.3', 1)
+        self.engine.announce('vnic1', '10.0.1.2', 2)
+        self.engine.wait()
+
+        self.assertEqual(
+            [(1000.0, 'vnic0', garp.build_garp_frame(MAC1, '10.0.0.2')),
+             (1000.0, 'vnic0', garp.build_garp_frame(MAC1, '10.0.0.3'))],
+            self.transport.frames[:2])
+        self.assertEqual([(1000.0, 'vnic1'), (1001.0, 'vnic0'),
+                          (1001.0, 'vnic1'), (1002.0, 'vnic0')],
+                         [frame[:2] for frame in self.transport.frames[2:]])
+        self.assertEqual(0, self.engine.pending())
+        self.assertEqual(6, self.engine.stats['sent'])
+
+    def test_coalesce(self):
+        self.engine.announce('vnic0', '10.0.0.2', 1)
+        self.engine.announce('vnic0', '10.0.0.2', 2)
+        self.engine.wait()
+
+        self.assertEqual(2, len(self.transport.frames))
+        self.assertEqual(1, self.engine.stats['coalesced'])
+
+    def test_rate_limit(self):
+        engine = garp.GarpEngine(
+            self.transport, self.macs.get, rate=10, jitter=0.0,
+            clock=self.clock.time, sleep=self.clock.sleep)
+        for i in range(20):
+            engine.announce('vnic0', '10.0.0.%d' % i, 1)
+        engine.wait()
+
+        times = [frame[0] for frame in self.transport.frames]
+        self.assertEqual(20, len(times))
+        self.assertAlmostEqual(1.0, times[-1] - times[0])
+
+    def test_jitter(self):
+        engine = garp.GarpEngine(
+            self.transport, self.macs.get, jitter=0.5,
+            clock=self.clock.time, sleep=self.clock.sleep)
+        with mock.patch.object(garp.random, 'uniform', return_value=0.25):
+            engine.announce('vnic0', '10.0.0.2', 2)
+            engine.wait()
+
+        self.assertEqual([1000.25, 1001.5],
+                         [frame[0] for frame in self.transport.frames])
+
+    def test_send_failure(self):
+        transport = mock.Mock(spec=garp.Transport)
+        transport.send.side_effect = garp.TransportError('link gone')
+        engine = garp.GarpEngine(transport, self.macs.get, jitter=0.0,
+                                 clock=self.clock.time,
+                                 sleep=self.clock.sleep)
+
+        engine.announce('vnic0', '10.0.0.2', 3)
+        engine.announce('vnic9', '10.0.9.2', 3)
+        engine.wait()
+
+        transport.send.assert_called_once_with(
+            'vnic0', garp.build_garp_frame(MAC1, '10.0.0.2'))
+        self.assertEqual(2, engine.stats['failed'])
+        self.assertEqual(0, engine.pending())
+
+    @mock.patch.object(garp.eventlet, 'spawn_n')
+    def test_send_failure_fallback(self, mock_spawn):
+        transport = mock.Mock(spec=garp.Transport)
+        transport.send.side_effect = garp.TransportError('no privilege')
+        fallback = mock.Mock()
+        engine = garp.GarpEngine(transport, self.macs.get, jitter=0.0,
+                                 clock=self.clock.time,
+                                 sleep=self.clock.sleep, fallback=fallback)
+
+        engine.announce('vnic0', '10.0.0.2', 3)
+        engine.announce('vnic0', '10.0.0.3', 2)
+        # no MAC address, the interface is gone
+        engine.announce('vnic9', '10.0.9.2', 3)
+        engine.wait()
+
+        self.assertEqual([mock.call(fallback, 'vnic0', '10.0.0.2', 3),
+                          mock.call(fallback, 'vnic0', '10.0.0.3', 2)],
+                         mock_spawn.call_args_list)
+        self.assertEqual(2, engine.stats['fallback'])
+        self.assertEqual(1, engine.stats['failed'])
+        self.assertEqual(0, engine.pending())
+
+
+class TestDlpiTransport(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestDlpiTransport, self).setUp()
+        self.libdlpi = mock.Mock()
+        self.libdlpi.dlpi_open.return_value = garp.DlpiTransport.DLPI_SUCCESS
+        self.libdlpi.dlpi_bind.return_value = garp.DlpiTransport.DLPI_SUCCESS
+        self.libdlpi.dlpi_send.return_value = garp.DlpiTransport.DLPI_SUCCESS
+        self.libc = mock.Mock()
+
+    def test_privileged(self):
+        self.libc.priv_ineffect.return_value = 1
+        transport = garp.DlpiTransport(self.libdlpi, self.libc)
+
+        transport.send('vnic0', b'frame')
+
+        self.libc.priv_ineffect.assert_called_once_with(b'net_rawaccess')
+        self.libdlpi.dlpi_send.assert_called_once_with(
+            mock.ANY, None, 0, b'frame', 5, None)
+
+    def test_unprivileged(self):
+        self.libc.priv_ineffect.return_value = 0
+
+        self.assertRaises(garp.TransportError, garp.DlpiTransport,
+                          self.libdlpi, self.libc)
+        self.libdlpi.dlpi_open.assert_not_called()
+
+    def test_no_privileges(self):
+        # not Solaris, libc has no priv_ineffect()
+        self.assertRaises(garp.TransportError, garp.DlpiTransport,
+                          self.libdlpi, mock.Mock(spec=[]))
+
+
+class TestSendIpAddrAdvNotif(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestSendIpAddrAdvNotif, self).setUp()
+        self.config = mock.Mock(send_arp_for_ha=3)
+
+    @mock.patch.object(net_lib, 'get_garp_engine')
+    def test_engine(self, mock_get_engine):
+        net_lib.send_ip_addr_adv_notif('vnic0', '10.0.0.2', self.config)
+        net_lib.send_ip_addr_adv_notif('vnic0', '2001:db8::2', self.config)
+
+        mock_get_engine.return_value.announce.assert_called_once_with(
+            'vnic0', '10.0.0.2', 3)
+
+    @mock.patch.object(net_lib.eventlet, 'spawn_n')
+    @mock.patch.object(net_lib, 'get_garp_engine', return_value=None)
+    def test_arping_fallback(self, mock_get_engine, mock_spawn):
+        net_lib.send_ip_addr_adv_notif('vnic0', '10.0.0.2', self.config)
+
+        mock_spawn.assert_called_once_with(mock.ANY)
+
+    @mock.patch.object(net_lib.garp, 'default_transport')
+    def test_get_garp_engine(self, mock_transport):
+        mock.patch.object(net_lib, '_GARP_ENGINE', None).start()
+
+        engine = net_lib.get_garp_engine()
+
+        self.assertIs(mock_transport.return_value, engine.transport)
+        # the addresses the transport fails to send are arping'ed
+        self.assertIs(net_lib._arping, engine._fallback)
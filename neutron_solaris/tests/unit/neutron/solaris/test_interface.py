@@ -0,0 +1,382 @@
+# Copyright 2021, Guillermo Adrian Molina.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Unit tests for the Solaris interface drivers.
+"""
+
+from unittest import mock
+
+from neutron_lib import exceptions
+from oslo_config import cfg
+
+from neutron_solaris.solaris import bridge_mappings
+from neutron_solaris.solaris import interface
+from neutron_solaris.solaris import net_lib
+from neutron_solaris.solaris import vnic_pool
+from neutron_solaris.tests import base
+from neutron_solaris.tests import tools
+
+
+def make_conf(**overrides):
+    conf = cfg.ConfigOpts()
+    conf.register_opts(interface.OPTS)
+    conf.register_opt(cfg.StrOpt('ovs_integration_bridge', default='br_int0'))
+    conf([])
+    for name, value in overrides.items():
+        conf.set_override(name, value)
+    return conf
+
+
+class DriverTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(DriverTestCase, self).setUp()
+        # the process wide set up is covered by test_agent_setup
+        mock.patch.object(interface.agent_setup, 'setup').start()
+
+
+class TestOVSInterfaceDriverBridgeMappings(DriverTestCase):
+
+    def setUp(self):
+        super(TestOVSInterfaceDriverBridgeMappings, self).setUp()
+        self.driver = interface.OVSInterfaceDriver(make_conf())
+        self.resolver = bridge_mappings.BridgeMappingResolver(
+            reader=mock.Mock(return_value={
+                'bridge_mappings': 'physnet1:net0,physnet10:aggr0'}))
+        self.driver._bridge_mappings = self.resolver
+
+    @mock.patch.object(interface.ovsdb_monitor, 'OvsdbMonitor')
+    def test_bridge_mappings_monitored(self, mock_monitor):
+        driver = interface.OVSInterfaceDriver(make_conf())
+
+        resolver = driver.bridge_mappings
+
+        self.assertIs(resolver, driver.bridge_mappings)
+        mock_monitor.assert_called_once_with(
+            'Open_vSwitch', columns=['other_config'], respawn_interval=30)
+        mock_monitor.return_value.start.assert_called_once_with()
+        self.assertIs(mock_monitor.return_value, resolver._monitor)
+
+    @mock.patch.object(interface.ovsdb_monitor, 'OvsdbMonitor')
+    def test_bridge_mappings_monitor_failure(self, mock_monitor):
+        mock_monitor.return_value.start.side_effect = RuntimeError('no ovs')
+        driver = interface.OVSInterfaceDriver(make_conf())
+
+        self.assertIsNone(driver.bridge_mappings._monitor)
+
+    def test_get_lower_link_vlan(self):
+        network = {'provider:network_type': 'vlan',
+                   'provider:physical_network': 'physnet10',
+                   'provider:segmentation_id': 100}
+
+        self.assertEqual(('aggr0', 100), self.driver._get_lower_link(
+            'dh0_0', network, 'br_ex0'))
+        # the OVS agent tags the ports of the integration bridge
+        self.assertEqual(('aggr0', None), self.driver._get_lower_link(
+            'dh0_0', network, 'br_int0'))
+
+    def test_get_lower_link_vxlan(self):
+        network = {'provider:network_type': 'vxlan'}
+
+        self.assertEqual(('ovs.vxlan1', None), self.driver._get_lower_link(
+            'dh0_0', network, 'br_int0'))
+
+    def test_get_lower_link_unmapped(self):
+        network = {'provider:network_type': 'flat',
+                   'provider:physical_network': 'physnet2'}
+
+        self.assertRaises(exceptions.Invalid, self.driver._get_lower_link,
+                          'dh0_0', network, 'br_int0')
+
+    def test_get_lower_link_not_configured(self):
+        self.resolver._reader.return_value = {}
+        network = {'provider:network_type': 'flat',
+                   'provider:physical_network': 'physnet1'}
+
+        self.assertRaises(exceptions.Invalid, self.driver._get_lower_link,
+                          'dh0_0', network, 'br_int0')
+
+    def test_get_lower_link_unsupported(self):
+        network = {'provider:network_type': 'gre'}
+
+        self.assertRaises(exceptions.Invalid, self.driver._get_lower_link,
+                          'dh0_0', network, 'br_int0')
+
+
+class TestOVSInterfaceDriverMany(DriverTestCase):
+
+    NETWORK = {'provider:network_type': 'vlan',
+               'provider:physical_network': 'physnet1',
+               'provider:segmentation_id': 100}
+
+    def setUp(self):
+        super(TestOVSInterfaceDriverMany, self).setUp()
+        self.sim = self.useFixture(tools.SolarisSimulatorFixture()).simulator
+        self.ovs = mock.MagicMock(br_name='br_int0')
+        mock.patch.object(interface.ovs_lib, 'OVSBridge',
+                          return_value=self.ovs).start()
+        self.txn = self.ovs.ovsdb.transaction.return_value.__enter__()
+        self.driver = interface.OVSInterfaceDriver(make_conf())
+        self.driver._bridge_mappings = bridge_mappings.BridgeMappingResolver(
+            reader=mock.Mock(return_value={
+                'bridge_mappings': 'physnet1:net0'}))
+
+    def _port(self, i, **kwargs):
+        port = {'network_id': 'net1', 'port_id': 'port%d' % i,
+                'datalink_name': 'dh%d_0' % i,
+                'mac_address': 'fa:16:3e:00:00:%02x' % i,
+                'network': self.NETWORK, 'mtu': 1400}
+        port.update(kwargs)
+        return port
+
+    def test_plug_many(self):
+        errors = self.driver.plug_many([self._port(i) for i in range(3)])
+
+        self.assertEqual({}, errors)
+        # all the ports are added in a single transaction
+        self.ovs.ovsdb.transaction.assert_called_once_with(check_error=True)
+        self.assertEqual(
+            [mock.call('br_int0', 'dh%d_0' % i, may_exist=False)
+             for i in range(3)],
+            self.ovs.ovsdb.add_port.call_args_list)
+        self.ovs.ovsdb.db_set.assert_any_call(
+            'Interface', 'dh1_0',
+            ('external_ids', {'iface-id': 'port1',
+                              'iface-status': 'active',
+                              'attached-mac': 'fa:16:3e:00:00:01'}))
+        self.assertEqual(9, self.txn.add.call_count)
+        for i in range(3):
+            link = self.sim.links['dh%d_0' % i]
+            self.assertEqual('net0', link.over)
+            self.assertTrue(link.temporary)
+            self.assertEqual('1400', link.props['mtu'])
+
+    def test_plug_many_existing(self):
+        self.sim.add_vnic('dh0_0', 'net0')
+
+        errors = self.driver.plug_many([self._port(0), self._port(1)])
+
+        self.assertEqual({}, errors)
+        self.ovs.ovsdb.add_port.assert_called_once_with(
+            'br_int0', 'dh1_0', may_exist=False)
+
+    def test_plug_many_partial_failure(self):
+        # the MAC address of the second port is in use over net0
+        self.sim.add_vnic('vnic0', 'net0', mac='fa:16:3e:00:00:01')
+        unmapped = dict(self.NETWORK,
+                        **{'provider:physical_network': 'physnet2'})
+
+        errors = self.driver.plug_many([self._port(0), self._port(1),
+                                        self._port(2, network=unmapped)])
+
+        self.assertEqual({'dh1_0', 'dh2_0'}, set(errors))
+        self.assertIsInstance(errors['dh2_0'], exceptions.Invalid)
+        self.assertNotIn('dh1_0', self.sim.links)
+        # the ports that did not fail are still plugged
+        self.ovs.ovsdb.add_port.assert_called_once_with(
+            'br_int0', 'dh0_0', may_exist=False)
+        self.assertIn('dh0_0', self.sim.links)
+
+    def test_plug_many_transaction_failure(self):
+        error = RuntimeError('ovsdb failed')
+        self.ovs.ovsdb.transaction.return_value.__exit__.side_effect = error
+
+        errors = self.driver.plug_many([self._port(i) for i in range(2)])
+
+        self.assertEqual({'dh0_0': error, 'dh1_0': error}, errors)
+        # the VNICs created for them are deleted again
+        self.assertNotIn('dh0_0', self.sim.links)
+        self.assertNotIn('dh1_0', self.sim.links)
+        self.assertEqual(2, self.sim.calls['dladm delete-vnic'])
+
+    def test_plug_many_nothing_created(self):
+        self.sim.add_vnic('dh0_0', 'net0')
+
+        self.assertEqual({}, self.driver.plug_many([self._port(0)]))
+        self.ovs.ovsdb.transaction.assert_not_called()
+
+    def test_unplug_many(self):
+        for i in range(3):
+            self.sim.add_vnic('dh%d_0' % i, 'net0')
+        net_lib.IPInterface('dh1_0').create_address('10.0.0.2/24')
+
+        errors = self.driver.unplug_many(['dh0_0', 'dh1_0', 'dh2_0'])
+
+        self.assertEqual({}, errors)
+        self.assertEqual(['net0'], list(self.sim.links))
+        self.assertEqual({}, self.sim.ip_interfaces)
+        self.ovs.ovsdb.transaction.assert_called_once_with(check_error=True)
+        self.assertEqual([mock.call('dh%d_0' % i, 'br_int0')
+                          for i in range(3)],
+                         self.ovs.ovsdb.del_port.call_args_list)
+
+    def test_unplug_many_partial_failure(self):
+        self.sim.add_vnic('dh0_0', 'net0')
+
+        # net0 is not a VNIC, it can not be deleted
+        errors = self.driver.unplug_many(['dh0_0', 'net0'])
+
+        self.assertEqual(['net0'], list(errors))
+        self.assertNotIn('dh0_0', self.sim.links)
+        self.ovs.ovsdb.del_port.assert_called_once_with('dh0_0', 'br_int0')
+
+    def test_unplug_many_transaction_failure(self):
+        self.sim.add_vnic('dh0_0', 'net0')
+        error = RuntimeError('ovsdb failed')
+        self.ovs.ovsdb.transaction.return_value.__exit__.side_effect = error
+
+        errors = self.driver.unplug_many(['dh0_0'])
+
+        self.assertEqual({'dh0_0': error}, errors)
+        self.assertNotIn('dh0_0', self.sim.links)
+
+
+class TestSolarisInterfaceDriver(DriverTestCase):
+
+    MAC = 'fa:16:3e:00:00:01'
+    NETWORK = {'provider:network_type': 'vlan',
+               'provider:physical_network': 'physnet1',
+               'provider:segmentation_id': 100}
+
+    def setUp(self):
+        super(TestSolarisInterfaceDriver, self).setUp()
+        self.sim = self.useFixture(tools.SolarisSimulatorFixture()).simulator
+        self.pool = vnic_pool.VNICPool(1, keys=[('net0', '100')])
+        mock.patch.object(interface, '_vnic_pool', self.pool).start()
+        self.driver = interface.SolarisInterfaceDriver(make_conf(
+            physical_interface_mappings=['physnet1:net0'],
+            vnic_pool_size=1))
+
+    def _plug(self, mtu=None, mac=MAC):
+        self.driver.plug('tenant1', 'net1', 'port1', 'dh0_0', mac,
+                         network=self.NETWORK, mtu=mtu)
+
+    def test_get_lower_link(self):
+        flat = {'provider:network_type': 'flat',
+                'provider:physical_network': 'physnet1'}
+        unmapped = dict(flat, **{'provider:physical_network': 'physnet2'})
+
+        self.assertEqual(('net0', '100'), self.driver._get_lower_link(
+            'dh0_0', self.NETWORK))
+        self.assertEqual(('net0', None), self.driver._get_lower_link(
+            'dh0_0', flat))
+        self.assertRaises(exceptions.Invalid, self.driver._get_lower_link,
+                          'dh0_0', unmapped)
+
+    def test_plug_from_pool(self):
+        self.pool.refill()
+        self.sim.calls.clear()
+
+        self._plug(mtu=1400)
+
+        link = self.sim.links['dh0_0']
+        self.assertEqual(self.MAC, link.mac)
+        self.assertEqual('100', link.vid)
+        self.assertEqual('1400', link.props['mtu'])
+        self.assertNotIn('vpool0', self.sim.links)
+        self.assertNotIn('dladm create-vnic', self.sim.calls)
+
+    def test_plug_empty_pool(self):
+        self._plug(mtu=1400)
+
+        link = self.sim.links['dh0_0']
+        self.assertEqual(self.MAC, link.mac)
+        self.assertEqual('100', link.vid)
+        self.assertEqual('1400', link.props['mtu'])
+        self.assertEqual(1, self.sim.calls['dladm create-vnic'])
+
+    def test_unplug_to_pool(self):
+        self.sim.add_vnic('dh0_0', 'net0', mac=self.MAC, vid='100')
+
+        self.driver.unplug('dh0_0')
+
+        self.assertNotIn('dh0_0', self.sim.links)
+        self.assertIn('vpool0', self.sim.links)
+        self.assertEqual(1, self.pool.available())
+        self.assertNotIn('dladm delete-vnic', self.sim.calls)
+
+    def test_unplug_full_pool(self):
+        self.pool.refill()
+        self.sim.add_vnic('dh0_0', 'net0', mac=self.MAC, vid='100')
+
+        self.driver.unplug('dh0_0')
+
+        self.assertNotIn('dh0_0', self.sim.links)
+        self.assertEqual(['net0', 'vpool0'], list(self.sim.links))
+        self.assertEqual(1, self.sim.calls['dladm delete-vnic'])
+
+    def test_unplug_missing(self):
+        self.driver.unplug('dh0_0')
+
+        self.assertEqual(0, self.pool.available())
+
+    def test_recycled_mtu(self):
+        self._plug(mtu=9000)
+        self.driver.unplug('dh0_0')
+        self.assertEqual('1500', self.sim.links['vpool0'].props['mtu'])
+
+        # the next port plugged without an MTU gets the lower link one
+        self._plug(mac='fa:16:3e:00:00:02')
+
+        self.assertNotIn('vpool0', self.sim.links)
+        self.assertEqual('1500', self.sim.links['dh0_0'].props['mtu'])
+
+
+class TestGetClientAndCache(DriverTestCase):
+
+    def setUp(self):
+        super(TestGetClientAndCache, self).setUp()
+        mock.patch.object(interface, '_clients', {}).start()
+        self.factory = mock.patch.object(
+            interface.neutron_client_lib, 'CLIENT_FACTORY').start()
+        self.factory.get_password_client.side_effect = (
+            lambda *args, **kwargs: mock.MagicMock())
+
+    def test_shared(self):
+        conf = make_conf(admin_user='neutron', network_cache_ttl=30)
+
+        client, cache = interface._get_client_and_cache(conf)
+
+        self.assertIs(client, interface.get_neutron_client(make_conf(
+            admin_user='neutron', network_cache_ttl=30)))
+        self.assertIs(cache, interface.get_network_cache(conf))
+        self.assertEqual(30, cache.ttl)
+        self.factory.get_password_client.assert_called_once_with(
+            None, 'neutron', None, tenant_name=None, project_name=None,
+            project_domain_name=None, user_domain_name=None, trust_id=None,
+            region_name=None, auth_strategy='keystone',
+            endpoint_type='publicURL')
+        # the cache looks the objects up with the shared client
+        cache.get_network('net1')
+        client.show_network.assert_called_once_with('net1')
+
+    def test_per_credentials(self):
+        client, cache = interface._get_client_and_cache(
+            make_conf(admin_user='neutron'))
+        other_client, other_cache = interface._get_client_and_cache(
+            make_conf(admin_user='admin'))
+
+        self.assertIsNot(client, other_client)
+        self.assertIsNot(cache, other_cache)
+        self.assertEqual(2, self.factory.get_password_client.call_count)
+
+    def test_drivers_share(self):
+        conf = make_conf()
+        drivers = [interface.OVSInterfaceDriver(conf),
+                   interface.SolarisInterfaceDriver(conf)]
+
+        self.assertIs(drivers[0].neutron_client, drivers[1].neutron_client)
+        self.assertIs(drivers[0].network_cache, drivers[1].network_cache)
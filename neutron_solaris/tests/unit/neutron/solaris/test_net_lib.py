@@ -0,0 +1,495 @@
+# Copyright 2021, Guillermo Adrian Molina.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Unit tests for the Solaris net_lib module.
+"""
+
+import time
+from unittest import mock
+
+from neutron_solaris.solaris import net_lib
+from neutron_solaris.tests import base
+from neutron_solaris.tests import tools
+
+
+class TestParseable(base.BaseTestCase):
+
+    def test_normalize_mac(self):
+        self.assertEqual('02:08:20:d2:1c:3e',
+                         net_lib.normalize_mac('2:8:20:d2:1c:3e'))
+        self.assertEqual('bogus', net_lib.normalize_mac('bogus'))
+
+
+class TestDatalinkInventory(base.BaseTestCase):
+
+    _SHOW_VNIC = ('vnic0:2\\:8\\:20\\:d2\\:1c\\:3e:0:net0\n'
+                  'vnic1:fa\\:16\\:3e\\:0\\:0\\:1:100:net1\n')
+
+    @mock.patch.object(net_lib.utils, 'execute')
+    def test_get_vnic_inventory(self, mock_execute):
+        mock_execute.return_value = self._SHOW_VNIC
+
+        inventory = net_lib.Datalink.get_vnic_inventory()
+
+        mock_execute.assert_called_once_with(
+            ['/usr/sbin/dladm', 'show-vnic', '-po',
+             'link,macaddress,vid,over'])
+        self.assertEqual(2, len(inventory))
+        self.assertIn('vnic1', inventory)
+        self.assertEqual(
+            net_lib.VNIC('vnic1', 'fa:16:3e:00:00:01', '100', 'net1', None),
+            inventory.get('vnic1'))
+        self.assertEqual('vnic0',
+                         inventory.get_by_mac('02:08:20:d2:1c:3e').link)
+        self.assertEqual({'02:08:20:d2:1c:3e': 'vnic0',
+                          'fa:16:3e:00:00:01': 'vnic1'},
+                         inventory.mac_to_link())
+
+        def _modify():
+            inventory.by_link['vnic2'] = None
+        self.assertRaises(TypeError, _modify)
+
+    @mock.patch.object(net_lib.utils, 'execute')
+    def test_get_vnic_inventory_with_state(self, mock_execute):
+        mock_execute.side_effect = [self._SHOW_VNIC,
+                                    'net0:up\nvnic0:up\nvnic1:down\n']
+
+        inventory = net_lib.Datalink.get_vnic_inventory(with_state=True)
+
+        self.assertEqual(2, mock_execute.call_count)
+        self.assertEqual('up', inventory.get('vnic0').state)
+        self.assertEqual('down', inventory.get('vnic1').state)
+
+
+class TestCommandBase(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestCommandBase, self).setUp()
+        net_lib.metrics.REGISTRY.clear()
+        self.addCleanup(net_lib.metrics.REGISTRY.clear)
+
+    def test_command_verb(self):
+        self.assertEqual('dladm show-vnic', net_lib.command_verb(
+            ['/usr/sbin/dladm', 'show-vnic', '-po', 'link']))
+        self.assertEqual('dladm create-vnic', net_lib.command_verb(
+            ['/usr/bin/pfexec', '/usr/sbin/dladm', 'create-vnic', '-l']))
+        self.assertEqual('pfctl', net_lib.command_verb(
+            ['/usr/bin/pfexec', '/usr/sbin/pfctl', '-a', 'anchor', '-sr']))
+
+    def test_backend_without_run(self):
+        class NoRun(net_lib.CommandBackend):
+            pass
+
+        self.assertRaises(TypeError, NoRun)
+
+    @mock.patch.object(net_lib.utils, 'execute')
+    def test_subprocess_backend_run(self, mock_execute):
+        backend = net_lib.SubprocessBackend()
+        mock_execute.return_value = ('out', 'err')
+
+        self.assertEqual(('out', 'err', 0), backend.run(['/bin/true']))
+        mock_execute.side_effect = net_lib.exceptions.ProcessExecutionError(
+            'failed', returncode=2)
+        self.assertEqual(('', 'failed', 2), backend.run(['/bin/false']))
+
+    @mock.patch.object(net_lib.utils, 'execute')
+    def test_execute_records_metrics(self, mock_execute):
+        net_lib.CommandBase.execute(['/usr/sbin/ipadm', 'show-addr', '-po'])
+        mock_execute.side_effect = RuntimeError()
+        self.assertRaises(RuntimeError, net_lib.CommandBase.execute,
+                          ['/usr/sbin/ipadm', 'show-addr', '-po'])
+
+        self.assertEqual(2, net_lib.COMMAND_DURATION.get_count(
+            command='ipadm show-addr'))
+        self.assertEqual(1, net_lib.COMMAND_ERRORS.get(
+            command='ipadm show-addr'))
+
+    @mock.patch.object(net_lib.utils, 'execute')
+    def test_execute_with_pfexec(self, mock_execute):
+        net_lib.CommandBase.execute_with_pfexec(
+            ['/usr/sbin/dladm', 'delete-vnic', 'vnic0'])
+
+        mock_execute.assert_called_once_with(
+            ['/usr/bin/pfexec', '/usr/sbin/dladm', 'delete-vnic', 'vnic0'])
+        self.assertEqual(1, net_lib.COMMAND_DURATION.get_count(
+            command='dladm delete-vnic'))
+
+
+class TestLinkPropertyCache(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestLinkPropertyCache, self).setUp()
+        self.cache = net_lib.LinkPropertyCache(ttl=10, max_links=2)
+
+    def test_get_set(self):
+        self.assertIs(net_lib._MISSING, self.cache.get('vnic0', 'exists'))
+        self.cache.set('vnic0', 'exists', False, now=100)
+
+        self.assertFalse(self.cache.get('vnic0', 'exists', now=105))
+        self.assertEqual({'hits': 1, 'misses': 1, 'expired': 0,
+                          'evictions': 0, 'links': 1},
+                         self.cache.get_stats())
+
+    def test_expiry(self):
+        self.cache.set('vnic0', 'exists', True, now=100)
+
+        self.assertIs(net_lib._MISSING,
+                      self.cache.get('vnic0', 'exists', now=110))
+        self.assertEqual(1, self.cache.get_stats()['expired'])
+
+    def test_lru_eviction(self):
+        self.cache.set('vnic0', 'exists', True, now=100)
+        self.cache.set('vnic1', 'exists', True, now=100)
+        self.cache.get('vnic0', 'exists', now=100)
+        self.cache.set('vnic2', 'exists', True, now=100)
+
+        self.assertEqual(2, len(self.cache))
+        self.assertTrue(self.cache.get('vnic0', 'exists', now=100))
+        self.assertIs(net_lib._MISSING,
+                      self.cache.get('vnic1', 'exists', now=100))
+        self.assertEqual(1, self.cache.get_stats()['evictions'])
+
+    def test_invalidate(self):
+        self.cache.set('vnic0', 'exists', True)
+        self.cache.set('vnic0', ('prop', 'state'), 'up')
+        self.cache.set('vnic1', 'exists', True)
+
+        self.cache.invalidate('vnic0')
+
+        self.assertIs(net_lib._MISSING, self.cache.get('vnic0', 'exists'))
+        self.assertTrue(self.cache.get('vnic1', 'exists'))
+        self.cache.invalidate()
+        self.assertEqual(0, len(self.cache))
+
+    def test_disabled(self):
+        cache = net_lib.LinkPropertyCache(ttl=0)
+        cache.set('vnic0', 'exists', True)
+        self.assertIs(net_lib._MISSING, cache.get('vnic0', 'exists'))
+
+
+class TestDatalinkCache(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestDatalinkCache, self).setUp()
+        mock.patch.object(net_lib.Datalink, 'link_cache',
+                          net_lib.LinkPropertyCache()).start()
+        self.execute = mock.patch.object(net_lib.utils, 'execute').start()
+
+    def test_get_mac_is_cached(self):
+        self.execute.return_value = '2:8:20:d2:1c:3e\n'
+
+        self.assertEqual('2:8:20:d2:1c:3e', net_lib.Datalink.get_mac('net0'))
+        self.assertEqual('2:8:20:d2:1c:3e',
+                         net_lib.Datalink.get_prop('net0', 'mac-address'))
+        self.assertEqual(1, self.execute.call_count)
+
+        net_lib.Datalink.get_mac('net0', refresh=True)
+        self.assertEqual(2, self.execute.call_count)
+
+    def test_errors_are_not_cached(self):
+        self.execute.side_effect = [RuntimeError(), 'up\n']
+
+        self.assertEqual('', net_lib.Datalink.get_prop('vnic0', 'state'))
+        self.assertEqual('up', net_lib.Datalink.get_prop('vnic0', 'state'))
+
+    def test_datalink_exists_is_cached(self):
+        self.execute.side_effect = RuntimeError()
+
+        self.assertFalse(net_lib.Datalink.datalink_exists('vnic0'))
+        self.assertFalse(net_lib.Datalink.datalink_exists('vnic0'))
+        self.assertEqual(1, self.execute.call_count)
+
+    def test_set_prop_invalidates(self):
+        self.execute.return_value = '1500\n'
+        net_lib.Datalink.get_prop('vnic0', 'mtu')
+
+        net_lib.Datalink('vnic0').set_prop('mtu', 9000)
+        net_lib.Datalink.get_prop('vnic0', 'mtu')
+
+        self.assertEqual(3, self.execute.call_count)
+
+    def test_delete_vnic_invalidates(self):
+        net_lib.Datalink.datalink_exists('vnic0')
+
+        net_lib.Datalink('vnic0').delete_vnic()
+
+        self.execute.side_effect = RuntimeError()
+        self.assertFalse(net_lib.Datalink.datalink_exists('vnic0'))
+        # show-link, fresh show-link, delete-vnic and show-link again
+        self.assertEqual(4, self.execute.call_count)
+
+    def test_inventory_primes_datalink_exists(self):
+        self.execute.return_value = 'vnic0:2\\:8\\:20\\:d2\\:1c\\:3e:0:net0\n'
+        net_lib.Datalink.get_vnic_inventory()
+
+        self.assertTrue(net_lib.Datalink.datalink_exists('vnic0'))
+        self.assertEqual(1, self.execute.call_count)
+
+
+class TestCommandDaemon(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestCommandDaemon, self).setUp()
+        self.daemon = mock.Mock()
+        self.daemon.allows.side_effect = (
+            lambda cmd: cmd[0] == '/usr/sbin/dladm')
+        mock.patch.object(net_lib.CommandBase, 'command_daemon',
+                          self.daemon).start()
+        self.execute = mock.patch.object(net_lib.utils, 'execute').start()
+
+    def test_execute_with_daemon(self):
+        self.daemon.execute.return_value = ('out', 'err', 0)
+
+        self.assertEqual('out', net_lib.CommandBase.execute_with_pfexec(
+            ['/usr/sbin/dladm', 'delete-vnic', 'vnic0']))
+        self.daemon.execute.assert_called_once_with(
+            ['/usr/sbin/dladm', 'delete-vnic', 'vnic0'], None)
+        self.execute.assert_not_called()
+
+    def test_not_allowed_command(self):
+        net_lib.CommandBase.execute_with_pfexec(['/usr/sbin/zfs', 'list'])
+
+        self.daemon.execute.assert_not_called()
+        self.execute.assert_called_once_with(
+            ['/usr/bin/pfexec', '/usr/sbin/zfs', 'list'])
+
+    def test_fallback_when_unavailable(self):
+        self.daemon.execute.side_effect = (
+            net_lib.pfexec_daemon.DaemonUnavailable())
+
+        net_lib.CommandBase.execute_with_pfexec(
+            ['/usr/sbin/dladm', 'delete-vnic', 'vnic0'])
+
+        self.execute.assert_called_once_with(
+            ['/usr/bin/pfexec', '/usr/sbin/dladm', 'delete-vnic', 'vnic0'])
+
+    def test_daemon_died(self):
+        self.daemon.execute.side_effect = (
+            net_lib.pfexec_daemon.DaemonError('pfexec daemon exited'))
+
+        self.assertRaises(net_lib.exceptions.ProcessExecutionError,
+                          net_lib.CommandBase.execute_with_pfexec,
+                          ['/usr/sbin/dladm', 'delete-vnic', 'vnic0'])
+        # the command may have been run, it is not run again
+        self.execute.assert_not_called()
+
+    def test_exit_code(self):
+        self.daemon.execute.return_value = ('', 'failed', 1)
+        cmd = ['/usr/sbin/dladm', 'delete-vnic', 'vnic0']
+
+        self.assertRaises(net_lib.exceptions.ProcessExecutionError,
+                          net_lib.CommandBase.execute_with_pfexec, cmd)
+        self.assertEqual(
+            ('', 'failed'),
+            net_lib.CommandBase.execute_with_pfexec(
+                cmd, check_exit_code=False, return_stderr=True,
+                log_fail_as_error=False))
+
+
+class TestIPInterfaceReconcile(base.BaseTestCase):
+
+    MAC = 'fa:16:3e:00:00:01'
+    LINK_LOCAL = 'fe80::f816:3eff:fe00:1/10'
+
+    def setUp(self):
+        super(TestIPInterfaceReconcile, self).setUp()
+        self.sim = self.useFixture(tools.SolarisSimulatorFixture()).simulator
+        self.sim.add_vnic('vnic0', 'net0', mac=self.MAC)
+        self.ipif = net_lib.IPInterface('vnic0')
+
+    def _addresses(self):
+        return [(address.type, address.addr) for address in
+                net_lib.IPInterface.get_addresses()['vnic0']]
+
+    def test_create(self):
+        self.ipif.reconcile(['10.0.0.2/24', '2001:db8::2/64'],
+                            addrconf=True)
+
+        # addrconf provides the link local address, no show-linkprop
+        self.assertEqual({'ipadm show-addr': 1, 'ipadm create-ip': 1,
+                          'ipadm create-addr': 3}, self.sim.calls)
+        self.assertEqual([('addrconf', self.LINK_LOCAL),
+                          ('static', '10.0.0.2/24'),
+                          ('static', '2001:db8::2/64')], self._addresses())
+
+    def test_create_static_ipv6_link_local(self):
+        self.ipif.reconcile(['2001:db8::2/64'])
+
+        self.assertEqual([('static', self.LINK_LOCAL),
+                          ('static', '2001:db8::2/64')], self._addresses())
+
+    def test_unchanged(self):
+        self.ipif.reconcile(['10.0.0.2/24', '2001:db8::2/64'])
+        self.sim.calls.clear()
+
+        plan = self.ipif.reconcile(['10.0.0.2/24', '2001:db8::2/64'])
+
+        self.assertFalse(plan)
+        self.assertEqual({'ipadm show-addr': 1}, self.sim.calls)
+
+    def test_replace(self):
+        self.ipif.reconcile(['10.0.0.2/24', '2001:db8::2/64'],
+                            addrconf=True)
+
+        self.ipif.reconcile(['10.0.0.3/24'])
+
+        self.assertEqual([('static', '10.0.0.3/24')], self._addresses())
+
+    def test_interface_without_addresses(self):
+        net_lib.CommandBase.execute(['/usr/sbin/ipadm', 'create-ip',
+                                     'vnic0'])
+
+        self.ipif.reconcile(['10.0.0.2/24'])
+
+        self.assertEqual([('static', '10.0.0.2/24')], self._addresses())
+
+    def test_many_interfaces(self):
+        self.sim.add_vnic('vnic1', 'net0')
+        net_lib.IPInterface.reconcile_addresses(
+            {'vnic0': ['10.0.0.2/24'], 'vnic1': ['10.0.1.2/24']})
+        self.sim.calls.clear()
+
+        net_lib.IPInterface.reconcile_addresses(
+            {'vnic0': ['10.0.0.2/24'], 'vnic1': ['10.0.1.2/24']})
+
+        self.assertEqual({'ipadm show-addr': 1}, self.sim.calls)
+
+    def test_plan_leaves_dhcp_addresses(self):
+        current = {'vnic0': [
+            net_lib.IPAddress('vnic0/_a', 'dhcp', '10.0.0.9/24'),
+            net_lib.IPAddress('vnic0/_b', 'static', '10.0.0.2/24')]}
+
+        plan = net_lib.IPInterface.plan_addresses(
+            {'vnic0': ['10.0.0.3/24']}, current)
+
+        self.assertEqual([], plan.create_ip)
+        self.assertEqual(['vnic0/_b'], plan.delete)
+        self.assertEqual([('vnic0', 'static', '10.0.0.3/24')], plan.create)
+
+    def test_delete_address(self):
+        self.ipif.reconcile(['10.0.0.2/24', '10.0.0.3/24'])
+        self.sim.calls.clear()
+
+        self.ipif.delete_address('10.0.0.2/24')
+
+        self.assertEqual({'ipadm show-addr': 1, 'ipadm delete-addr': 1},
+                         self.sim.calls)
+        self.assertEqual([('static', '10.0.0.3/24')], self._addresses())
+
+
+class TestAddressIndex(base.BaseTestCase):
+
+    _SHOW_ADDR = ('lo0/v4:static:127.0.0.1/8\n'
+                  'vnic0/_a:static:10.0.0.10/24\n'
+                  'vnic0/_b:static:fe80\\:\\:f816\\:3eff\\:fe00\\:1/10\n'
+                  'vnic0/_c:static:2001\\:db8\\:\\:2/64\n'
+                  'vnic1/_a:dhcp:10.0.1.2/24\n'
+                  'vnic1/_b:addrconf:?\n')
+
+    def setUp(self):
+        super(TestAddressIndex, self).setUp()
+        self.execute = mock.patch.object(
+            net_lib.utils, 'execute', return_value=self._SHOW_ADDR).start()
+        self.index = net_lib.AddressIndex.build()
+
+    def test_build(self):
+        self.execute.assert_called_once_with(
+            ['/usr/sbin/ipadm', 'show-addr', '-p', '-o', 'addrobj,type,addr'],
+            log_fail_as_error=False)
+        self.assertEqual({'lo0', 'vnic0', 'vnic1'}, self.index.interfaces)
+        self.assertEqual(['vnic0/_a', 'vnic0/_b', 'vnic0/_c'],
+                         self.index.addrobjs('vnic0'))
+        self.assertEqual(['10.0.1.2/24'],
+                         [str(net) for net in self.index.networks('vnic1')])
+
+    def test_no_substring_match(self):
+        self.assertFalse(self.index.contains('10.0.0.1'))
+        self.assertFalse(self.index.contains('10.0.0.1/24', 'vnic0'))
+        self.assertTrue(self.index.contains('10.0.0.10', 'vnic0'))
+        self.assertFalse(self.index.contains('10.0.0.10/16', 'vnic0'))
+
+    def test_ipv6(self):
+        self.assertEqual('vnic0/_c',
+                         self.index.find('2001:db8:0::2/64').addrobj)
+        self.assertTrue(self.index.contains('fe80::f816:3eff:fe00:1'))
+        self.assertNotIn('2001:db8::3', self.index)
+
+    def test_other_interface(self):
+        self.assertIn('10.0.1.2', self.index)
+        self.assertFalse(self.index.contains('10.0.1.2', 'vnic0'))
+
+    def test_ipaddr_exists_with_index(self):
+        self.execute.reset_mock()
+
+        self.assertTrue(net_lib.IPInterface.ipaddr_exists(
+            '10.0.0.10/24', 'vnic0', index=self.index))
+        self.assertFalse(net_lib.IPInterface.ipaddr_exists(
+            '10.0.0.1/24', 'vnic0', index=self.index))
+        self.execute.assert_not_called()
+
+
+class TestLowerLinkCache(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestLowerLinkCache, self).setUp()
+        self.sim = self.useFixture(tools.SolarisSimulatorFixture()).simulator
+        self.sim.add_physical_link('net1', default_tag='0', mtu='9000')
+        self.cache = net_lib.Datalink.lower_links
+
+    def test_load(self):
+        loaded = self.cache.load(['net0', 'net1', 'net9'])
+
+        self.assertEqual(net_lib.LowerLink('net1', '0', '9000', '10000', 'up'),
+                         loaded['net1'])
+        self.assertIsNone(loaded['net9'])
+        self.assertIn('net0', self.cache)
+        self.assertNotIn('net9', self.cache)
+        self.assertEqual(3, self.sim.calls['dladm show-linkprop'])
+
+    def test_create_vnic_needs_no_lookup(self):
+        self.cache.load(['net0'])
+        self.sim.calls.clear()
+
+        for i in range(3):
+            net_lib.Datalink('vnic%d' % i).create_vnic('net0', vid='1')
+
+        self.assertEqual('0', self.sim.links['vnic0'].vid)
+        self.assertNotIn('dladm show-linkprop', self.sim.calls)
+
+    def test_max_age(self):
+        cache = net_lib.LowerLinkCache(max_age=60)
+        cache.load(['net0'])
+        self.sim.links['net0'].props['default_tag'] = '5'
+
+        self.assertEqual('1', cache.get('net0').default_tag)
+        self.assertEqual('5', cache.get('net0', now=time.time() + 61)
+                         .default_tag)
+
+    def test_set_prop_invalidates(self):
+        self.cache.load(['net0'])
+
+        net_lib.Datalink('net0').set_prop('default_tag', '5')
+
+        self.assertNotIn('net0', self.cache)
+        self.assertEqual('5', self.cache.get('net0').default_tag)
+
+    def test_refresh(self):
+        self.cache.load(['net0', 'net1'])
+        self.sim.links['net1'].props['mtu'] = '1500'
+
+        self.cache.refresh()
+
+        self.assertEqual('1500', self.cache.get('net1').mtu)
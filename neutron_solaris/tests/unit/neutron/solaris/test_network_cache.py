@@ -0,0 +1,136 @@
+# Copyright 2021, Guillermo Adrian Molina.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Unit tests for the network cache of the interface drivers.
+"""
+
+from unittest import mock
+
+from neutron_solaris.common import resource_cache
+from neutron_solaris.solaris import network_cache
+from neutron_solaris.tests import base
+
+
+class TestNetworkCache(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestNetworkCache, self).setUp()
+        self.now = 1000.0
+        self.client = mock.Mock()
+        self.client.show_network.side_effect = lambda network_id: {
+            'network': {'id': network_id, 'mtu': 9000,
+                        'subnets': ['sub-' + network_id]}}
+        self.client.list_subnets.side_effect = lambda network_id: {
+            'subnets': [{'id': 'sub-' + network_id,
+                         'network_id': network_id}]}
+        self.client.show_subnet.side_effect = lambda subnet_id: {
+            'subnet': {'id': subnet_id}}
+        self.cache = network_cache.NetworkCache(
+            lambda: self.client, ttl=60, clock=lambda: self.now)
+
+    def test_get_network(self):
+        for _ in range(3):
+            self.assertEqual(9000, self.cache.get_network('net1')['mtu'])
+        self.assertEqual('net1',
+                         self.cache.get_subnet('sub-net1')['network_id'])
+
+        # only the missed network and its subnets are loaded
+        self.client.show_network.assert_called_once_with('net1')
+        self.client.list_subnets.assert_called_once_with(network_id='net1')
+        self.client.list_networks.assert_not_called()
+        self.client.show_subnet.assert_not_called()
+
+    def test_get_subnet(self):
+        self.assertEqual({'id': 'sub2'}, self.cache.get_subnet('sub2'))
+        self.assertEqual({'id': 'sub2'}, self.cache.get_subnet('sub2'))
+
+        self.client.show_subnet.assert_called_once_with('sub2')
+        self.client.list_subnets.assert_not_called()
+
+    def test_unlocked_load(self):
+        def _show_network(network_id):
+            # other lookups are not blocked while the API is called
+            self.assertFalse(self.cache._cache._lock.locked())
+            return {'network': {'id': network_id}}
+        self.client.show_network.side_effect = _show_network
+
+        self.cache.get_network('net1')
+
+    def test_invalidated_while_loading(self):
+        def _show_network(network_id):
+            self.cache.invalidate_network(network_id)
+            return {'network': {'id': network_id, 'mtu': 1500}}
+        self.client.show_network.side_effect = _show_network
+
+        self.assertEqual(1500, self.cache.get_network('net1')['mtu'])
+        # what was loaded may be stale, it is not cached
+        self.client.show_network.side_effect = lambda network_id: {
+            'network': {'id': network_id, 'mtu': 9000}}
+        self.assertEqual(9000, self.cache.get_network('net1')['mtu'])
+
+    def test_ttl(self):
+        self.cache.get_network('net1')
+        self.now += 60
+        self.cache.get_network('net1')
+
+        self.assertEqual(2, self.client.show_network.call_count)
+
+    def test_no_cache(self):
+        self.cache = network_cache.NetworkCache(lambda: self.client, ttl=0)
+
+        self.cache.get_network('net1')
+        self.cache.get_network('net1')
+
+        self.assertEqual(2, self.client.show_network.call_count)
+        self.client.list_subnets.assert_not_called()
+
+    def test_invalidate_network(self):
+        self.cache.get_network('net1')
+        self.cache.get_network('net2')
+
+        resource_cache.invalidate_network('net1')
+        self.cache.get_network('net1')
+        self.cache.get_subnet('sub-net1')
+        self.cache.get_network('net2')
+        self.cache.get_subnet('sub-net2')
+
+        self.assertEqual(3, self.client.show_network.call_count)
+        self.assertEqual(3, self.client.list_subnets.call_count)
+        self.client.show_subnet.assert_not_called()
+
+    def test_handle_notification(self):
+        self.cache.get_network('net1')
+        self.cache.get_subnet('sub2')
+
+        resource_cache.handle_notification('subnet.update.end',
+                                           {'subnet': {'id': 'sub2'}})
+        resource_cache.handle_notification('network.delete.end',
+                                           {'network_id': 'net1'})
+        resource_cache.handle_notification('port.create.end',
+                                           {'port': {'id': 'port1'}})
+        self.cache.get_network('net1')
+        self.cache.get_subnet('sub2')
+
+        self.assertEqual(2, self.client.show_network.call_count)
+        self.assertEqual(2, self.client.show_subnet.call_count)
+
+    def test_handle_notification_without_id(self):
+        self.cache.get_network('net1')
+
+        resource_cache.handle_notification('network.update.end', {})
+        self.cache.get_network('net1')
+
+        self.assertEqual(2, self.client.show_network.call_count)
@@ -0,0 +1,148 @@
+# Copyright 2021, Guillermo Adrian Molina.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Unit tests for the command output parsers.
+"""
+
+import io
+import random
+import time
+from unittest import mock
+
+from neutron_solaris.solaris import packetfilter
+from neutron_solaris.solaris import parsers
+from neutron_solaris.solaris import simulator
+from neutron_solaris.tests import base
+
+
+class TestParseable(base.BaseTestCase):
+
+    def test_split_parseable(self):
+        fields = parsers.split_parseable(
+            'vnic0:2\\:8\\:20\\:d2\\:1c\\:3e:100:net0')
+        self.assertEqual(['vnic0', '2:8:20:d2:1c:3e', '100', 'net0'],
+                         fields)
+
+    def test_split_parseable_empty_fields(self):
+        self.assertEqual(['a', '', 'b'], parsers.split_parseable('a::b'))
+
+    def test_split_parseable_escaped_backslash(self):
+        self.assertEqual(['a\\', 'b'], parsers.split_parseable('a\\\\:b'))
+
+    def test_iter_parseable(self):
+        output = ('vnic0:2\\:8\\:20\\:d2\\:1c\\:3e:0:net0\n'
+                  '\n'
+                  'garbage\n'
+                  'vnic1:fa\\:16\\:3e\\:0\\:0\\:1:100:net1\r\n')
+
+        vnics = list(parsers.iter_parseable(output,
+                                            'link,macaddress,vid,over'))
+
+        self.assertEqual(2, len(vnics))
+        self.assertEqual(('vnic1', 'fa:16:3e:0:0:1', '100', 'net1'),
+                         vnics[1])
+        self.assertEqual('2:8:20:d2:1c:3e', vnics[0].macaddress)
+        self.assertIs(type(vnics[0]),
+                      parsers.record_type('link,macaddress,vid,over'))
+
+    def test_iter_parseable_single_field(self):
+        # a single field is not escaped
+        output = 'fe80::1/10\n2001:db8::2/64\n'
+
+        self.assertEqual(['fe80::1/10', '2001:db8::2/64'],
+                         [r.addr for r in parsers.iter_parseable(output,
+                                                                 'addr')])
+
+    def test_iter_parseable_stream(self):
+        stream = io.StringIO('net0:up\nnet1:down\n')
+        records = parsers.iter_parseable(stream, 'link,state')
+
+        self.assertEqual(('net0', 'up'), next(records))
+        # the rest of the stream is only read on demand
+        self.assertEqual('net1:down\n', stream.readline())
+
+    def test_fuzz_round_trip(self):
+        rand = random.Random(19)
+        alphabet = 'ab:\\ 0f/.%'
+        fields = ['f0', 'f1', 'f2', 'f3']
+        rows = [dict((field, ''.join(rand.choice(alphabet) for _ in
+                                     range(rand.randint(0, 8))))
+                     for field in fields)
+                for _ in range(2000)]
+        # blank rows are skipped like blank lines
+        rows = [row for row in rows if ''.join(row.values()).strip()]
+        output = simulator._format(rows, fields, True)
+
+        records = list(parsers.iter_parseable(output, ','.join(fields)))
+
+        self.assertEqual([tuple(row[field] for field in fields)
+                          for row in rows], records)
+
+
+class TestKstat(base.BaseTestCase):
+
+    def test_iter_kstat(self):
+        output = ('link:0:net0:crtime\t12.345678\n'
+                  'garbage\n'
+                  'link:0:vnic0:crtime\t678.9\n')
+
+        self.assertEqual(
+            [parsers.KstatValue('link', '0', 'net0', 'crtime', '12.345678'),
+             parsers.KstatValue('link', '0', 'vnic0', 'crtime', '678.9')],
+            list(parsers.iter_kstat(output)))
+
+
+class TestPfctl(base.BaseTestCase):
+
+    def test_iter_pfctl_rules(self):
+        output = ('pass in quick on vnic0 all label "r1"\n'
+                  '  block drop in on vnic0 all\n'
+                  '\n'
+                  'pass out on vnic0 label\n')
+
+        rules = list(parsers.iter_pfctl_rules(output))
+
+        self.assertEqual(
+            [parsers.PfRule('pass in quick on vnic0 all label "r1"', 'r1'),
+             parsers.PfRule('block drop in on vnic0 all', None),
+             parsers.PfRule('pass out on vnic0 label', None)],
+            rules)
+
+    def test_large_anchor(self):
+        output = ''.join('pass in quick on vnic%d from 10.%d.%d.0/24 to any '
+                         'label "rule-%d"\n' % (i % 64, i // 256, i % 256, i)
+                         for i in range(50000))
+
+        start = time.time()
+        labels = [rule.label for rule in parsers.iter_pfctl_rules(output)]
+        elapsed = time.time() - start
+
+        self.assertEqual(50000, len(labels))
+        self.assertEqual('rule-49999', labels[-1])
+        # a generous bound, parsing takes well below a second
+        self.assertLess(elapsed, 5)
+
+    @mock.patch.object(packetfilter.PacketFilter, 'execute_with_pfexec')
+    def test_remove_anchor_states(self, mock_execute):
+        mock_execute.side_effect = ['pass in all label "r1"\n'
+                                    '  block in all\n', '', '']
+        pf = packetfilter.PacketFilter('_auto/neutron:l3:agent')
+
+        pf.remove_anchor(['l3i1'])
+
+        self.assertEqual(
+            mock.call(['/usr/sbin/pfctl', '-k', 'label', '-k', 'r1']),
+            mock_execute.call_args_list[-1])
@@ -0,0 +1,94 @@
+# Copyright 2021, Guillermo Adrian Molina.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Unit tests for the pfexec daemon.
+"""
+
+import io
+import json
+from unittest import mock
+
+from neutron_solaris.solaris import pfexec_daemon
+from neutron_solaris.tests import base
+
+
+class TestServe(base.BaseTestCase):
+
+    def _serve(self, requests):
+        infile = io.StringIO(''.join(requests))
+        outfile = io.StringIO()
+        pfexec_daemon.serve(infile, outfile, ['/usr/sbin/dladm'])
+        replies = [json.loads(line) for line in outfile.getvalue().split(
+            '\n') if line]
+        return {reply['id']: reply for reply in replies}
+
+    @mock.patch.object(pfexec_daemon.subprocess, 'run')
+    def test_serve(self, mock_run):
+        mock_run.return_value = mock.Mock(returncode=0, stdout='net0\n',
+                                          stderr='')
+
+        replies = self._serve([
+            json.dumps({'id': 1, 'cmd': ['/usr/sbin/dladm', 'show-link'],
+                        'input': None}) + '\n',
+            'not json\n',
+            json.dumps({'id': 2, 'cmd': ['/usr/bin/rm', '-rf', '/']}) + '\n',
+            json.dumps({'id': 3, 'cmd': '/usr/sbin/dladm'}) + '\n'])
+
+        self.assertEqual({'id': 1, 'returncode': 0, 'stdout': 'net0\n',
+                          'stderr': ''}, replies[1])
+        self.assertIn('not allowed', replies[2]['error'])
+        self.assertIn('Malformed', replies[3]['error'])
+        mock_run.assert_called_once_with(
+            ['/usr/sbin/dladm', 'show-link'], input=None, stdout=mock.ANY,
+            stderr=mock.ANY, universal_newlines=True, close_fds=True)
+
+
+class TestPfexecDaemonClient(base.BaseTestCase):
+
+    def test_daemon_cmd(self):
+        client = pfexec_daemon.PfexecDaemonClient(['/usr/sbin/dladm'],
+                                                  workers=2)
+        cmd = client._daemon_cmd()
+
+        self.assertEqual('/usr/bin/pfexec', cmd[0])
+        self.assertEqual(['--workers', '2', '--allow', '/usr/sbin/dladm'],
+                         cmd[4:])
+        self.assertTrue(client.allows(['/usr/sbin/dladm', 'show-link']))
+        self.assertFalse(client.allows(['/usr/sbin/zfs', 'list']))
+
+    def test_execute(self):
+        client = pfexec_daemon.PfexecDaemonClient(['/bin/echo', '/bin/cat'],
+                                                  use_pfexec=False)
+        self.addCleanup(client.stop)
+
+        self.assertEqual(('hello\n', '', 0),
+                         client.execute(['/bin/echo', 'hello']))
+        self.assertEqual(('input', '', 0),
+                         client.execute(['/bin/cat'], process_input='input'))
+        self.assertRaises(pfexec_daemon.DaemonError, client.execute,
+                          ['/bin/sh', '-c', 'true'])
+
+    @mock.patch.object(pfexec_daemon.green_subprocess, 'Popen')
+    def test_unavailable(self, mock_popen):
+        mock_popen.side_effect = OSError()
+        client = pfexec_daemon.PfexecDaemonClient()
+
+        self.assertRaises(pfexec_daemon.DaemonUnavailable, client.execute,
+                          ['/usr/sbin/dladm', 'show-link'])
+        self.assertRaises(pfexec_daemon.DaemonUnavailable, client.execute,
+                          ['/usr/sbin/dladm', 'show-link'])
+        # no new start is attempted within the retry interval
+        self.assertEqual(1, mock_popen.call_count)
@@ -0,0 +1,212 @@
+# Copyright 2021, Guillermo Adrian Molina.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Unit tests for the dladm/ipadm simulator, driven through net_lib.
+"""
+
+from unittest import mock
+
+from neutron_lib import exceptions
+
+from neutron_solaris.solaris import net_lib
+from neutron_solaris.tests import base
+from neutron_solaris.tests import tools
+
+MAC1 = 'fa:16:3e:00:00:01'
+
+
+class TestSolarisSimulator(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestSolarisSimulator, self).setUp()
+        self.sim = self.useFixture(
+            tools.SolarisSimulatorFixture()).simulator
+
+    def test_create_and_delete_vnic(self):
+        net_lib.Datalink('vnic0').create_vnic('net0', mac_address=MAC1,
+                                              vid='100')
+
+        self.assertTrue(net_lib.Datalink.datalink_exists('vnic0'))
+        self.assertEqual('fa:16:3e:0:0:1', net_lib.Datalink.get_mac('vnic0'))
+        inventory = net_lib.Datalink.get_vnic_inventory(with_state=True)
+        self.assertEqual(net_lib.VNIC('vnic0', MAC1, '100', 'net0', 'up'),
+                         inventory.get_by_mac(MAC1))
+
+        net_lib.Datalink('vnic0').delete_vnic()
+
+        self.assertFalse(net_lib.Datalink.datalink_exists('vnic0'))
+        self.assertEqual(0, len(net_lib.Datalink.get_vnic_inventory()))
+
+    def test_create_vnic_default_tag(self):
+        net_lib.Datalink('vnic0').create_vnic('net0', vid='1')
+
+        self.assertEqual('0', self.sim.links['vnic0'].vid)
+
+    def test_create_vnic_errors(self):
+        self.assertRaises(exceptions.ProcessExecutionError,
+                          net_lib.Datalink('vnic0').create_vnic, 'net9')
+        net_lib.Datalink('vnic0').create_vnic('net0', mac_address=MAC1)
+        self.assertRaises(exceptions.ProcessExecutionError,
+                          net_lib.Datalink('vnic1').create_vnic, 'net0',
+                          mac_address=MAC1)
+
+    def test_link_properties(self):
+        self.sim.add_vnic('vnic0', 'net0')
+        net_lib.Datalink('vnic0').set_prop('mtu', '9000', temp=True)
+
+        self.assertEqual('9000', net_lib.Datalink.get_prop('vnic0', 'mtu'))
+        self.assertEqual('up', net_lib.Datalink.get_prop('vnic0', 'state'))
+        self.assertEqual('', net_lib.Datalink.get_prop('vnic0', 'bogus'))
+        self.assertEqual(['net0', 'vnic0'], net_lib.Datalink.show_link())
+
+    def test_ip_addresses(self):
+        self.sim.add_vnic('vnic0', 'net0', mac=MAC1)
+        interface = net_lib.IPInterface('vnic0')
+
+        interface.create_address('10.0.0.2/24')
+        interface.create_address('2001:db8::2/64')
+
+        self.assertTrue(net_lib.IPInterface.ifname_exists('vnic0'))
+        self.assertTrue(net_lib.IPInterface.ipaddr_exists('10.0.0.2/24',
+                                                          'vnic0'))
+        self.assertEqual(
+            {'static': ['10.0.0.2/24', 'fe80::f816:3eff:fe00:1/10',
+                        '2001:db8::2/64']},
+            interface.ipaddr_list())
+
+        interface.delete_address('10.0.0.2/24')
+
+        self.assertFalse(net_lib.IPInterface.ipaddr_exists('10.0.0.2/24'))
+        self.assertRaises(exceptions.ProcessExecutionError,
+                          net_lib.Datalink('vnic0').delete_vnic)
+
+    def test_ip_interfaces(self):
+        self.sim.add_vnic('vnic0', 'net0', mac=MAC1)
+        self.sim.add_vnic('vnic1', 'net0')
+        net_lib.IPInterface('vnic0').create_address('10.0.0.2/24')
+
+        self.assertEqual({'vnic0'}, net_lib.IPInterface.get_ifnames())
+
+        net_lib.IPInterface('vnic0').delete_ip(ifcheck=False)
+
+        self.assertEqual(set(), net_lib.IPInterface.get_ifnames())
+        self.assertRaises(exceptions.ProcessExecutionError,
+                          net_lib.IPInterface('vnic0').delete_ip,
+                          ifcheck=False)
+
+    def test_link_crtimes(self):
+        self.sim.add_vnic('vnic0', 'net0', mac=MAC1)
+        crtimes = net_lib.Datalink.get_link_crtimes()
+        self.assertEqual({'net0', 'vnic0'}, set(crtimes))
+
+        net_lib.Datalink('vnic0').delete_vnic()
+        self.sim.add_vnic('vnic0', 'net0', mac=MAC1)
+
+        self.assertNotEqual(crtimes['vnic0'],
+                            net_lib.Datalink.get_link_crtimes()['vnic0'])
+
+    def test_unsupported_command(self):
+        self.assertRaises(exceptions.ProcessExecutionError,
+                          net_lib.CommandBase.execute, ['/usr/sbin/zfs'])
+
+    @mock.patch('time.sleep')
+    def test_latency_and_calls(self, mock_sleep):
+        self.sim.latency = {'dladm show-vnic': 0.5}
+        self.sim.default_latency = 0.1
+
+        net_lib.Datalink.get_vnic_inventory()
+        net_lib.Datalink.show_link()
+
+        mock_sleep.assert_has_calls([mock.call(0.5), mock.call(0.1)])
+        self.assertEqual(1, self.sim.calls['dladm show-vnic'])
+
+    def test_scale(self):
+        self.sim.add_vnics(2000, 'net0')
+
+        inventory = net_lib.Datalink.get_vnic_inventory()
+
+        self.assertEqual(2000, len(inventory))
+        self.assertEqual(1, self.sim.calls['dladm show-vnic'])
+
+
+class TestBulkVNICs(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestBulkVNICs, self).setUp()
+        self.sim = self.useFixture(
+            tools.SolarisSimulatorFixture(('net0', 'net1'))).simulator
+
+    def test_create_vnics(self):
+        self.sim.add_vnic('vnic1', 'net0')
+        specs = [net_lib.VNICSpec('vnic%d' % i, 'net%d' % (i % 2),
+                                  vid='100', mtu='9000')
+                 for i in range(4)]
+
+        results = net_lib.Datalink.create_vnics(specs, workers=2)
+
+        self.assertEqual(['created', 'exists', 'created', 'created'],
+                         [result.status for result in results])
+        self.assertEqual('100', self.sim.links['vnic2'].vid)
+        self.assertEqual('9000', self.sim.links['vnic3'].props['mtu'])
+        # one listing and one default_tag lookup per lower link
+        self.assertEqual(1, self.sim.calls['dladm show-link'])
+        self.assertEqual(2, self.sim.calls['dladm show-linkprop'])
+        self.assertEqual(3, self.sim.calls['dladm create-vnic'])
+
+    def test_create_vnics_default_tag(self):
+        results = net_lib.Datalink.create_vnics(
+            [net_lib.VNICSpec('vnic0', 'net0', vid='1',
+                              props={'maxbw': '100'})])
+
+        self.assertTrue(results[0].ok)
+        self.assertEqual('0', self.sim.links['vnic0'].vid)
+        self.assertEqual('100', self.sim.links['vnic0'].props['maxbw'])
+
+    def test_create_vnics_failure(self):
+        specs = [net_lib.VNICSpec('vnic0', 'net0'),
+                 net_lib.VNICSpec('vnic1', 'net9'),
+                 net_lib.VNICSpec('vnic0', 'net1')]
+
+        results = net_lib.Datalink.create_vnics(specs)
+
+        self.assertEqual(['created', 'failed', 'failed'],
+                         [result.status for result in results])
+        self.assertIsInstance(results[1].error,
+                              exceptions.ProcessExecutionError)
+        self.assertIn('vnic0', self.sim.links)
+
+    def test_create_vnics_rollback(self):
+        specs = [net_lib.VNICSpec('vnic0', 'net0'),
+                 net_lib.VNICSpec('vnic1', 'net9'),
+                 net_lib.VNICSpec('vnic2', 'net1')]
+
+        results = net_lib.Datalink.create_vnics(specs, rollback=True)
+
+        self.assertEqual(['rolled_back', 'failed', 'rolled_back'],
+                         [result.status for result in results])
+        self.assertEqual(['net0', 'net1'], list(self.sim.links))
+
+    def test_delete_vnics(self):
+        self.sim.add_vnics(3, 'net0')
+        self.sim.calls.clear()
+
+        results = net_lib.Datalink.delete_vnics(['vnic0', 'vnic2', 'vnic7'])
+
+        self.assertEqual(['deleted', 'deleted', 'absent'],
+                         [result.status for result in results])
+        self.assertEqual(['net0', 'net1', 'vnic1'], list(self.sim.links))
+        self.assertEqual({'dladm show-link': 1, 'dladm delete-vnic': 2},
+                         self.sim.calls)
@@ -0,0 +1,135 @@
+# Copyright 2021, Guillermo Adrian Molina.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Unit tests for the warm VNIC pool.
+"""
+
+from unittest import mock
+
+import eventlet
+
+from neutron_solaris.solaris import net_lib
+from neutron_solaris.solaris import vnic_pool
+from neutron_solaris.tests import base
+from neutron_solaris.tests import tools
+
+MAC1 = 'fa:16:3e:00:00:01'
+
+
+class TestVNICPool(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestVNICPool, self).setUp()
+        self.sim = self.useFixture(
+            tools.SolarisSimulatorFixture()).simulator
+        self.key = vnic_pool.PoolKey('net0', '100')
+        self.pool = vnic_pool.VNICPool(2, keys=[self.key])
+
+    def test_key(self):
+        # the default_tag of the simulated links is 1
+        self.assertEqual(('net0', '0'), vnic_pool.VNICPool.key('net0', 1))
+        self.assertEqual(('net0', '0'), vnic_pool.VNICPool.key('net0', None))
+        self.assertEqual(self.key, vnic_pool.VNICPool.key('net0', 100))
+
+    def test_refill(self):
+        self.assertEqual(2, self.pool.refill())
+        self.assertEqual(0, self.pool.refill())
+
+        inventory = net_lib.Datalink.get_vnic_inventory()
+        self.assertEqual(['vpool0', 'vpool1'], sorted(inventory.by_link))
+        self.assertEqual({'100'}, set(vnic.vid for vnic in inventory))
+        self.assertEqual(2, self.pool.available(self.key))
+
+    def test_acquire_hit(self):
+        self.pool.refill()
+        self.sim.calls.clear()
+
+        self.assertTrue(self.pool.acquire('dh0_0', 'net0', '100', MAC1))
+
+        vnic = net_lib.Datalink.get_vnic('dh0_0')
+        self.assertEqual(net_lib.VNIC('dh0_0', MAC1, '100', 'net0', None),
+                         vnic)
+        self.assertEqual(0, self.sim.calls['dladm create-vnic'])
+        self.assertEqual(1, self.pool.available(self.key))
+        self.assertEqual(1.0, self.pool.hit_rate)
+
+    def test_acquire_miss(self):
+        self.assertFalse(self.pool.acquire('dh0_0', 'net0', None, MAC1))
+
+        self.assertEqual(0.0, self.pool.hit_rate)
+        # the pool is filled from now on
+        self.pool.refill()
+        self.assertEqual(2, self.pool.available(
+            vnic_pool.PoolKey('net0', '0')))
+
+    def test_acquire_failure(self):
+        self.pool.refill()
+        # the MAC address is already used over net0
+        self.sim.add_vnic('other0', 'net0', mac=MAC1)
+
+        self.assertFalse(self.pool.acquire('dh0_0', 'net0', '100', MAC1))
+
+        self.assertNotIn('dh0_0', self.sim.links)
+        self.assertEqual(1, len([link for link in self.sim.links
+                                 if link.startswith('vpool')]))
+
+    def test_release(self):
+        self.sim.add_vnic('dh0_0', 'net0', mac=MAC1, vid='100')
+
+        self.assertTrue(self.pool.release('dh0_0', 'net0', '100'))
+
+        self.assertNotIn('dh0_0', self.sim.links)
+        self.assertNotEqual(MAC1, self.sim.links['vpool0'].mac)
+        self.assertEqual(1, self.pool.available(self.key))
+
+    def test_release_resets_mtu(self):
+        self.sim.add_vnic('dh0_0', 'net0', mac=MAC1, vid='100',
+                          props={'mtu': '9000'})
+
+        self.assertTrue(self.pool.release('dh0_0', 'net0', '100'))
+
+        self.assertEqual('1500', self.sim.links['vpool0'].props['mtu'])
+
+    def test_release_full_pool(self):
+        self.pool.refill()
+        self.sim.add_vnic('dh0_0', 'net0', mac=MAC1, vid='100')
+
+        self.assertFalse(self.pool.release('dh0_0', 'net0', '100'))
+        self.assertIn('dh0_0', self.sim.links)
+
+    def test_load(self):
+        self.sim.add_vnic('vpool7', 'net0', vid='100')
+        self.sim.add_vnic('vnic0', 'net0')
+        pool = vnic_pool.VNICPool(2)
+
+        pool.load()
+        pool.refill()
+
+        self.assertEqual(['vnic0', 'vpool7', 'vpool8'],
+                         sorted(net_lib.Datalink.get_vnic_inventory().by_link))
+
+    @mock.patch.object(vnic_pool.POOL_REFILL_DURATION, 'observe')
+    def test_refill_latency(self, mock_observe):
+        self.pool.refill()
+
+        mock_observe.assert_called_once_with(mock.ANY)
+
+    def test_start_and_stop(self):
+        self.pool.start(interval=60)
+        eventlet.sleep(0)
+        self.pool.stop()
+
+        self.assertEqual(2, self.pool.available())
@@ -20,10 +20,15 @@ Unit tests for the neutron client.
 
 from unittest import mock
 
+from neutronclient.common import exceptions as n_exc
+
+from neutron_solaris.common import metrics
+from neutron_solaris.common import resource_cache
 from neutron_solaris import config
 from neutron_solaris import constants
 from neutron_solaris import neutron_client
 from neutron_solaris.tests import base
+from neutron_solaris.tests import tools
 
 CONF = config.CONF
 
@@ -40,24 +45,65 @@ class TestNeutronClient(base.BaseTestCase):
 
     def setUp(self):
         super(TestNeutronClient, self).setUp()
+        neutron_client.CLIENT_FACTORY.clear()
+        self.addCleanup(neutron_client.CLIENT_FACTORY.clear)
         self._neutron = neutron_client.NeutronAPIClient()
 
     @mock.patch.object(neutron_client.clientv20, "Client")
     @mock.patch.object(neutron_client, "ks_loading")
     def test_init_client(self, mock_ks_loading, mock_client):
+        neutron_client.CLIENT_FACTORY.clear()
         self._neutron._init_client()
 
         self.assertEqual(mock_client.return_value, self._neutron._client)
         mock_ks_loading.load_session_from_conf_options.assert_called_once_with(
-            CONF, config.NEUTRON_GROUP)
+            CONF, config.NEUTRON_GROUP_NAME, session=mock.ANY)
         mock_ks_loading.load_auth_from_conf_options.assert_called_once_with(
-            CONF, config.NEUTRON_GROUP)
+            CONF, config.NEUTRON_GROUP_NAME)
         session = mock_ks_loading.load_session_from_conf_options.return_value
         plugin = mock_ks_loading.load_auth_from_conf_options.return_value
         mock_client.assert_called_once_with(
             session=session,
             auth=plugin)
 
+    @mock.patch.object(neutron_client.clientv20, "Client")
+    @mock.patch.object(neutron_client, "ks_loading")
+    def test_shared_client(self, mock_ks_loading, mock_client):
+        neutron_client.CLIENT_FACTORY.clear()
+
+        first = neutron_client.NeutronAPIClient()
+        second = neutron_client.NeutronAPIClient()
+
+        self.assertIs(first._client, second._client)
+        self.assertEqual(
+            1, mock_ks_loading.load_session_from_conf_options.call_count)
+
+    @mock.patch.object(neutron_client.clientv20, "Client")
+    @mock.patch.object(neutron_client.ks_session, "Session")
+    def test_password_client(self, mock_session, mock_client):
+        mock_client.side_effect = lambda **kwargs: mock.Mock()
+        factory = neutron_client.ClientFactory()
+
+        client = factory.get_password_client(
+            'http://keystone:5000/v3', 'neutron', 'secret',
+            project_name='service', region_name='RegionOne')
+
+        self.assertIs(client, factory.get_password_client(
+            'http://keystone:5000/v3', 'neutron', 'secret',
+            project_name='service', region_name='RegionOne'))
+        self.assertIsNot(client, factory.get_password_client(
+            'http://keystone:5000/v3', 'admin', 'secret'))
+        self.assertEqual(2, mock_session.call_count)
+        http = mock_session.call_args_list[0][1]['session']
+        adapter = http.get_adapter('https://keystone')
+        self.assertIsInstance(adapter, neutron_client.PoolAdapter)
+        self.assertEqual(CONF.neutron.http_pool_maxsize,
+                         adapter._pool_maxsize)
+        # the username is not exported in the pool label
+        self.assertEqual('pool0', adapter.name)
+        http = mock_session.call_args_list[1][1]['session']
+        self.assertEqual('pool1', http.get_adapter('https://keystone').name)
+
     def test_get_network_subnets(self):
         self._neutron._client.show_network.return_value = {
             'network': {
@@ -153,3 +199,141 @@ class TestNeutronClient(base.BaseTestCase):
         self.assertEqual({}, actual)
         self._neutron._client.show_port.assert_called_once_with(
             mock.sentinel.port_id)
+
+
+class TestGetAPICache(base.BaseTestCase):
+
+    def test_disabled(self):
+        self.assertIsNone(neutron_client.get_api_cache())
+
+    def test_enabled(self):
+        self.config(cache_port_ttl=30, cache_max_size=50, group='neutron')
+
+        cache = neutron_client.get_api_cache()
+
+        self.assertEqual({'port': 30}, cache.ttls)
+        self.assertEqual(50, cache.max_size)
+        self.assertFalse(cache.caches('network'))
+
+
+class TestNeutronClientCache(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestNeutronClientCache, self).setUp()
+        self.config(cache_network_ttl=60, cache_subnet_ttl=60,
+                    cache_port_ttl=10, group='neutron')
+        self._api = self.useFixture(tools.FakeNeutronFixture()).client
+        self._api.add_network('net1')
+        self._api.add_subnet('subnet1', 'net1', '10.0.0.0/24', '10.0.0.1')
+        self._api.add_port('port1', 'net1', '10.0.0.5',
+                           **{'binding:vif_details': {
+                               'port_profile_id': 'profile1'}})
+        self._neutron = neutron_client.NeutronAPIClient()
+
+    def test_disabled(self):
+        neutron = neutron_client.NeutronAPIClient(cache=None)
+
+        neutron.get_port_ip_address('port1')
+        neutron.get_port_ip_address('port1')
+
+        self.assertEqual(2, self._api.calls['show_port'])
+
+    def test_lookups_cached(self):
+        for _ in range(10):
+            self.assertEqual(['subnet1'],
+                             self._neutron.get_network_subnets('net1'))
+            self.assertEqual(
+                ('10.0.0.0/24', '10.0.0.1'),
+                self._neutron.get_network_subnet_cidr_and_gateway('subnet1'))
+            self.assertEqual('10.0.0.5',
+                             self._neutron.get_port_ip_address('port1'))
+            self.assertEqual('{profile1}',
+                             self._neutron.get_port_profile_id('port1'))
+
+        self.assertEqual({'show_network': 1, 'show_subnet': 1,
+                          'show_port': 1}, self._api.calls)
+        self.assertEqual(
+            0.925, self._neutron._cache.get_stats()['hit_ratio'])
+
+    def test_not_found_cached(self):
+        for _ in range(3):
+            self.assertIsNone(self._neutron.get_port_ip_address('port2'))
+            self.assertRaises(n_exc.NotFound, self._neutron._show,
+                              'port', 'port2')
+
+        self.assertEqual(1, self._api.calls['show_port'])
+
+    def test_handle_notification(self):
+        self._neutron.get_port_ip_address('port1')
+        self._api.ports['port1']['fixed_ips'] = [{'ip_address': '10.0.0.6'}]
+
+        resource_cache.handle_notification('port.update.end',
+                                           {'port': {'id': 'port1'}})
+
+        self.assertEqual('10.0.0.6',
+                         self._neutron.get_port_ip_address('port1'))
+        self.assertEqual(2, self._api.calls['show_port'])
+
+    def test_handle_network_delete(self):
+        self._neutron.get_network_subnets('net1')
+        self._neutron.get_network_subnet_cidr_and_gateway('subnet1')
+
+        resource_cache.handle_notification('network.delete.end',
+                                           {'network_id': 'net1'})
+
+        self.assertEqual(0, len(self._neutron._cache))
+
+    def test_invalidate(self):
+        self._neutron.get_port_ip_address('port1')
+        self._neutron.get_network_subnets('net1')
+
+        self._neutron.invalidate('port')
+
+        self.assertEqual(1, len(self._neutron._cache))
+        self._neutron.invalidate()
+        self.assertEqual(0, len(self._neutron._cache))
+
+
+class TestPoolAdapter(base.BaseTestCase):
+
+    @mock.patch.object(neutron_client.adapters.HTTPAdapter, 'send')
+    def test_saturation(self, mock_send):
+        adapter = neutron_client.PoolAdapter('test-pool', pool_maxsize=1)
+        saturated = neutron_client.HTTP_POOL_SATURATED.get(pool='test-pool')
+        in_flight = []
+
+        def _send(request, *args, **kwargs):
+            in_flight.append(neutron_client.HTTP_IN_FLIGHT.get(
+                pool='test-pool'))
+            if request == 'outer':
+                # a second request while the first one waits for its
+                # response
+                adapter.send('inner')
+            return request
+        mock_send.side_effect = _send
+
+        self.assertEqual('outer', adapter.send('outer'))
+
+        self.assertEqual([1, 2], in_flight)
+        self.assertEqual(0, neutron_client.HTTP_IN_FLIGHT.get(
+            pool='test-pool'))
+        self.assertEqual(saturated + 1,
+                         neutron_client.HTTP_POOL_SATURATED.get(
+                             pool='test-pool'))
+
+    @mock.patch.object(neutron_client.adapters.HTTPAdapter, 'send')
+    def test_exported(self, mock_send):
+        adapter = neutron_client.PoolAdapter('exported-pool', pool_maxsize=0)
+        exporter = metrics.MetricsExporter(metrics.REGISTRY, port=9795)
+
+        adapter.send('request')
+
+        body = exporter._app({'REQUEST_METHOD': 'GET',
+                              'PATH_INFO': '/metrics'}, mock.Mock())
+        body = body[0].decode('utf-8')
+        self.assertIn('\nneutron_solaris_http_requests_total'
+                      '{pool="exported-pool"} 1\n', body)
+        self.assertIn('\nneutron_solaris_http_requests_in_flight'
+                      '{pool="exported-pool"} 0\n', body)
+        self.assertIn('\nneutron_solaris_http_pool_saturated_total'
+                      '{pool="exported-pool"} 1\n', body)
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+# Copyright 2021, Guillermo Adrian Molina.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Scale benchmarks of the solarisvnic agent hot paths.
+
+The agent runs against the dladm/ipadm simulator, so this runs anywhere.
+Every benchmark reports its wall time, the number of commands it ran and
+the memory one run allocated, as traced by tracemalloc, as JSON:
+
+    tools/agent_benchmark.py --output before.json
+    tools/agent_benchmark.py --output after.json
+    tools/agent_benchmark.py --compare before.json after.json
+
+--compare exits with 1 if a benchmark got slower, ran more commands or
+allocated more memory than --threshold percent.
+"""
+
+import eventlet
+eventlet.monkey_patch()
+
+import argparse  # noqa: E402
+import json  # noqa: E402
+import platform  # noqa: E402
+import sys  # noqa: E402
+import time  # noqa: E402
+import tracemalloc  # noqa: E402
+
+from neutron.plugins.ml2.drivers.agent import _agent_manager_base as amb  # noqa: E402,E501
+
+from neutron_solaris.agent.solarisvnic import solarisvnic_neutron_agent as agent  # noqa: E402,E501
+from neutron_solaris import config  # noqa: E402
+from neutron_solaris.solaris import net_lib  # noqa: E402
+from neutron_solaris.solaris import simulator  # noqa: E402
+
+FORMAT_VERSION = 2
+DEVICE_COUNTS = (10, 100, 1000, 5000)
+# memory differences below this are noise, not regressions
+MEMORY_NOISE_KB = 64
+PHYSICAL_LINKS = ('net0', 'net1')
+
+
+class FakeAgent(object):
+    def __init__(self, mgr):
+        self.mgr = mgr
+        self.network_ports = {}
+
+
+def _setup(vnics, latency):
+    sim = simulator.SolarisSimulator(default_latency=latency)
+    for name in PHYSICAL_LINKS:
+        sim.add_physical_link(name)
+    sim.add_vnics(vnics, PHYSICAL_LINKS[0])
+    net_lib.CommandBase.backend = sim
+    net_lib.CommandBase.command_daemon = None
+    net_lib.Datalink.link_cache = net_lib.LinkPropertyCache()
+    net_lib.Datalink.lower_links = net_lib.LowerLinkCache()
+    return sim
+
+
+def _manager():
+    return agent.SolarisVNICNetworkManager(
+        {'physnet%d' % i: name for i, name in enumerate(PHYSICAL_LINKS)})
+
+
+def _measure(sim, func, repeat):
+    """Run func repeat times, returning the per run wall time/commands.
+
+    The memory is measured in one more run, tracemalloc would skew the wall
+    times. peak_memory_kb is the most that run had allocated at once and
+    retained_memory_kb what was still allocated at its end, e.g. cached.
+    """
+    times = []
+    sim.calls.clear()
+    for _ in range(repeat):
+        start = time.time()
+        func()
+        times.append(time.time() - start)
+    result = {
+        'wall_time': min(times),
+        'wall_time_mean': sum(times) / len(times),
+        'commands': sum(sim.calls.values()) / float(repeat),
+    }
+    tracemalloc.start()
+    try:
+        func()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    result['peak_memory_kb'] = peak / 1024.0
+    result['retained_memory_kb'] = current / 1024.0
+    return result
+
+
+def bench_get_all_devices(count, args):
+    sim = _setup(count, args.latency)
+    mgr = _manager()
+    return _measure(sim, mgr.get_all_devices, args.repeat)
+
+
+def bench_plug_burst(count, args):
+    sim = _setup(count, args.latency)
+    mgr = _manager()
+    mgr.get_all_devices()
+    segment = amb.NetworkSegment('vlan', 'physnet0', 100, 1500)
+    details = [{'device': mac, 'network_id': 'net-%d' % (i % 10)}
+               for i, mac in enumerate(sorted(sim.vnic_macs()))]
+
+    def _plug(device_details):
+        mgr.plug_interface(device_details['network_id'], segment,
+                           device_details['device'], 'compute:nova')
+
+    def _burst():
+        # drop what the previous run cached, bursts hit new ports
+        net_lib.Datalink.link_cache.invalidate()
+        mgr.process_devices(details, _plug)
+
+    return _measure(sim, _burst, args.repeat)
+
+
+def bench_rpc_update_storm(count, args):
+    sim = _setup(count, args.latency)
+    mgr = _manager()
+    mgr.get_all_devices()
+    config.CONF.set_override('update_debounce_interval', 0,
+                             group='SOLARISVNIC')
+    callbacks = agent.SolarisVNICRPCCallBack(None, FakeAgent(mgr), None)
+    macs = sorted(sim.vnic_macs())
+
+    def _storm():
+        # every port is notified 10 times
+        for _ in range(10):
+            for mac in macs:
+                callbacks.port_update(None, port={'mac_address': mac})
+        callbacks.get_and_clear_updated_devices()
+
+    result = _measure(sim, _storm, args.repeat)
+    result['notifications'] = 10 * len(macs)
+    return result
+
+
+def bench_startup(count, args):
+    sim = _setup(count, args.latency)
+
+    def _startup():
+        net_lib.Datalink.link_cache.invalidate()
+        _manager().get_agent_id()
+
+    return _measure(sim, _startup, args.repeat)
+
+
+BENCHMARKS = (
+    ('get_all_devices', bench_get_all_devices, DEVICE_COUNTS),
+    ('plug_burst', bench_plug_burst, DEVICE_COUNTS),
+    ('rpc_update_storm', bench_rpc_update_storm, DEVICE_COUNTS),
+    ('startup', bench_startup, (0,)),
+)
+
+
+def run(args):
+    config.CONF.set_override('vnic_index_file', None, group='SOLARISVNIC')
+    results = {}
+    for name, func, counts in BENCHMARKS:
+        if args.only and name not in args.only:
+            continue
+        for count in counts:
+            if args.max_devices is not None and count > args.max_devices:
+                continue
+            key = '%s[%d]' % (name, count)
+            results[key] = func(count, args)
+            print('%-28s %10.4fs %10.1f commands %10.1f KiB' % (
+                key, results[key]['wall_time'], results[key]['commands'],
+                results[key]['peak_memory_kb']), file=sys.stderr)
+    return {
+        'version': FORMAT_VERSION,
+        'python': platform.python_version(),
+        'latency': args.latency,
+        'repeat': args.repeat,
+        'results': results,
+    }
+
+
+def _more_memory(old_result, new_result, threshold):
+    # the results of format 1 have no memory measurements
+    if 'peak_memory_kb' not in old_result:
+        return False
+    old_kb = old_result['peak_memory_kb']
+    new_kb = new_result['peak_memory_kb']
+    return (new_kb - old_kb > MEMORY_NOISE_KB and
+            new_kb > old_kb * (1 + threshold / 100.0))
+
+
+def compare(base, new, threshold):
+    """Print how new compares to base.
+
+    :returns: the names of the benchmarks that regressed by more than
+              threshold percent.
+    """
+    regressions = []
+    print('%-28s %12s %12s %8s %10s %10s %10s %10s' % (
+        'benchmark', 'base', 'new', 'change', 'base cmds', 'new cmds',
+        'base KiB', 'new KiB'))
+    for key in sorted(set(base['results']) & set(new['results'])):
+        old_result = base['results'][key]
+        new_result = new['results'][key]
+        change = (100.0 * (new_result['wall_time'] - old_result['wall_time']) /
+                  old_result['wall_time'] if old_result['wall_time'] else 0.0)
+        more_commands = new_result['commands'] > old_result['commands'] * (
+            1 + threshold / 100.0)
+        regressed = (change > threshold or more_commands or
+                     _more_memory(old_result, new_result, threshold))
+        if regressed:
+            regressions.append(key)
+        print('%-28s %11.4fs %11.4fs %+7.1f%% %10.1f %10.1f %10s %10.1f%s' % (
+            key, old_result['wall_time'], new_result['wall_time'], change,
+            old_result['commands'], new_result['commands'],
+            '%.1f' % old_result['peak_memory_kb']
+            if 'peak_memory_kb' in old_result else '-',
+            new_result['peak_memory_kb'],
+            '  REGRESSION' if regressed else ''))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--output', help='File the JSON results are '
+                                         'written to, stdout by default.')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Runs of every benchmark, the fastest counts.')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Simulated seconds taken by every command.')
+    parser.add_argument('--max-devices', type=int,
+                        help='Skip the runs with more VNICs than this.')
+    parser.add_argument('--only', action='append',
+                        choices=[name for name, _, _ in BENCHMARKS],
+                        help='Only run this benchmark, may be repeated.')
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'NEW'),
+                        help='Compare two result files instead of running '
+                             'the benchmarks.')
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help='Percentage above which --compare reports a '
+                             'regression.')
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            base = json.load(f)
+        with open(args.compare[1]) as f:
+            new = json.load(f)
+        return 1 if compare(base, new, args.threshold) else 0
+
+    data = json.dumps(run(args), indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(data + '\n')
+    else:
+        print(data)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
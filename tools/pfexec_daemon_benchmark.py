@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# Copyright 2021, Guillermo Adrian Molina.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Compare running commands with pfexec per call against the pfexec daemon.
+
+Example, on a Solaris host:
+
+    tools/pfexec_daemon_benchmark.py -n 200 -c 4 /usr/sbin/dladm show-link
+
+Use --no-pfexec to run it anywhere with an unprivileged command, e.g.
+/bin/true, which measures the fork/exec saving alone.
+"""
+
+import eventlet
+eventlet.monkey_patch()
+
+import argparse  # noqa: E402
+import time  # noqa: E402
+
+from neutron.agent.linux import utils  # noqa: E402
+
+from neutron_solaris.solaris import pfexec_daemon  # noqa: E402
+
+
+def _run(func, count, concurrency):
+    pool = eventlet.GreenPool(concurrency)
+    start = time.time()
+    for _ in pool.imap(lambda i: func(), range(count)):
+        pass
+    return time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', '--count', type=int, default=100,
+                        help='Commands run by each method.')
+    parser.add_argument('-c', '--concurrency', type=int, default=1,
+                        help='Commands in flight at the same time.')
+    parser.add_argument('--no-pfexec', dest='pfexec', action='store_false',
+                        help='Run the commands and the daemon without '
+                             'pfexec.')
+    parser.add_argument('cmd', nargs='+', help='Command to run.')
+    args = parser.parse_args()
+
+    direct_cmd = (['/usr/bin/pfexec'] if args.pfexec else []) + args.cmd
+    client = pfexec_daemon.PfexecDaemonClient(
+        [args.cmd[0]], workers=args.concurrency, use_pfexec=args.pfexec)
+    # start the daemon outside of the measurement
+    client.execute(args.cmd)
+
+    results = {
+        'direct': _run(lambda: utils.execute(list(direct_cmd)),
+                       args.count, args.concurrency),
+        'daemon': _run(lambda: client.execute(args.cmd),
+                       args.count, args.concurrency),
+    }
+    client.stop()
+
+    for method, elapsed in sorted(results.items()):
+        print('%-8s %8.3fs total %8.3fms per command' %
+              (method, elapsed, 1000.0 * elapsed / args.count))
+    print('speedup  %8.2fx' % (results['direct'] / results['daemon']))
+
+
+if __name__ == '__main__':
+    main()